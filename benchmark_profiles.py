@@ -0,0 +1,218 @@
+import os
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from extraction_profiles import DEFAULT_PROFILE, PROFILES, profile_fingerprint
+from feature_registry import FEATURE_SETS, categorical_columns, extract_feature_set
+from feature_store import get_store_paths, is_feature_store, load_feature_table
+from streaming import stream_decoding_error
+
+# Insieme di feature della tabella di riferimento (extract_audio_features_complete.py)
+BENCHMARK_FEATURE_SET = 'deam_complete'
+
+def get_project_paths(custom_reference_path=None, custom_audio_dir=None, custom_output_dir=None):
+    """
+    Definisce i percorsi del benchmark in modo dinamico.
+
+    Parameters:
+    -----------
+    custom_reference_path : str, optional
+        File CSV o dataset del feature store con le feature di riferimento
+    custom_audio_dir : str, optional
+        Directory con i file audio DEAM
+    custom_output_dir : str, optional
+        Directory per il file dei risultati
+
+    Returns:
+    --------
+    dict
+        Dizionario con i percorsi configurati
+    """
+    base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+
+    # Riferimento: feature store se presente, altrimenti il file CSV storico
+    if custom_reference_path:
+        reference_path = Path(custom_reference_path)
+    elif is_feature_store(get_store_paths(base_dir)['deam_complete']):
+        reference_path = get_store_paths(base_dir)['deam_complete']
+    else:
+        reference_path = base_dir / 'audio_tonality_features_complete_20250404_133542.csv'
+
+    audio_dir = Path(custom_audio_dir) if custom_audio_dir else base_dir / 'DEAM_audio' / 'MEMD_audio'
+    output_dir = Path(custom_output_dir) if custom_output_dir else base_dir
+
+    return {
+        'base_dir': base_dir,
+        'reference_path': reference_path,
+        'audio_dir': audio_dir,
+        'output_dir': output_dir
+    }
+
+def run_profile(audio_files, profile, stream=False):
+    """
+    Estrae in serie le feature di riferimento con un profilo, misurando il tempo per file
+
+    Parameters:
+    -----------
+    audio_files : dict
+        Dizionario track_id -> percorso del file audio
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    stream : bool
+        Se True decodifica i file a blocchi con memoria costante
+
+    Returns:
+    --------
+    tuple
+        (DataFrame delle feature indicizzato per track_id, lista dei tempi in secondi)
+    """
+    rows, times = [], []
+    for track_id, audio_path in audio_files.items():
+        start = time.perf_counter()
+        try:
+            features = extract_feature_set(audio_path, BENCHMARK_FEATURE_SET, stream=stream, profile=profile)
+        except Exception as e:
+            print(f"Errore nell'estrazione di {audio_path} con il profilo {profile}: {e}")
+            continue
+        times.append(time.perf_counter() - start)
+        rows.append({'track_id': track_id, **features})
+    return pd.DataFrame(rows).set_index('track_id'), times
+
+def compare_to_reference(extracted, reference):
+    """
+    Confronta le feature estratte con quelle di riferimento, colonna per colonna
+
+    Le colonne numeriche sono valutate con l'errore relativo mediano e la correlazione
+    di Pearson tra i brani, quelle categoriche con la frazione di brani in accordo.
+
+    Parameters:
+    -----------
+    extracted : DataFrame
+        Feature estratte, indicizzate per track_id
+    reference : DataFrame
+        Feature di riferimento, indicizzate per track_id
+
+    Returns:
+    --------
+    list
+        Un dizionario per colonna (column, kind, median_rel_error, pearson_r, agreement)
+    """
+    common = extracted.index.intersection(reference.index)
+    categorical = set(categorical_columns(BENCHMARK_FEATURE_SET))
+    results = []
+    for col in FEATURE_SETS[BENCHMARK_FEATURE_SET]:
+        if col not in extracted.columns or col not in reference.columns:
+            continue
+        result = {'column': col, 'kind': 'categorical' if col in categorical else 'numeric',
+                  'median_rel_error': np.nan, 'pearson_r': np.nan, 'agreement': np.nan}
+        if len(common):
+            if col in categorical:
+                values = extracted.loc[common, col].astype(str)
+                ref_values = reference.loc[common, col].astype(str)
+                result['agreement'] = float((values == ref_values).mean())
+            else:
+                values = extracted.loc[common, col].astype(float).to_numpy()
+                ref_values = reference.loc[common, col].astype(float).to_numpy()
+                scale = np.maximum(np.abs(ref_values), np.finfo(float).eps)
+                result['median_rel_error'] = float(np.median(np.abs(values - ref_values) / scale))
+                if len(common) > 1 and np.std(values) > 0 and np.std(ref_values) > 0:
+                    result['pearson_r'] = float(np.corrcoef(values, ref_values)[0, 1])
+        results.append(result)
+    return results
+
+def print_benchmark_summary(summary):
+    """
+    Stampa tempi e accuratezza dei profili
+
+    Parameters:
+    -----------
+    summary : DataFrame
+        Risultati del benchmark, una riga per profilo e colonna
+    """
+    print("\nRiepilogo del benchmark dei profili:")
+    for profile, group in summary.groupby('profile', sort=False):
+        first = group.iloc[0]
+        speedup = f"{first['speedup']:.2f}x" if pd.notna(first['speedup']) else "n/d"
+        print(f"\n{first['fingerprint']}: {first['seconds_per_track']:.3f} s/brano "
+              f"({int(first['n_tracks'])} brani), accelerazione rispetto a {DEFAULT_PROFILE}: {speedup}")
+        for _, row in group.iterrows():
+            if row['kind'] == 'categorical':
+                print(f"  {row['column']:<20} accordo {row['agreement']:.1%}")
+            else:
+                print(f"  {row['column']:<20} errore relativo mediano {row['median_rel_error']:.2%}, "
+                      f"r di Pearson {row['pearson_r']:.4f}")
+
+def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Confronta velocità e accuratezza dei profili di estrazione')
+    parser.add_argument('--reference', type=str, help='CSV o dataset del feature store di riferimento (default: deam_complete)')
+    parser.add_argument('--audio-dir', type=str, help='Directory con i file audio DEAM (<track_id>.mp3)')
+    parser.add_argument('--output-dir', type=str, help='Directory per il file dei risultati')
+    parser.add_argument('--profiles', type=str, default=','.join(PROFILES),
+                        help='Profili da confrontare, separati da virgola (default: tutti)')
+    parser.add_argument('--sample', type=int, default=50, help='Numero di brani campionati dalla tabella di riferimento (0 per tutti)')
+    parser.add_argument('--seed', type=int, default=42, help='Seme del campionamento dei brani')
+    parser.add_argument('--stream', action='store_true', help='Decodifica l\'audio a blocchi con memoria costante')
+    parser.add_argument('--check-stream', action='store_true',
+                        help='Confronta l\'estrazione con --stream con quella sul file intero (stesso profilo) '
+                             'invece che con la tabella di riferimento')
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"Profili non validi: {', '.join(unknown)} (validi: {', '.join(PROFILES)})")
+
+    paths = get_project_paths(args.reference, args.audio_dir, args.output_dir)
+
+    # Brani della tabella di riferimento con il file audio disponibile
+    reference = load_feature_table(paths['reference_path']).drop_duplicates('track_id').set_index('track_id')
+    audio_files = {track_id: paths['audio_dir'] / f"{track_id}.mp3" for track_id in reference.index}
+    audio_files = {track_id: path for track_id, path in audio_files.items() if path.exists()}
+    if not audio_files:
+        print(f"Nessun file audio della tabella di riferimento trovato in {paths['audio_dir']}")
+        return
+    if args.sample and args.sample < len(audio_files):
+        rng = np.random.default_rng(args.seed)
+        sampled = sorted(rng.choice(list(audio_files), size=args.sample, replace=False).tolist())
+        audio_files = {track_id: audio_files[track_id] for track_id in sampled}
+    print(f"Benchmark di {len(profiles)} profili su {len(audio_files)} brani (riferimento: {paths['reference_path']})")
+
+    stream = args.stream or args.check_stream
+    if args.check_stream:
+        # Il segnale decodificato a blocchi deve coincidere con quello letto per intero
+        errors = {track_id: stream_decoding_error(path) for track_id, path in audio_files.items()}
+        worst = max(errors, key=errors.get)
+        print(f"Decodifica a blocchi: differenza massima dal segnale intero {errors[worst]:.2e} (brano {worst})")
+
+    results = []
+    seconds_per_track = {}
+    for profile in profiles:
+        # Estrazione di riscaldamento (import e compilazione JIT esclusi dai tempi)
+        extract_feature_set(next(iter(audio_files.values())), BENCHMARK_FEATURE_SET, duration=5,
+                            stream=stream, profile=profile)
+        print(f"Estrazione con il profilo {profile}...")
+        extracted, times = run_profile(audio_files, profile, stream)
+        seconds_per_track[profile] = float(np.mean(times)) if times else np.nan
+        profile_reference = run_profile(audio_files, profile)[0] if args.check_stream else reference
+        for result in compare_to_reference(extracted, profile_reference):
+            results.append({'profile': profile, 'fingerprint': profile_fingerprint(profile),
+                            'n_tracks': len(times), 'seconds_per_track': seconds_per_track[profile], **result})
+
+    summary = pd.DataFrame(results)
+    baseline = seconds_per_track.get(DEFAULT_PROFILE, np.nan)
+    summary['speedup'] = baseline / summary['seconds_per_track']
+    print_benchmark_summary(summary)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = paths['output_dir'] / f'profile_benchmark_{timestamp}.csv'
+    summary.to_csv(output_file, index=False)
+    print(f"\nRisultati del benchmark salvati in:\n{output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Lasso, Ridge
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVR
+
+from compiled_predictor import COMPILED_FORMAT_VERSION, COMPILED_MODEL_FILE, CompiledPredictor
+from feature_registry import FEATURE_SETS
+from feature_schema import FeatureSchema
+from predict_new_audio import PREDICTION_FEATURE_SET, load_models, predict_batch
+
+# Esecuzioni della predizione in batch nella verifica, di cui si tiene la più veloce
+BATCH_REPEATS = 3
+
+def _unpack(estimator):
+    """Separa gli scaler di una pipeline dallo stimatore finale"""
+    if isinstance(estimator, Pipeline):
+        steps = [step for _, step in estimator.steps]
+        return steps[:-1], steps[-1]
+    return [], estimator
+
+def _compile_scaler(scaler, n_inputs):
+    """Media e scala di uno StandardScaler addestrato"""
+    if not isinstance(scaler, StandardScaler):
+        raise ValueError(f"Passo di preprocessing non supportato: {type(scaler).__name__}")
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_inputs)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_inputs)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+def _pack_trees(trees):
+    """
+    Concatena i nodi di più alberi in array piatti, con gli indici dei figli resi globali
+
+    Parameters:
+    -----------
+    trees : list
+        Strutture sklearn.tree._tree.Tree degli alberi
+
+    Returns:
+    --------
+    tuple
+        (dizionario degli array feature/threshold/children/value/roots, profondità massima)
+    """
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+    children, feature = [], []
+    for tree, offset in zip(trees, offsets):
+        is_leaf = tree.children_left < 0
+        nodes = np.arange(tree.node_count) + offset
+        # Le foglie puntano a sé stesse e il loro indice di feature (-2) diventa 0
+        children.append(np.stack([np.where(is_leaf, nodes, tree.children_right + offset),
+                                  np.where(is_leaf, nodes, tree.children_left + offset)], axis=1))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+    arrays = {
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+        'children': np.concatenate(children).astype(np.int32),
+        'value': np.concatenate([tree.value[:, :, 0] for tree in trees]).astype(np.float64),
+        'roots': offsets.astype(np.int64)
+    }
+    return arrays, int(max(tree.max_depth for tree in trees))
+
+def compile_regressor(estimator, targets):
+    """
+    Converte uno stimatore addestrato in una o più teste piatte
+
+    Parameters:
+    -----------
+    estimator : estimator
+        Regressore addestrato (lineare, Random Forest, Gradient Boosting, SVR o
+        MultiOutputRegressor di questi)
+    targets : list
+        Target predetti dallo stimatore, nell'ordine delle sue colonne di output
+
+    Returns:
+    --------
+    list
+        Coppie (metadati della testa, dizionario degli array)
+    """
+    if isinstance(estimator, MultiOutputRegressor):
+        heads = []
+        for target, sub_estimator in zip(targets, estimator.estimators_):
+            heads.extend(compile_regressor(sub_estimator, [target]))
+        return heads
+
+    if isinstance(estimator, (LinearRegression, Ridge, Lasso)):
+        coef = np.atleast_2d(estimator.coef_).astype(np.float64)
+        intercept = np.atleast_1d(estimator.intercept_).astype(np.float64)
+        return [({'kind': 'linear', 'targets': targets}, {'coef': coef, 'intercept': intercept})]
+
+    if isinstance(estimator, RandomForestRegressor):
+        arrays, depth = _pack_trees([tree.tree_ for tree in estimator.estimators_])
+        return [({'kind': 'trees', 'combine': 'mean', 'depth': depth, 'targets': targets}, arrays)]
+
+    if isinstance(estimator, GradientBoostingRegressor):
+        if isinstance(estimator.init_, str) and estimator.init_ == 'zero':
+            init = np.zeros(1)
+        elif hasattr(estimator.init_, 'constant_'):
+            init = np.ravel(estimator.init_.constant_).astype(np.float64)
+        else:
+            raise ValueError(f"Stimatore iniziale del Gradient Boosting non supportato: {type(estimator.init_).__name__}")
+        arrays, depth = _pack_trees([tree.tree_ for tree in estimator.estimators_[:, 0]])
+        arrays['init'] = init
+        return [({'kind': 'trees', 'combine': 'sum', 'learning_rate': float(estimator.learning_rate),
+                  'depth': depth, 'targets': targets}, arrays)]
+
+    if isinstance(estimator, SVR):
+        if estimator.kernel not in ('linear', 'rbf', 'poly', 'sigmoid'):
+            raise ValueError(f"Kernel di SVR non supportato: {estimator.kernel}")
+        return [({'kind': 'svr', 'kernel': estimator.kernel, 'gamma': float(estimator._gamma),
+                  'coef0': float(estimator.coef0), 'degree': int(estimator.degree), 'targets': targets},
+                 {'support_vectors': np.asarray(estimator.support_vectors_, dtype=np.float64),
+                  'dual_coef': np.asarray(estimator.dual_coef_, dtype=np.float64),
+                  'intercept': np.asarray(estimator.intercept_, dtype=np.float64)})]
+
+    raise ValueError(f"Modello non supportato dalla compilazione: {type(estimator).__name__}")
+
+def compile_models(models):
+    """
+    Compila i modelli caricati da predict_new_audio.load_models in array NumPy
+
+    La catena compilata riproduce esattamente quella della predizione: per i modelli
+    separati lo scaler salvato seguito dalla pipeline, per il modello congiunto la sola
+    pipeline.
+
+    Parameters:
+    -----------
+    models : dict
+        Modelli per target ('arousal', 'valence') o modello congiunto ('joint')
+
+    Returns:
+    --------
+    tuple
+        (metadati JSON-serializzabili, dizionario nome -> array)
+    """
+    if 'joint' in models:
+        entries = [(models['joint']['targets'], [], models['joint']['model'], models['joint']['features'])]
+        schemas = [models['joint'].get('schema')]
+    else:
+        entries = [([target], [models[target]['scaler']], models[target]['model'], models[target]['features'])
+                   for target in ['arousal', 'valence']]
+        schemas = [models[target].get('schema') for target in ['arousal', 'valence']]
+
+    # Schema di input: unione ordinata delle feature di tutti i modelli; è lo schema
+    # salvato in addestramento quando i modelli lo condividono
+    columns = []
+    for _, _, _, features in entries:
+        columns.extend(name for name in features if name not in columns)
+    schema = next((schema for schema in schemas if schema is not None and schema.columns == columns), None)
+    if schema is None:
+        schema = FeatureSchema.from_columns(columns, numeric_columns=FEATURE_SETS[PREDICTION_FEATURE_SET])
+
+    meta = {'version': COMPILED_FORMAT_VERSION, 'columns': columns, 'schema': schema.to_dict(),
+            'targets': [target for targets, _, _, _ in entries for target in targets], 'heads': []}
+    arrays = {}
+    for targets, scalers, estimator, features in entries:
+        pipeline_scalers, final = _unpack(estimator)
+        stages = [_compile_scaler(scaler, len(features)) for scaler in scalers + pipeline_scalers]
+        inputs = np.array([columns.index(name) for name in features], dtype=np.int64)
+        for head, head_arrays in compile_regressor(final, list(targets)):
+            k = len(meta['heads'])
+            head['n_stages'] = len(stages)
+            meta['heads'].append(head)
+            arrays[f'h{k}_inputs'] = inputs
+            for s, (mean, scale) in enumerate(stages):
+                arrays[f'h{k}_mean{s}'] = mean
+                arrays[f'h{k}_scale{s}'] = scale
+            for name, value in head_arrays.items():
+                arrays[f'h{k}_{name}'] = value
+    return meta, arrays
+
+def save_compiled(meta, arrays, output_path):
+    """
+    Scrive l'artefatto compilato (.npz non compresso, leggibile senza pickle)
+
+    Parameters:
+    -----------
+    meta : dict
+        Metadati (schema, target, teste)
+    arrays : dict
+        Array delle teste
+    output_path : str
+        Percorso del file .npz
+    """
+    np.savez(output_path, meta=np.array(json.dumps(meta)), **arrays)
+
+def check_compiled(models, predictor, features_list):
+    """
+    Confronta le predizioni compilate con quelle di scikit-learn e ne misura i tempi
+
+    Parameters:
+    -----------
+    models : dict
+        Modelli caricati da load_models
+    predictor : CompiledPredictor
+        Predittore compilato
+    features_list : list
+        Lista di dizionari con le caratteristiche audio
+
+    Returns:
+    --------
+    dict
+        Massima differenza assoluta per target e tempi per riga (secondi) dei due percorsi
+    """
+    # Migliore di BATCH_REPEATS esecuzioni per percorso, per ridurre il rumore delle misure
+    sklearn_time = compiled_time = np.inf
+    for _ in range(BATCH_REPEATS):
+        start = time.perf_counter()
+        reference = predict_batch(features_list, models)
+        sklearn_time = min(sklearn_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        compiled = predictor.predict(predictor.encode(features_list))
+        compiled_time = min(compiled_time, time.perf_counter() - start)
+
+    # Predizione di una riga alla volta, come nella modalità a file singolo
+    start = time.perf_counter()
+    for features in features_list[:100]:
+        predictor.predict(predictor.encode([features]))
+    single_time = (time.perf_counter() - start) / min(len(features_list), 100)
+
+    return {
+        'max_abs_diff': {target: float(np.max(np.abs(compiled[:, i] - reference[target])))
+                         for i, target in enumerate(predictor.targets)},
+        'sklearn_per_row': sklearn_time / len(features_list),
+        'compiled_per_row': compiled_time / len(features_list),
+        'compiled_single': single_time
+    }
+
+def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Compila i modelli addestrati in array NumPy per una predizione leggera')
+    parser.add_argument('--models-dir', type=str, default='emotion_prediction_results', help='Directory dei modelli addestrati')
+    parser.add_argument('--joint', action='store_true', help='Compila il modello congiunto (predict_emotions.py --joint)')
+    parser.add_argument('--output', type=str, help=f'File dell\'artefatto compilato (default: <models-dir>/{COMPILED_MODEL_FILE})')
+    parser.add_argument('--check-data', type=str,
+                        help='Tabella delle feature su cui verificare le predizioni compilate '
+                             '(default: audio_tonality_features_with_emotions.csv se presente)')
+    parser.add_argument('--no-check', action='store_true', help='Non verificare le predizioni compilate')
+    args = parser.parse_args()
+
+    models = load_models(args.models_dir, args.joint)
+    if models is None:
+        print("Impossibile procedere senza i modelli. Esegui prima predict_emotions.py")
+        return
+
+    try:
+        meta, arrays = compile_models(models)
+    except ValueError as e:
+        print(f"Errore nella compilazione dei modelli: {e}")
+        return
+
+    output_path = args.output or os.path.join(args.models_dir, COMPILED_MODEL_FILE)
+    save_compiled(meta, arrays, output_path)
+    print(f"Modelli compilati ({', '.join(head['kind'] for head in meta['heads'])}; "
+          f"{len(meta['columns'])} colonne di input) salvati in {output_path}")
+
+    if args.no_check:
+        return
+    base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+    check_path = Path(args.check_data) if args.check_data else base_dir / 'audio_tonality_features_with_emotions.csv'
+    if not check_path.exists():
+        print(f"Verifica saltata: {check_path} non trovato")
+        return
+    features_list = pd.read_csv(check_path).to_dict('records')
+    result = check_compiled(models, CompiledPredictor(output_path), features_list)
+    print(f"\nVerifica su {len(features_list)} righe di {check_path}:")
+    for target, diff in result['max_abs_diff'].items():
+        print(f"  {target}: differenza massima rispetto a scikit-learn {diff:.2e}")
+    print(f"  Tempo per riga in batch: scikit-learn {result['sklearn_per_row'] * 1e6:.1f} µs, "
+          f"compilato {result['compiled_per_row'] * 1e6:.1f} µs")
+    print(f"  Tempo per una singola riga compilata: {result['compiled_single'] * 1e6:.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import json
+
+import numpy as np
+
+from feature_schema import FeatureSchema
+
+# Versione del formato dell'artefatto compilato (vedi compile_models.py)
+COMPILED_FORMAT_VERSION = 2
+
+# Nome predefinito dell'artefatto compilato nella directory dei modelli
+COMPILED_MODEL_FILE = 'compiled_model.npz'
+
+# Passi di visita degli alberi tra due compattazioni dell'insieme delle coppie attive
+COMPACT_STEPS = 3
+
+def _tree_predict(X, feature, threshold, children, is_leaf, value, roots):
+    """
+    Foglie raggiunte da ogni campione in ogni albero, visitando tutti gli alberi insieme
+
+    Le coppie (albero, campione) avanzano di un livello a ogni passo e quelle arrivate
+    a una foglia escono dall'insieme attivo, così che ogni coppia percorra solo il
+    proprio cammino e non la profondità massima. Le foglie puntano a sé stesse, quindi
+    l'insieme attivo viene compattato solo ogni COMPACT_STEPS passi. Le coppie sono
+    ordinate per albero, così che i passi consecutivi leggano nodi vicini in memoria.
+
+    Parameters:
+    -----------
+    X : np.ndarray
+        Matrice (n_campioni, n_feature) in float32, come negli alberi di scikit-learn
+    feature, threshold : np.ndarray
+        Feature (intp) e soglia float32 (vedi _float32_thresholds) di ogni nodo di tutti
+        gli alberi concatenati
+    children : np.ndarray
+        Figli (destro, sinistro) di ogni nodo, appiattiti (2 * n_nodi, intp)
+    is_leaf : np.ndarray
+        Maschera booleana delle foglie
+    value : np.ndarray
+        Valori dei nodi (n_nodi, n_output)
+    roots : np.ndarray
+        Indice della radice di ogni albero
+
+    Returns:
+    --------
+    np.ndarray
+        Valori delle foglie (n_campioni, n_alberi, n_output)
+    """
+    n_samples, n_features = X.shape
+    X = X.ravel()
+    node = np.repeat(roots, n_samples)
+    active = np.flatnonzero(~is_leaf[node])
+    current = node[active]
+    offset = (active % n_samples) * n_features
+    step = 0
+    while len(active):
+        current = children[2 * current + (X[offset + feature[current]] <= threshold[current])]
+        step += 1
+        if step % COMPACT_STEPS == 0:
+            node[active] = current
+            keep = ~is_leaf[current]
+            active, current, offset = active[keep], current[keep], offset[keep]
+    return value[node].reshape(len(roots), n_samples, -1).transpose(1, 0, 2)
+
+def _float32_thresholds(threshold):
+    """
+    Soglie float32 equivalenti a quelle float64 per campioni float32
+
+    Per x float32, x <= t equivale a x <= t32, con t32 il più grande float32 non
+    superiore a t: il confronto resta identico a quello di scikit-learn e legge
+    la metà dei byte.
+    """
+    rounded = threshold.astype(np.float32)
+    return np.where(rounded > threshold, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+def _kernel(X, support_vectors, kernel, gamma, coef0, degree):
+    """Matrice del kernel di SVR tra i campioni e i vettori di supporto"""
+    if kernel == 'rbf':
+        sq_dist = (X ** 2).sum(axis=1)[:, None] - 2 * X @ support_vectors.T + (support_vectors ** 2).sum(axis=1)[None, :]
+        return np.exp(-gamma * np.maximum(sq_dist, 0))
+    dot = X @ support_vectors.T
+    if kernel == 'linear':
+        return dot
+    if kernel == 'poly':
+        return (gamma * dot + coef0) ** degree
+    if kernel == 'sigmoid':
+        return np.tanh(gamma * dot + coef0)
+    raise ValueError(f"Kernel non supportato: {kernel}")
+
+class CompiledPredictor:
+    """
+    Predittore vettoriale per i modelli compilati in array NumPy
+
+    L'artefatto (.npz, scritto da compile_models.py) contiene lo schema fisso delle
+    colonne di input (vedi feature_schema.FeatureSchema), i target e una o più "teste":
+    ognuna seleziona le proprie colonne, applica in ordine le standardizzazioni (media e
+    scala) e un regressore piatto (lineare, ensemble di alberi o SVR) che produce uno o
+    più target. Richiede solo NumPy.
+
+    Parameters:
+    -----------
+    path : str
+        Percorso dell'artefatto compilato
+    """
+
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            self.meta = json.loads(str(data['meta']))
+            self.arrays = {name: data[name] for name in data.files if name != 'meta'}
+        if self.meta.get('version') != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Versione dell'artefatto compilato non supportata: {self.meta.get('version')}")
+        self.columns = self.meta['columns']
+        self.targets = self.meta['targets']
+        self.schema = FeatureSchema.from_dict(self.meta['schema'])
+        # Array di ogni testa, senza il prefisso 'h<k>_' con cui sono salvati
+        self._heads = [(head, {name[len(f'h{k}_'):]: value for name, value in self.arrays.items()
+                               if name.startswith(f'h{k}_')})
+                       for k, head in enumerate(self.meta['heads'])]
+        # Indici degli alberi in intp, figli appiattiti e soglie float32, convertiti una volta sola
+        for head, arrays in self._heads:
+            if head['kind'] == 'trees':
+                arrays['threshold'] = _float32_thresholds(arrays['threshold'])
+                arrays['feature'] = arrays['feature'].astype(np.intp)
+                arrays['is_leaf'] = arrays['children'][:, 0] == np.arange(len(arrays['children']))
+                arrays['children'] = arrays['children'].astype(np.intp).ravel()
+                arrays['roots'] = arrays['roots'].astype(np.intp)
+
+    @staticmethod
+    def _head(head, arrays, X):
+        """Predizioni (n_campioni, n_target della testa) di una testa"""
+        Z = X[:, arrays['inputs']]
+        for s in range(head['n_stages']):
+            Z = (Z - arrays[f'mean{s}']) / arrays[f'scale{s}']
+
+        kind = head['kind']
+        if kind == 'linear':
+            return Z @ arrays['coef'].T + arrays['intercept']
+        if kind == 'trees':
+            leaves = _tree_predict(Z.astype(np.float32), arrays['feature'], arrays['threshold'], arrays['children'],
+                                   arrays['is_leaf'], arrays['value'], arrays['roots'])
+            if head['combine'] == 'mean':
+                return leaves.mean(axis=1)
+            return arrays['init'] + head['learning_rate'] * leaves.sum(axis=1)
+        if kind == 'svr':
+            K = _kernel(Z, arrays['support_vectors'], head['kernel'], head['gamma'], head['coef0'], head['degree'])
+            return K @ arrays['dual_coef'].T + arrays['intercept']
+        raise ValueError(f"Tipo di regressore compilato non supportato: {kind}")
+
+    def predict(self, X):
+        """
+        Predice tutti i target
+
+        Parameters:
+        -----------
+        X : np.ndarray
+            Matrice (n_campioni, len(columns)) nell'ordine dello schema
+
+        Returns:
+        --------
+        np.ndarray
+            Predizioni (n_campioni, n_target), nell'ordine di targets
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        Y = np.empty((len(X), len(self.targets)))
+        for head, arrays in self._heads:
+            Y[:, [self.targets.index(target) for target in head['targets']]] = self._head(head, arrays, X)
+        return Y
+
+    def encode(self, features_list, out=None):
+        """
+        Costruisce la matrice di input dai dizionari delle feature estratte
+
+        Parameters:
+        -----------
+        features_list : list
+            Lista di dizionari con le caratteristiche audio estratte
+        out : np.ndarray, optional
+            Matrice preallocata da riutilizzare, vedi FeatureSchema.encode_rows
+
+        Returns:
+        --------
+        np.ndarray
+            Matrice (n_file, len(columns))
+        """
+        return self.schema.encode_rows(features_list, out)
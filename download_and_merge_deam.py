@@ -6,6 +6,8 @@ import io
 import shutil
 from pathlib import Path
 
+from feature_store import get_store_paths, is_feature_store, load_feature_table
+
 # URL del dataset DEAM (MediaEval Database for Emotional Analysis in Music)
 DEAM_URL = "https://zenodo.org/record/1188976/files/DEAM_Annotations.zip"
 
@@ -45,18 +47,20 @@ def download_deam_annotations(output_dir):
         print(f"Errore durante il download delle annotazioni DEAM: {e}")
         return False
 
-def merge_audio_features_with_emotions(audio_features_path, annotations_path, output_path):
+def merge_audio_features_with_emotions(audio_features_path, annotations_path, output_path, columns=None):
     """
     Unisce le caratteristiche audio con le annotazioni emozionali
     
     Parameters:
     -----------
     audio_features_path : str o Path
-        Percorso al file CSV con le caratteristiche audio
+        Percorso al file CSV o al dataset del feature store con le caratteristiche audio
     annotations_path : str o Path
         Percorso al file CSV con le annotazioni emozionali
     output_path : str o Path
         Percorso dove salvare il file CSV unito
+    columns : list, optional
+        Colonne delle caratteristiche audio da leggere (None per tutte)
     
     Returns:
     --------
@@ -64,8 +68,8 @@ def merge_audio_features_with_emotions(audio_features_path, annotations_path, ou
         True se l'unione è avvenuta con successo, False altrimenti
     """
     try:
-        # Carica il file delle caratteristiche audio
-        audio_features = pd.read_csv(audio_features_path)
+        # Carica le caratteristiche audio (CSV o feature store), solo per le colonne richieste
+        audio_features = load_feature_table(audio_features_path, columns=columns)
         print(f"Caratteristiche audio caricate: {len(audio_features)} brani")
         
         # Carica il file delle annotazioni
@@ -89,7 +93,8 @@ def merge_audio_features_with_emotions(audio_features_path, annotations_path, ou
         
         # Mostra le prime righe del dataframe unito
         print("\nPrime righe del dataframe unito:")
-        print(merged_df[['track_id', 'key', 'mode', 'arousal_mean', 'valence_mean']].head())
+        preview_cols = [c for c in ['track_id', 'key', 'mode', 'arousal_mean', 'valence_mean'] if c in merged_df.columns]
+        print(merged_df[preview_cols].head())
         
         return True
     
@@ -104,8 +109,10 @@ def main():
     # Directory per le annotazioni DEAM
     annotations_dir = base_dir / 'DEAM_Annotations'
     
-    # File delle caratteristiche audio
-    audio_features_path = base_dir / 'audio_tonality_features_complete_20250404_133542.csv'
+    # Caratteristiche audio: feature store se presente, altrimenti il file CSV storico
+    audio_features_path = get_store_paths(base_dir)['deam_complete']
+    if not is_feature_store(audio_features_path):
+        audio_features_path = base_dir / 'audio_tonality_features_complete_20250404_133542.csv'
     
     # File delle annotazioni
     annotations_path = annotations_dir / 'annotations averaged per song' / 'song_level' / 'static_annotations_averaged_songs_1_2000.csv'
@@ -0,0 +1,371 @@
+import os
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import librosa
+from tqdm import tqdm
+
+from extraction_profiles import DEFAULT_PROFILE, PROFILES, get_profile, profile_fingerprint
+from feature_store import get_store_paths, write_features
+from scheduling import plan_chunks
+from spectral_plan import SpectralPlan
+from supervised_pool import SupervisedPool
+from tonality import KEY_NAMES
+
+# File delle annotazioni dinamiche di DEAM (una colonna sample_<ms>ms per istante annotato)
+DYNAMIC_FILES = {'arousal': 'arousal.csv', 'valence': 'valence.csv'}
+
+def get_project_paths(custom_annotations_dir=None, custom_audio_dir=None, custom_output_dir=None):
+    """
+    Definisce i percorsi del progetto in modo dinamico.
+
+    Parameters:
+    -----------
+    custom_annotations_dir : str, optional
+        Directory con arousal.csv e valence.csv delle annotazioni dinamiche
+    custom_audio_dir : str, optional
+        Directory con i file audio DEAM (<song_id>.mp3)
+    custom_output_dir : str, optional
+        Directory per i file di output
+
+    Returns:
+    --------
+    dict
+        Dizionario con i percorsi configurati
+    """
+    base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+
+    if custom_annotations_dir:
+        annotations_dir = Path(custom_annotations_dir)
+    else:
+        annotations_dir = (base_dir / 'DEAM_Annotations' / 'annotations averaged per song'
+                           / 'dynamic (per second annotations)')
+
+    audio_dir = Path(custom_audio_dir) if custom_audio_dir else base_dir / 'DEAM_audio' / 'MEMD_audio'
+    output_dir = Path(custom_output_dir) if custom_output_dir else base_dir
+
+    return {
+        'base_dir': base_dir,
+        'annotations_dir': annotations_dir,
+        'audio_dir': audio_dir,
+        'output_dir': output_dir
+    }
+
+def read_dynamic_csv(path, value_name):
+    """
+    Legge un file di annotazioni dinamiche DEAM e lo converte in formato lungo
+
+    Parameters:
+    -----------
+    path : str o Path
+        File CSV con una riga per brano e una colonna sample_<ms>ms per istante
+    value_name : str
+        Nome della colonna dei valori (es. 'arousal')
+
+    Returns:
+    --------
+    DataFrame
+        Colonne song_id, time_ms, <value_name>, senza gli istanti non annotati
+    """
+    wide = pd.read_csv(path, skipinitialspace=True)
+    wide.columns = wide.columns.str.strip()
+    long = wide.melt(id_vars='song_id', var_name='sample', value_name=value_name).dropna(subset=[value_name])
+    long['time_ms'] = long['sample'].str.extract(r'(\d+)ms', expand=False).astype(int)
+    return long[['song_id', 'time_ms', value_name]]
+
+def load_dynamic_annotations(annotations_dir):
+    """
+    Carica le annotazioni dinamiche di arousal e valence di tutti i brani
+
+    Parameters:
+    -----------
+    annotations_dir : str o Path
+        Directory con arousal.csv e valence.csv
+
+    Returns:
+    --------
+    DataFrame
+        Colonne song_id, time_ms, arousal, valence, ordinate per brano e istante
+    """
+    annotations_dir = Path(annotations_dir)
+    arousal = read_dynamic_csv(annotations_dir / DYNAMIC_FILES['arousal'], 'arousal')
+    valence = read_dynamic_csv(annotations_dir / DYNAMIC_FILES['valence'], 'valence')
+    annotations = arousal.merge(valence, on=['song_id', 'time_ms'], how='inner')
+    return annotations.sort_values(['song_id', 'time_ms']).reset_index(drop=True)
+
+def annotation_period(annotations):
+    """
+    Passo temporale delle annotazioni (il più frequente tra istanti consecutivi)
+
+    Parameters:
+    -----------
+    annotations : DataFrame
+        Annotazioni in formato lungo, ordinate per brano e istante
+
+    Returns:
+    --------
+    float
+        Passo in secondi (0.5 per DEAM)
+    """
+    steps = annotations.groupby('song_id')['time_ms'].diff().dropna()
+    return float(steps.mode().iloc[0]) / 1000 if len(steps) else 0.5
+
+def framewise_descriptors(plan):
+    """
+    Descrittori per frame di un brano, tutti derivati dallo stesso STFT
+
+    Parameters:
+    -----------
+    plan : SpectralPlan
+        Piano spettrale del brano
+
+    Returns:
+    --------
+    dict
+        Nome della colonna -> vettore con un valore per frame
+    """
+    descriptors = {
+        'rms': plan.rms,
+        'zero_crossing_rate': plan.zero_crossing_rate,
+        'spectral_centroid': plan.spectral_centroid,
+        'spectral_rolloff': plan.spectral_rolloff,
+        'spectral_bandwidth': plan.spectral_bandwidth,
+        'spectral_flatness': plan.spectral_flatness,
+        'spectral_contrast': plan.spectral_contrast.mean(axis=0),
+        'onset_strength': plan.onset_envelope
+    }
+    descriptors.update({f'mfcc_{i + 1}': row for i, row in enumerate(plan.mfcc())})
+    descriptors.update({f'chroma_{key}': row for key, row in zip(KEY_NAMES, plan.chroma)})
+    return descriptors
+
+# Colonne dei descrittori prodotte da framewise_descriptors, nell'ordine di output
+FRAME_COLUMNS = (['rms', 'zero_crossing_rate', 'spectral_centroid', 'spectral_rolloff', 'spectral_bandwidth',
+                  'spectral_flatness', 'spectral_contrast', 'onset_strength']
+                 + [f'mfcc_{i}' for i in range(1, 14)] + [f'chroma_{key}' for key in KEY_NAMES])
+
+def window_means(matrix, times, period):
+    """
+    Media dei descrittori per finestre consecutive di durata period, senza cicli sui frame
+
+    La finestra k raccoglie i frame con istante in [k * period, (k + 1) * period) ed è
+    etichettata con l'istante finale (k + 1) * period, come le annotazioni DEAM, che
+    descrivono il mezzo secondo che le precede.
+
+    Parameters:
+    -----------
+    matrix : np.ndarray
+        Matrice (n_descrittori, n_frame)
+    times : np.ndarray
+        Istante in secondi di ogni frame (crescente)
+    period : float
+        Durata in secondi di ogni finestra
+
+    Returns:
+    --------
+    tuple
+        (istanti finali delle finestre in millisecondi, matrice (n_finestre, n_descrittori))
+    """
+    window = np.floor(times / period + 1e-9).astype(int)
+    starts = np.flatnonzero(np.r_[True, np.diff(window) != 0])
+    counts = np.diff(np.r_[starts, len(window)])
+    means = np.add.reduceat(matrix, starts, axis=1) / counts
+    time_ms = np.round((window[starts] + 1) * period * 1000).astype(int)
+    return time_ms, means.T
+
+def extract_dynamic_features(audio_path, period=0.5, duration=None, profile=DEFAULT_PROFILE):
+    """
+    Calcola i descrittori medi di un brano per ogni finestra di annotazione
+
+    Parameters:
+    -----------
+    audio_path : str o Path
+        Percorso al file audio
+    period : float
+        Durata in secondi delle finestre (il passo delle annotazioni)
+    duration : float, optional
+        Durata in secondi da caricare (None per caricare l'intero file)
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+
+    Returns:
+    --------
+    tuple
+        (istanti finali delle finestre in millisecondi, matrice float32 (n_finestre,
+        len(FRAME_COLUMNS)))
+    """
+    settings = get_profile(profile)
+    y, sr = librosa.load(audio_path, sr=settings['sr'], res_type=settings['res_type'], duration=duration)
+    plan = SpectralPlan(y, sr, n_fft=settings['n_fft'], hop_length=settings['hop_length'],
+                        contrast_bands=settings['contrast_bands'])
+    descriptors = framewise_descriptors(plan)
+    matrix = np.vstack([descriptors[col] for col in FRAME_COLUMNS])
+    times = librosa.frames_to_time(np.arange(matrix.shape[1]), sr=sr, hop_length=settings['hop_length'])
+    time_ms, means = window_means(matrix, times, period)
+    return time_ms, means.astype(np.float32)
+
+# Impostazioni comuni a tutti i task di un processo, ricevute una sola volta all'avvio
+_worker_config = {}
+
+def init_worker(period, profile):
+    """
+    Inizializza un processo di estrazione con il passo delle annotazioni e il profilo
+
+    Parameters:
+    -----------
+    period : float
+        Durata in secondi delle finestre
+    profile : str
+        Profilo di estrazione
+    """
+    _worker_config.update(period=period, profile=profile)
+
+def process_song(task):
+    """
+    Estrae i descrittori per finestra di un brano (utilizzata per il multiprocessing)
+
+    Parameters:
+    -----------
+    task : tuple
+        Tupla (song_id, audio_path, duration)
+
+    Returns:
+    --------
+    tuple
+        (song_id, istanti in millisecondi, matrice dei descrittori)
+    """
+    song_id, audio_path, duration = task
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"File audio non trovato: {audio_path}")
+    time_ms, means = extract_dynamic_features(audio_path, _worker_config['period'], duration,
+                                              _worker_config['profile'])
+    return song_id, time_ms, means
+
+def build_dynamic_dataset(annotations, audio_dir, period=None, profile=DEFAULT_PROFILE, n_jobs=None, timeout=None):
+    """
+    Costruisce la tabella di addestramento a livello di frame, allineata alle annotazioni
+
+    Ogni brano viene decodificato una sola volta (fino all'ultimo istante annotato), i
+    descrittori per frame vengono calcolati da un unico STFT e mediati per finestre di
+    annotazione, poi uniti alle annotazioni per (song_id, istante).
+
+    Parameters:
+    -----------
+    annotations : DataFrame
+        Annotazioni dinamiche (song_id, time_ms, arousal, valence)
+    audio_dir : str o Path
+        Directory con i file audio (<song_id>.mp3)
+    period : float, optional
+        Durata in secondi delle finestre (None per il passo delle annotazioni)
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    n_jobs : int, optional
+        Numero di processi (default: numero di CPU - 1)
+    timeout : float, optional
+        Tempo massimo in secondi per un singolo brano, None per nessun limite
+
+    Returns:
+    --------
+    DataFrame
+        Una riga per brano e istante annotato: song_id, time, arousal, valence, i
+        descrittori di FRAME_COLUMNS ed extraction_profile; l'elenco dei brani non
+        estratti è in attrs['failures']
+    """
+    period = period or annotation_period(annotations)
+    n_jobs = n_jobs or max(1, multiprocessing.cpu_count() - 1)
+
+    # Ogni brano viene caricato solo fino all'ultimo istante annotato
+    last_ms = annotations.groupby('song_id')['time_ms'].max()
+    tasks = [(int(song_id), str(Path(audio_dir) / f"{song_id}.mp3"), ms / 1000 + period)
+             for song_id, ms in last_ms.items()]
+    chunks = [[(tasks[i][0], tasks[i]) for i in chunk] for chunk in plan_chunks([task[2] for task in tasks], n_jobs)]
+
+    print(f"Estrazione dei descrittori per finestra di {len(tasks)} brani (passo {period:.3f} s)...")
+    results, failures = [], []
+    pool = SupervisedPool(n_jobs, process_song, initializer=init_worker, initargs=(period, profile), timeout=timeout)
+    with tqdm(total=len(tasks)) as progress:
+        for song_id, status, payload, elapsed in pool.run(chunks):
+            if status == 'ok':
+                results.append(payload)
+            else:
+                error_type, detail = payload
+                failures.append({'song_id': song_id, 'reason': status, 'error_type': error_type, 'detail': detail})
+            progress.update(1)
+
+    if results:
+        frames = pd.DataFrame(np.vstack([means for _, _, means in results]), columns=FRAME_COLUMNS)
+        frames.insert(0, 'song_id', np.concatenate([np.full(len(time_ms), song_id) for song_id, time_ms, _ in results]))
+        frames.insert(1, 'time_ms', np.concatenate([time_ms for _, time_ms, _ in results]))
+    else:
+        frames = pd.DataFrame(columns=['song_id', 'time_ms'] + FRAME_COLUMNS)
+
+    # Allineamento agli istanti annotati
+    dataset = annotations.merge(frames.astype({'song_id': annotations['song_id'].dtype}),
+                                on=['song_id', 'time_ms'], how='inner')
+    dataset.insert(1, 'time', dataset.pop('time_ms') / 1000)
+    dataset['extraction_profile'] = profile_fingerprint(profile)
+    unaligned = len(results) - dataset['song_id'].nunique()
+    if unaligned:
+        print(f"Attenzione: {unaligned} brani estratti non hanno finestre negli istanti annotati (audio troppo corto)")
+    dataset = dataset.sort_values(['song_id', 'time']).reset_index(drop=True)
+    dataset.attrs['failures'] = failures
+    return dataset
+
+def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Costruisce la tabella a livello di frame dalle annotazioni dinamiche DEAM')
+    parser.add_argument('--annotations-dir', type=str, help='Directory con arousal.csv e valence.csv delle annotazioni dinamiche')
+    parser.add_argument('--audio-dir', type=str, help='Directory con i file audio DEAM (<song_id>.mp3)')
+    parser.add_argument('--output-dir', type=str, help='Directory per i file di output')
+    parser.add_argument('--song-ids', type=str, help='Elenco di song_id separati da virgola da elaborare')
+    parser.add_argument('--period', type=float, help='Durata in secondi delle finestre (default: passo delle annotazioni)')
+    parser.add_argument('--n-jobs', type=int, help='Numero di processi paralleli da utilizzare')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Tempo massimo in secondi per un singolo brano (default: 600, 0 per nessun limite)')
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help='Profilo di estrazione: frequenza di analisi, ricampionatore e parametri STFT')
+    parser.add_argument('--store-dir', type=str, help='Directory del dataset nel feature store (default: <progetto>/features/deam_dynamic)')
+    parser.add_argument('--csv', action='store_true', help='Salva anche il file CSV con timestamp')
+    args = parser.parse_args()
+
+    paths = get_project_paths(args.annotations_dir, args.audio_dir, args.output_dir)
+    for name in DYNAMIC_FILES.values():
+        if not (paths['annotations_dir'] / name).exists():
+            print(f"File delle annotazioni dinamiche non trovato: {paths['annotations_dir'] / name}")
+            return
+
+    print(f"Caricamento delle annotazioni dinamiche da {paths['annotations_dir']}...")
+    annotations = load_dynamic_annotations(paths['annotations_dir'])
+    if args.song_ids:
+        song_ids = [int(song_id) for song_id in args.song_ids.split(',') if song_id.strip()]
+        annotations = annotations[annotations['song_id'].isin(song_ids)]
+    print(f"Annotazioni caricate: {annotations['song_id'].nunique()} brani, {len(annotations)} istanti")
+
+    start_time = time.time()
+    dataset = build_dynamic_dataset(annotations, paths['audio_dir'], args.period, args.profile,
+                                    n_jobs=args.n_jobs, timeout=args.timeout or None)
+    elapsed = time.time() - start_time
+
+    failures = dataset.attrs['failures']
+    print(f"\nBrani elaborati: {dataset['song_id'].nunique()}, righe della tabella: {len(dataset)}")
+    print(f"Tempo di estrazione: {elapsed:.1f} secondi")
+    if failures:
+        print(f"Brani non estratti: {len(failures)}")
+        for failure in failures[:20]:
+            print(f"  {failure['song_id']}: {failure['error_type']} - {failure['detail']}")
+
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    store_dir = args.store_dir or get_store_paths(paths['base_dir'])['deam_dynamic']
+    output_file = write_features(dataset, store_dir, run_id=timestamp)
+    print(f"\nTabella a livello di frame salvata nel feature store:\n{output_file}")
+
+    if args.csv:
+        csv_file = paths['output_dir'] / f'deam_dynamic_features_{timestamp}.csv'
+        dataset.to_csv(csv_file, index=False)
+        print(f"File CSV salvato in:\n{csv_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import os
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import soundfile as sf
+
+from feature_cache import open_cache, cached_extraction
+from compiled_predictor import COMPILED_MODEL_FILE
+from predict_new_audio import (JOINT_MODEL_FILE, extract_audio_features, load_models, model_columns,
+                               prediction_fingerprint, predict_batch)
+from extraction_profiles import DEFAULT_PROFILE, PROFILES
+
+# Numero di latenze recenti conservate per calcolare i percentili
+LATENCY_WINDOW = 1000
+
+class MicroBatcher:
+    """
+    Raggruppa le richieste concorrenti in micro-batch per model.predict
+
+    Ogni richiesta accoda le proprie feature e riceve un Future; un thread dedicato
+    raccoglie fino a max_batch_size richieste (aspettando al più max_wait_ms dopo la
+    prima) e le predice con una sola chiamata vettoriale per target.
+
+    Parameters:
+    -----------
+    models : dict
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    metrics : ServerMetrics
+        Metriche del server da aggiornare
+    max_batch_size : int
+        Numero massimo di file per micro-batch
+    max_wait_ms : float
+        Attesa massima (in millisecondi) per riempire un micro-batch
+    """
+
+    def __init__(self, models, metrics, max_batch_size=64, max_wait_ms=10):
+        self.models = models
+        self.metrics = metrics
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, features):
+        """
+        Accoda le feature di un file e restituisce il Future della predizione
+
+        Parameters:
+        -----------
+        features : dict
+            Dizionario con le caratteristiche audio estratte
+
+        Returns:
+        --------
+        Future
+            Future che restituisce il dizionario {'arousal': ..., 'valence': ...}
+        """
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            try:
+                predictions = predict_batch([features for features, _ in batch], self.models)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch), time.perf_counter() - start)
+            for i, (_, future) in enumerate(batch):
+                future.set_result({target: float(values[i]) for target, values in predictions.items()})
+
+class ServerMetrics:
+    """
+    Metriche di latenza e throughput del server di predizione (thread-safe)
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.files = 0
+        self.batches = 0
+        self.batched_files = 0
+        self._latencies = {name: deque(maxlen=LATENCY_WINDOW) for name in ['extract', 'predict', 'total', 'batch']}
+
+    def record_request(self, n_files, extract_s, predict_s, total_s, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.files += n_files
+            if not error:
+                self._latencies['extract'].append(extract_s)
+                self._latencies['predict'].append(predict_s)
+                self._latencies['total'].append(total_s)
+
+    def record_batch(self, size, predict_s):
+        with self._lock:
+            self.batches += 1
+            self.batched_files += size
+            self._latencies['batch'].append(predict_s)
+
+    def snapshot(self):
+        """
+        Restituisce le metriche correnti
+
+        Returns:
+        --------
+        dict
+            Contatori, throughput e percentili di latenza (in millisecondi)
+        """
+        with self._lock:
+            uptime = time.time() - self.started
+            latencies = {}
+            for name, values in self._latencies.items():
+                if values:
+                    p50, p95, p99 = np.percentile(np.fromiter(values, dtype=float), [50, 95, 99]) * 1000
+                    latencies[name] = {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+            return {
+                'uptime_s': round(uptime, 1),
+                'requests': self.requests,
+                'errors': self.errors,
+                'files': self.files,
+                'files_per_s': round(self.files / uptime, 3) if uptime > 0 else 0.0,
+                'batches': self.batches,
+                'mean_batch_size': round(self.batched_files / self.batches, 2) if self.batches else 0.0,
+                'latency': latencies
+            }
+
+class EmotionService:
+    """
+    Pipeline residente: modelli caricati una volta, estrazione riscaldata e micro-batching
+
+    Parameters:
+    -----------
+    models : dict
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    cache : FeatureCache, optional
+        Cache delle feature (None per estrarre sempre)
+    max_batch_size : int
+        Numero massimo di file per micro-batch
+    max_wait_ms : float
+        Attesa massima per riempire un micro-batch
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    """
+
+    def __init__(self, models, cache=None, max_batch_size=64, max_wait_ms=10, profile=DEFAULT_PROFILE):
+        self.models = models
+        self.cache = cache
+        # Solo le feature richieste dai modelli (senza beat tracking se il tempo non serve)
+        self.extract = partial(extract_audio_features, columns=model_columns(models), profile=profile)
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(models, self.metrics, max_batch_size, max_wait_ms)
+
+    def warm_up(self):
+        """
+        Esegue una predizione su un segnale sintetico, così che import, compilazione JIT
+        di librosa/numba e allocazioni avvengano all'avvio e non alla prima richiesta
+        """
+        sr = 22050
+        t = np.arange(2 * sr) / sr
+        y = 0.3 * np.sin(2 * np.pi * 440 * t)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            warm_path = os.path.join(tmp_dir, 'warm_up.wav')
+            sf.write(warm_path, y, sr)
+            features = self.extract(warm_path)
+        if features is not None:
+            self.batcher.submit(features).result()
+
+    def predict_paths(self, audio_paths):
+        """
+        Estrae le feature dei file e ne predice arousal e valence tramite il micro-batcher
+
+        Parameters:
+        -----------
+        audio_paths : list
+            Lista dei percorsi dei file audio
+
+        Returns:
+        --------
+        list
+            Un dizionario per file con 'file', 'arousal', 'valence' e 'status'
+        """
+        start = time.perf_counter()
+        all_features = [cached_extraction(self.cache, audio_path, self.extract) if os.path.exists(audio_path)
+                        else None for audio_path in audio_paths]
+        extracted = time.perf_counter()
+
+        # Le feature vengono accodate tutte insieme, così finiscono nello stesso micro-batch
+        futures = [self.batcher.submit(features) if features is not None else None for features in all_features]
+
+        results = []
+        for audio_path, future in zip(audio_paths, futures):
+            if future is None:
+                results.append({'file': audio_path, 'arousal': None, 'valence': None, 'status': 'failed'})
+            else:
+                results.append({'file': audio_path, **future.result(), 'status': 'ok'})
+        end = time.perf_counter()
+
+        self.metrics.record_request(len(audio_paths), extracted - start, end - extracted, end - start)
+        return results
+
+    def predict_upload(self, data, suffix='.mp3', name='upload'):
+        """
+        Predice arousal e valence per un file audio caricato nel corpo della richiesta
+
+        Parameters:
+        -----------
+        data : bytes
+            Contenuto del file audio
+        suffix : str
+            Estensione del file, usata dal decoder per riconoscerne il formato
+        name : str
+            Nome riportato nel risultato
+
+        Returns:
+        --------
+        dict
+            Dizionario con 'file', 'arousal', 'valence' e 'status'
+        """
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp_file:
+            tmp_file.write(data)
+        try:
+            result = self.predict_paths([tmp_file.name])[0]
+        finally:
+            os.unlink(tmp_file.name)
+        result['file'] = name
+        return result
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    Gestore HTTP del servizio di predizione
+
+    Endpoint:
+    - GET  /health   stato del servizio
+    - GET  /metrics  metriche di latenza e throughput
+    - POST /predict  JSON {"path": ...} o {"paths": [...]}, oppure il file audio come
+                     corpo della richiesta (?name=brano.mp3 per indicarne nome ed estensione)
+    """
+
+    service = None
+
+    def address_string(self):
+        # Sul socket Unix client_address è una stringa vuota
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/metrics':
+            self._send_json(200, self.service.metrics.snapshot())
+        else:
+            self._send_json(404, {'error': f'Endpoint non trovato: {path}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json(404, {'error': f'Endpoint non trovato: {url.path}'})
+            return
+
+        start = time.perf_counter()
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                request = json.loads(body)
+                if not isinstance(request, dict):
+                    raise ValueError("il corpo JSON deve essere un oggetto")
+                paths = request['paths'] if 'paths' in request else [request['path']]
+                if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                    raise ValueError("'paths' deve essere una lista di stringhe e 'path' una stringa")
+                self._send_json(200, {'predictions': self.service.predict_paths(paths)})
+            else:
+                name = parse_qs(url.query).get('name', ['upload.mp3'])[0]
+                result = self.service.predict_upload(body, Path(name).suffix or '.mp3', name)
+                self._send_json(200, {'predictions': [result]})
+        except (KeyError, ValueError) as e:
+            self.service.metrics.record_request(0, 0, 0, time.perf_counter() - start, error=True)
+            self._send_json(400, {'error': f'Richiesta non valida: {e}'})
+        except Exception as e:
+            self.service.metrics.record_request(0, 0, 0, time.perf_counter() - start, error=True)
+            self._send_json(500, {'error': str(e)})
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Server HTTP multi-thread in ascolto su un socket Unix
+    """
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+def create_server(service, host='127.0.0.1', port=8765, unix_socket=None):
+    """
+    Crea il server HTTP (TCP o socket Unix) per il servizio di predizione
+
+    Parameters:
+    -----------
+    service : EmotionService
+        Servizio di predizione con i modelli residenti
+    host : str
+        Indirizzo TCP su cui ascoltare
+    port : int
+        Porta TCP su cui ascoltare
+    unix_socket : str, optional
+        Percorso del socket Unix (se indicato sostituisce host e porta)
+
+    Returns:
+    --------
+    socketserver.BaseServer
+        Server pronto per serve_forever()
+    """
+    handler = type('BoundPredictionHandler', (PredictionHandler,), {'service': service})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Servizio locale di predizione di arousal e valence')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Indirizzo TCP su cui ascoltare')
+    parser.add_argument('--port', type=int, default=8765, help='Porta TCP su cui ascoltare')
+    parser.add_argument('--unix-socket', type=str, help='Percorso del socket Unix (al posto di host e porta)')
+    parser.add_argument('--models-dir', type=str, default='emotion_prediction_results', help='Directory dei modelli addestrati')
+    parser.add_argument('--joint', action='store_true',
+                        help=f'Usa il modello congiunto di arousal e valence ({JOINT_MODEL_FILE}, da predict_emotions.py --joint)')
+    parser.add_argument('--compiled', action='store_true',
+                        help=f'Usa i modelli compilati in array NumPy ({COMPILED_MODEL_FILE}, da compile_models.py)')
+    parser.add_argument('--max-batch-size', type=int, default=64, help='Numero massimo di file per micro-batch')
+    parser.add_argument('--max-wait-ms', type=float, default=10, help='Attesa massima per riempire un micro-batch')
+    parser.add_argument('--cache-dir', type=str, help='Directory della cache delle feature (default: <progetto>/feature_cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Ricalcola sempre le feature ignorando la cache')
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help='Profilo di estrazione: frequenza di analisi, ricampionatore e dimensione della FFT')
+    args = parser.parse_args()
+
+    # Carica i modelli una sola volta
+    models = load_models(args.models_dir, args.joint, args.compiled)
+    if models is None:
+        print("Impossibile procedere senza i modelli. Esegui prima predict_emotions.py")
+        return
+
+    # Cache delle feature indirizzata per contenuto audio e impronta dell'estrattore
+    cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or str(Path(os.path.dirname(os.path.abspath(__file__))) / 'feature_cache')
+        cache = open_cache(cache_dir, prediction_fingerprint(model_columns(models), profile=args.profile))
+
+    service = EmotionService(models, cache, args.max_batch_size, args.max_wait_ms, args.profile)
+    print("Riscaldamento della pipeline di estrazione...")
+    start = time.perf_counter()
+    service.warm_up()
+    print(f"Pipeline pronta in {time.perf_counter() - start:.2f} secondi")
+
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    address = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Servizio di predizione in ascolto su {address} (Ctrl+C per terminare)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArresto del servizio...")
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+if __name__ == "__main__":
+    main()
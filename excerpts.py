@@ -0,0 +1,280 @@
+import numpy as np
+import librosa
+import soundfile as sf
+
+from spectral_plan import SpectralPlan
+from streaming import STREAMED_DESCRIPTORS, RunningStats
+
+# Modi di scelta delle finestre da analizzare:
+# - 'peaks': finestre attorno ai picchi di energia, trovati sondando il file a intervalli regolari
+# - 'uniform': finestre equidistanti lungo il brano, senza alcun sondaggio preliminare
+EXCERPT_MODES = ['peaks', 'uniform']
+
+# Numero e durata (secondi) predefiniti delle finestre
+DEFAULT_WINDOWS = 3
+DEFAULT_LENGTH = 10.0
+
+# Sondaggio dell'energia: distanza minima tra i punti sondati e durata letta a ogni punto
+# (secondi); nei brani molto lunghi i punti vengono diradati per non superare MAX_PROBES
+PROBE_INTERVAL = 1.0
+PROBE_LENGTH = 0.25
+MAX_PROBES = 600
+
+def make_excerpt_options(windows=0, length=DEFAULT_LENGTH, mode='peaks'):
+    """
+    Raccoglie le opzioni della modalità a estratti
+
+    Parameters:
+    -----------
+    windows : int
+        Numero di finestre da analizzare (0 per analizzare l'intero brano)
+    length : float
+        Durata in secondi di ogni finestra
+    mode : str
+        Modo di scelta delle finestre, uno di EXCERPT_MODES
+
+    Returns:
+    --------
+    dict
+        Opzioni per ExcerptPlan (vuoto se la modalità è disattivata, così che l'impronta
+        della cache non cambi)
+    """
+    if not windows:
+        return {}
+    if mode not in EXCERPT_MODES:
+        raise ValueError(f"Modo di scelta degli estratti non valido: {mode} (validi: {', '.join(EXCERPT_MODES)})")
+    return {'windows': int(windows), 'length': float(length), 'mode': mode}
+
+def probe_energy(audio_path, total, interval=PROBE_INTERVAL, probe_length=PROBE_LENGTH):
+    """
+    Stima l'andamento dell'energia leggendo brevi frammenti a intervalli regolari
+
+    Il file viene posizionato (seek) su ogni punto di sondaggio e ne vengono decodificati
+    solo probe_length secondi, alla frequenza originale e senza ricampionamento.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    total : float
+        Durata in secondi della parte di file da sondare
+    interval : float
+        Distanza in secondi tra i punti sondati
+    probe_length : float
+        Durata in secondi letta a ogni punto
+
+    Returns:
+    --------
+    tuple
+        (istanti dei punti sondati in secondi, energia RMS di ciascun punto)
+    """
+    times = np.arange(0.0, max(total - probe_length, 0.0) + 1e-9, interval)
+    energy = np.zeros(len(times))
+    with sf.SoundFile(audio_path) as f:
+        n_read = max(1, int(probe_length * f.samplerate))
+        for i, t in enumerate(times):
+            f.seek(min(int(t * f.samplerate), max(f.frames - 1, 0)))
+            data = f.read(n_read, dtype='float32', always_2d=True)
+            if len(data):
+                energy[i] = np.sqrt(np.mean(data.mean(axis=1) ** 2))
+    return times, energy
+
+def peak_windows(times, energy, windows, length, total):
+    """
+    Sceglie le finestre non sovrapposte con la maggiore energia media
+
+    Parameters:
+    -----------
+    times : np.ndarray
+        Istanti dei punti sondati in secondi
+    energy : np.ndarray
+        Energia RMS di ciascun punto
+    windows : int
+        Numero di finestre
+    length : float
+        Durata in secondi di ogni finestra
+    total : float
+        Durata in secondi della parte di file analizzabile
+
+    Returns:
+    --------
+    list
+        Istanti di inizio delle finestre in secondi, in ordine crescente
+    """
+    # Energia media dei punti che cadono in ciascuna finestra candidata
+    starts = times[times + length <= total + 1e-9]
+    if len(starts) == 0:
+        return [0.0]
+    cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+    first = np.searchsorted(times, starts)
+    last = np.searchsorted(times, starts + length)
+    score = (cumulative[last] - cumulative[first]) / np.maximum(last - first, 1)
+
+    chosen = []
+    for _ in range(windows):
+        best = int(np.argmax(score))
+        if not np.isfinite(score[best]):
+            break
+        chosen.append(float(starts[best]))
+        # Esclude le finestre che si sovrapporrebbero a quella scelta
+        score[np.abs(starts - starts[best]) < length] = -np.inf
+    return sorted(chosen)
+
+def uniform_windows(windows, length, total):
+    """
+    Finestre equidistanti, centrate su intervalli uguali del brano
+
+    Parameters:
+    -----------
+    windows : int
+        Numero di finestre
+    length : float
+        Durata in secondi di ogni finestra
+    total : float
+        Durata in secondi della parte di file analizzabile
+
+    Returns:
+    --------
+    list
+        Istanti di inizio delle finestre in secondi, in ordine crescente
+    """
+    centers = (np.arange(windows) + 0.5) * total / windows
+    return [float(start) for start in np.clip(centers - length / 2, 0.0, max(total - length, 0.0))]
+
+def excerpt_windows(audio_path, windows=DEFAULT_WINDOWS, length=DEFAULT_LENGTH, mode='peaks', duration=None):
+    """
+    Sceglie le finestre da analizzare in un file audio
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    windows : int
+        Numero di finestre
+    length : float
+        Durata in secondi di ogni finestra
+    mode : str
+        Modo di scelta delle finestre, uno di EXCERPT_MODES
+    duration : float, optional
+        Considera solo i primi duration secondi del file (None per l'intero file)
+
+    Returns:
+    --------
+    list
+        Coppie (offset, durata) in secondi; un'unica coppia (0, duration) se il brano
+        non è più lungo degli estratti richiesti
+    """
+    try:
+        total = sf.info(audio_path).duration
+        seekable = True
+    except Exception:
+        # Formati non gestiti da soundfile (es. m4a): nessun sondaggio dell'energia
+        total = librosa.get_duration(path=audio_path)
+        seekable = False
+    if duration:
+        total = min(total, duration)
+
+    if windows * length >= total:
+        return [(0.0, duration)]
+    if mode == 'peaks' and seekable:
+        interval = max(PROBE_INTERVAL, total / MAX_PROBES)
+        starts = peak_windows(*probe_energy(audio_path, total, interval), windows, length, total)
+    else:
+        starts = uniform_windows(windows, length, total)
+    return [(start, length) for start in starts]
+
+class ExcerptPlan:
+    """
+    Riduzioni dei descrittori spettrali calcolate su alcune finestre del brano
+
+    Offre le stesse riduzioni di SpectralPlan (mean, std, sum, tempo): ogni finestra
+    viene decodificata posizionandosi direttamente sul suo inizio, analizzata con uno
+    SpectralPlan e i suoi descrittori vengono accumulati in RunningStats, così che medie
+    e deviazioni standard siano quelle dell'insieme dei frame di tutte le finestre. Il
+    tempo è la mediana dei tempi stimati nelle finestre con onset.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    sr : int
+        Frequenza di campionamento di analisi
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    duration : float, optional
+        Considera solo i primi duration secondi del file (None per l'intero file)
+    descriptors : iterable, optional
+        Descrittori da accumulare, tra STREAMED_DESCRIPTORS, 'spectral_flux' e 'tempo'
+        (None per tutti)
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    res_type : str
+        Ricampionatore usato da librosa.load
+    contrast_bands : int
+        Numero di bande del contrasto spettrale
+    windows : int
+        Numero di finestre
+    length : float
+        Durata in secondi di ogni finestra
+    mode : str
+        Modo di scelta delle finestre, uno di EXCERPT_MODES
+    """
+
+    def __init__(self, audio_path, sr=22050, n_fft=2048, hop_length=512, duration=None, descriptors=None,
+                 tempo_options=None, res_type='soxr_hq', contrast_bands=6, windows=DEFAULT_WINDOWS,
+                 length=DEFAULT_LENGTH, mode='peaks'):
+        self.sr = sr
+        self.hop_length = hop_length
+        if descriptors is None:
+            descriptors = STREAMED_DESCRIPTORS + ['spectral_flux', 'tempo']
+        descriptors = set(descriptors)
+        self.stats = {name: RunningStats() for name in STREAMED_DESCRIPTORS + ['spectral_flux']
+                      if name in descriptors}
+        self.windows = excerpt_windows(audio_path, windows, length, mode, duration)
+        self.n_frames = 0
+        self.tempos = []
+
+        for offset, window_length in self.windows:
+            y, _ = librosa.load(audio_path, sr=sr, res_type=res_type, offset=offset, duration=window_length)
+            if len(y) == 0:
+                continue
+            plan = SpectralPlan(y, sr, n_fft, hop_length, tempo_options=tempo_options, contrast_bands=contrast_bands)
+            for name, stats in self.stats.items():
+                stats.update(plan.descriptor(name))
+            if 'tempo' in descriptors:
+                self.tempos.append(float(np.atleast_1d(plan.tempo())[0]))
+            self.n_frames += 1 + len(y) // hop_length
+
+        if self.n_frames == 0:
+            raise ValueError(f"Nessun campione audio negli estratti di {audio_path}")
+
+    @property
+    def duration(self):
+        """Durata analizzata in secondi"""
+        return librosa.frames_to_time(self.n_frames, sr=self.sr, hop_length=self.hop_length)
+
+    def tempo(self):
+        """
+        Mediana dei tempi (BPM) stimati nelle finestre con onset
+
+        Returns:
+        --------
+        np.ndarray o float
+            Array di un elemento con il tempo in BPM (0.0 se nessuna finestra ha onset)
+        """
+        tempos = [tempo for tempo in self.tempos if tempo > 0]
+        return np.array([np.median(tempos)]) if tempos else 0.0
+
+    def mean(self, name, axis=None):
+        """Media del descrittore su tutti i valori (axis=None) o per riga (axis=1)"""
+        return self.stats[name].mean(axis)
+
+    def std(self, name):
+        """Deviazione standard del descrittore su tutti i valori"""
+        return self.stats[name].std()
+
+    def sum(self, name, axis=1):
+        """Somma del descrittore sui frame (per riga)"""
+        return self.stats[name].sum(axis)
@@ -2,10 +2,26 @@ import os
 import librosa
 import numpy as np
 import pandas as pd
-import music21
 import argparse
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice
 from pathlib import Path
 
+from feature_store import get_store_paths, write_features
+from feature_cache import DEFAULT_MAX_BYTES, cached_extraction, extractor_fingerprint, open_cache
+from spectral_plan import SpectralPlan
+from feature_registry import FEATURE_SETS, build_plan, compute_features
+from extraction_profiles import DEFAULT_PROFILE, PROFILES, get_profile, profile_fingerprint
+from excerpts import DEFAULT_LENGTH, EXCERPT_MODES, make_excerpt_options
+from tonality import rank_scales
+
+# Version of the extraction code, part of the feature cache fingerprint:
+# bump it whenever the computed features change
+EXTRACTOR_VERSION = 1
+
 # Configurazione dei percorsi
 def get_project_paths(custom_audio_dir=None, custom_output_dir=None):
     """
@@ -44,6 +60,28 @@ def get_project_paths(custom_audio_dir=None, custom_output_dir=None):
         'output_dir': output_dir
     }
 
+def load_audio(audio_path, duration=None, profile=DEFAULT_PROFILE):
+    """
+    Decodes an audio file once so that the signal can be shared by all extractors.
+    
+    Parameters:
+    -----------
+    audio_path : str
+        Path to the audio file
+    duration : float, optional
+        Duration in seconds to load (None to load the entire file)
+    profile : str
+        Extraction profile (see extraction_profiles.PROFILES) that sets the
+        analysis sampling rate and the resampler
+    
+    Returns:
+    --------
+    tuple
+        (y, sr) decoded mono signal and its sampling rate
+    """
+    settings = get_profile(profile)
+    return librosa.load(audio_path, sr=settings['sr'], res_type=settings['res_type'], duration=duration)
+
 def extract_audio_features(audio_path, duration=None):
     """
     Extracts basic audio features for a given audio file.
@@ -61,48 +99,40 @@ def extract_audio_features(audio_path, duration=None):
         Dictionary with extracted audio features
     """
     try:
-        # Load the audio file
-        y, sr = librosa.load(audio_path, duration=duration)
-        
-        # Calculate audio features for the entire song
-        # 1. Energy (RMS)
-        rms = np.mean(librosa.feature.rms(y=y)[0])
-        
-        # 2. Spectral centroid (brightness)
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)[0])
-        
-        # 3. Spectral rolloff (energy distribution)
-        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)[0])
-        
-        # 4. Chromatic scale (pitch class representation)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        chroma_mean = np.mean(chroma)
-        
-        # Determine the predominant key
-        chroma_sum = np.sum(chroma, axis=1)
-        key_index = np.argmax(chroma_sum)
-        # Map the key index to musical notation (C, C#, D, etc.)
-        key_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        predominant_key = key_names[key_index]
-        
-        # 5. MFCC (Mel-Frequency Cepstral Coefficients)
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        mfcc_means = np.mean(mfccs, axis=1)
-        
-        # Create a dictionary with all extracted features
-        features = {
-            'rms': rms,
-            'spectral_centroid': spectral_centroid,
-            'spectral_rolloff': spectral_rolloff,
-            'chroma_mean': chroma_mean,
-            'predominant_key': predominant_key
-        }
+        y, sr = load_audio(audio_path, duration=duration)
+    except Exception as e:
+        print(f"Error extracting basic features for {audio_path}: {e}")
+        return None
+    
+    return extract_audio_features_from_signal(y, sr, audio_path)
+
+def extract_audio_features_from_signal(y, sr, audio_path=None, plan=None):
+    """
+    Extracts basic audio features from an already decoded signal.
+    
+    Parameters:
+    -----------
+    y : np.ndarray
+        Mono audio signal
+    sr : int
+        Sampling rate of the signal
+    audio_path : str, optional
+        Path of the source file, only used in error messages
+    plan : SpectralPlan or StreamingPlan, optional
+        Shared spectral plan for the signal (built on demand if None)
+    
+    Returns:
+    --------
+    features : dict
+        Dictionary with extracted audio features
+    """
+    try:
+        if plan is None:
+            plan = SpectralPlan(y, sr)
         
-        # Add MFCC coefficients
-        for i, mfcc_val in enumerate(mfcc_means):
-            features[f'mfcc_{i+1}'] = mfcc_val
-            
-        return features
+        # Energy, spectral centroid and rolloff, chroma, predominant key and MFCCs,
+        # computed by the feature registry from the shared plan
+        return compute_features(plan, 'deam_basic')
     
     except Exception as e:
         print(f"Error extracting basic features for {audio_path}: {e}")
@@ -110,7 +140,7 @@ def extract_audio_features(audio_path, duration=None):
 
 def extract_tonality_and_scale(audio_path, duration=None):
     """
-    Extracts tonality and scale information from an audio file using music21.
+    Extracts tonality and scale information from an audio file.
     Detects various scale types including major, minor, modal, pentatonic, and exotic scales.
     
     Parameters:
@@ -126,130 +156,47 @@ def extract_tonality_and_scale(audio_path, duration=None):
         Dictionary with extracted tonality and scale features
     """
     try:
-        # Load the audio file using librosa
-        y, sr = librosa.load(audio_path, duration=duration)
-        
-        # Extract chroma features (12-dimensional representation of pitch content)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        
-        # Sum the chroma features over time to get the overall pitch profile
-        chroma_sum = np.sum(chroma, axis=1)
-        
-        # Normalize the chroma sum
-        chroma_sum = chroma_sum / np.sum(chroma_sum)
-        
-        # Map the chroma values to key names
-        key_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        key_index = np.argmax(chroma_sum)
-        key_name = key_names[key_index]
-        
-        # Create a music21 note for the key
-        key_note = music21.note.Note(key_name)
-        
-        # Define scale patterns (semitone intervals from root)
-        scale_patterns = {
-            # Diatonic scales
-            'Major': [0, 2, 4, 5, 7, 9, 11],  # Ionian
-            'Natural Minor': [0, 2, 3, 5, 7, 8, 10],  # Aeolian
-            'Harmonic Minor': [0, 2, 3, 5, 7, 8, 11],
-            'Melodic Minor': [0, 2, 3, 5, 7, 9, 11],
-            
-            # Modal scales
-            'Ionian': [0, 2, 4, 5, 7, 9, 11],  # Same as Major
-            'Dorian': [0, 2, 3, 5, 7, 9, 10],
-            'Phrygian': [0, 1, 3, 5, 7, 8, 10],
-            'Lydian': [0, 2, 4, 6, 7, 9, 11],
-            'Mixolydian': [0, 2, 4, 5, 7, 9, 10],
-            'Aeolian': [0, 2, 3, 5, 7, 8, 10],  # Same as Natural Minor
-            'Locrian': [0, 1, 3, 5, 6, 8, 10],
-            
-            # Pentatonic scales
-            'Major Pentatonic': [0, 2, 4, 7, 9],
-            'Minor Pentatonic': [0, 3, 5, 7, 10],
-            
-            # Other scales
-            'Blues': [0, 3, 5, 6, 7, 10],
-            'Harmonic Major': [0, 2, 4, 5, 7, 8, 11],
-            'Neapolitan Major': [0, 1, 3, 5, 7, 9, 11],
-            'Neapolitan Minor': [0, 1, 3, 5, 7, 8, 11],
-            'Hungarian Minor': [0, 2, 3, 6, 7, 8, 11],
-            'Enigmatic': [0, 1, 4, 6, 8, 10, 11],
-            'Arabic': [0, 1, 4, 5, 7, 8, 11]  # Hijaz Maqam with characteristic augmented second
-        }
-        
-        # Calculate correlation for each scale pattern
-        scale_correlations = {}
-        for scale_name, pattern in scale_patterns.items():
-            correlation = 0
-            for interval in pattern:
-                note_idx = (key_index + interval) % 12
-                correlation += chroma_sum[note_idx]
-            # Normalize by pattern length
-            scale_correlations[scale_name] = correlation / len(pattern)
-        
-        # Find the best matching scale
-        best_scale = max(scale_correlations.items(), key=lambda x: x[1])
-        scale_name = best_scale[0]
-        scale_correlation = best_scale[1]
-        
-        # Determine the mode based on the scale name
-        if 'Minor' in scale_name:
-            mode = 'minor'
-        elif 'Major' in scale_name:
-            mode = 'major'
-        else:
-            # For modal and exotic scales, use the scale name as the mode
-            mode = scale_name.lower()
-        
-        # Create the appropriate scale using music21
-        if scale_name == 'Major' or scale_name == 'Ionian':
-            scale = music21.scale.MajorScale(key_note.pitch)
-        elif scale_name == 'Natural Minor' or scale_name == 'Aeolian':
-            scale = music21.scale.MinorScale(key_note.pitch)
-        elif scale_name == 'Harmonic Minor':
-            scale = music21.scale.HarmonicMinorScale(key_note.pitch)
-        elif scale_name == 'Melodic Minor':
-            scale = music21.scale.MelodicMinorScale(key_note.pitch)
-        elif scale_name == 'Dorian':
-            scale = music21.scale.DorianScale(key_note.pitch)
-        elif scale_name == 'Phrygian':
-            scale = music21.scale.PhrygianScale(key_note.pitch)
-        elif scale_name == 'Lydian':
-            scale = music21.scale.LydianScale(key_note.pitch)
-        elif scale_name == 'Mixolydian':
-            scale = music21.scale.MixolydianScale(key_note.pitch)
-        elif scale_name == 'Locrian':
-            scale = music21.scale.LocrianScale(key_note.pitch)
-        else:
-            # For scales not directly supported by music21, create a custom scale
-            pattern = scale_patterns[scale_name]
-            scale_degrees = []
-            for interval in pattern:
-                note_idx = (key_index + interval) % 12
-                scale_degrees.append(key_names[note_idx])
-            # Create a custom scale using music21
-            scale = music21.scale.ConcreteScale(music21.pitch.Pitch(key_name), scale_degrees)
-        
-        # Get the scale pitches as string
-        scale_pitches = [str(p) for p in scale.getPitches()]
-        scale_pitches_str = ', '.join(scale_pitches)
-        
-        # Calculate a confidence score based on the strength of the key
-        key_strength = float(chroma_sum[key_index] / np.mean(chroma_sum))
+        y, sr = load_audio(audio_path, duration=duration)
+    except Exception as e:
+        print(f"Error extracting tonality and scale for {audio_path}: {e}")
+        return None
+    
+    return extract_tonality_and_scale_from_signal(y, sr, audio_path)
+
+def extract_tonality_and_scale_from_signal(y, sr, audio_path=None, plan=None, return_ranking=False):
+    """
+    Extracts tonality and scale information from an already decoded signal.
+    
+    Parameters:
+    -----------
+    y : np.ndarray
+        Mono audio signal
+    sr : int
+        Sampling rate of the signal
+    audio_path : str, optional
+        Path of the source file, only used in error messages
+    plan : SpectralPlan or StreamingPlan, optional
+        Shared spectral plan for the signal (built on demand if None)
+    return_ranking : bool
+        If True, also return the full ranked (root, scale) score table
+        under the 'scale_ranking' key
+    
+    Returns:
+    --------
+    features : dict
+        Dictionary with extracted tonality and scale features
+    """
+    try:
+        if plan is None:
+            plan = SpectralPlan(y, sr)
         
-        # Create a key string representation
-        key_full = f"{key_name} {scale_name}"
+        # Predominant key, best matching scale and derived mode, computed by the
+        # feature registry from the normalized chroma profile of the shared plan
+        features = compute_features(plan, 'deam_tonality')
         
-        # Create a dictionary with the extracted features
-        features = {
-            'key': key_name,
-            'mode': mode,
-            'scale_name': scale_name,
-            'key_full': key_full,
-            'key_correlation': key_strength,
-            'scale_correlation': scale_correlation,
-            'scale_pitches': scale_pitches_str
-        }
+        if return_ranking:
+            chroma_sum = plan.sum('chroma')
+            features['scale_ranking'] = rank_scales(chroma_sum / np.sum(chroma_sum))
         
         return features
     
@@ -257,7 +204,7 @@ def extract_tonality_and_scale(audio_path, duration=None):
         print(f"Error extracting tonality and scale for {audio_path}: {e}")
         return None
 
-def extract_all_features(audio_path, duration=None):
+def extract_all_features(audio_path, duration=None, stream=False, profile=DEFAULT_PROFILE, excerpt_options=None):
     """
     Extracts all audio features (basic and tonality/scale) from an audio file.
     
@@ -267,6 +214,15 @@ def extract_all_features(audio_path, duration=None):
         Path to the audio file
     duration : float, optional
         Duration in seconds to load (None to load the entire file)
+    stream : bool
+        If True, decode the file in fixed-size blocks with running accumulators
+        (constant memory, for full-length tracks and long mixes)
+    profile : str
+        Extraction profile (see extraction_profiles.PROFILES): analysis sampling
+        rate, resampler and STFT parameters
+    excerpt_options : dict, optional
+        If given, only analyze a few windows of the track (e.g. 3 x 10 s around the
+        energy peaks), see excerpts.make_excerpt_options
     
     Returns:
     --------
@@ -274,14 +230,48 @@ def extract_all_features(audio_path, duration=None):
         Dictionary with all extracted features
     """
     try:
-        # Load the audio file once to avoid redundant loading
-        y, sr = librosa.load(audio_path, duration=duration)
+        # Decode the audio file once and share the spectral plan with every extractor;
+        # in stream and excerpt mode only the reductions of the descriptors needed by
+        # the basic and tonality feature sets are kept
+        plan = build_plan(audio_path, {**FEATURE_SETS['deam_basic'], **FEATURE_SETS['deam_tonality']},
+                          duration=duration, stream=stream, profile=profile, excerpt_options=excerpt_options)
+        y, sr = getattr(plan, 'y', None), plan.sr
+    except Exception as e:
+        print(f"Error extracting all features for {audio_path}: {e}")
+        return None
+    
+    return extract_all_features_from_signal(y, sr, audio_path, plan)
+
+def extract_all_features_from_signal(y, sr, audio_path=None, plan=None):
+    """
+    Extracts all audio features (basic and tonality/scale) from an already decoded signal.
+    
+    Parameters:
+    -----------
+    y : np.ndarray
+        Mono audio signal
+    sr : int
+        Sampling rate of the signal
+    audio_path : str, optional
+        Path of the source file, only used in error messages
+    plan : SpectralPlan or StreamingPlan, optional
+        Shared spectral plan for the signal (built on demand if None)
+    
+    Returns:
+    --------
+    features : dict
+        Dictionary with all extracted features
+    """
+    try:
+        # One spectral plan shared by both extractors (the chroma is computed once)
+        if plan is None:
+            plan = SpectralPlan(y, sr)
         
         # Extract basic audio features
-        basic_features = extract_audio_features(audio_path, duration)
+        basic_features = extract_audio_features_from_signal(y, sr, audio_path, plan)
         
         # Extract tonality and scale features
-        tonality_features = extract_tonality_and_scale(audio_path, duration)
+        tonality_features = extract_tonality_and_scale_from_signal(y, sr, audio_path, plan)
         
         # Combine all features if both extractions were successful
         if basic_features is not None and tonality_features is not None:
@@ -296,6 +286,183 @@ def extract_all_features(audio_path, duration=None):
         print(f"Error extracting all features for {audio_path}: {e}")
         return None
 
+# Columns of the final output file (basic features followed by tonality features)
+OUTPUT_COLUMNS = ['track_id', 'rms', 'spectral', 'rolloff', 'Chromatic scale', 'Predominant Key', 'MFCC',
+                  'key', 'mode', 'scale_name', 'key_full', 'key_correlation', 'scale_correlation', 'scale_pitches',
+                  'extraction_profile']
+
+def build_output_row(track_id, features, profile=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Maps the extracted features of a track to a row of the output file.
+    
+    Parameters:
+    -----------
+    track_id : int
+        Identifier of the track
+    features : dict
+        Dictionary returned by extract_all_features
+    profile : str
+        Extraction profile used for the features, stored as its fingerprint
+    excerpt_options : dict, optional
+        Excerpt mode options used for the features, part of the fingerprint
+    
+    Returns:
+    --------
+    dict
+        Row with the OUTPUT_COLUMNS keys and JSON-serializable values
+    """
+    row = {
+        'track_id': track_id,
+        'rms': features['rms'],
+        'spectral': features['spectral_centroid'],
+        'rolloff': features['spectral_rolloff'],
+        'Chromatic scale': features['chroma_mean'],
+        'Predominant Key': features['predominant_key'],
+        'MFCC': features['mfcc_1'],  # Using the first MFCC coefficient as an example
+        'key': features['key'],
+        'mode': features['mode'],
+        'scale_name': features['scale_name'],
+        'key_full': features['key_full'],
+        'key_correlation': features['key_correlation'],
+        'scale_correlation': features['scale_correlation'],
+        'scale_pitches': features['scale_pitches'],
+        'extraction_profile': profile_fingerprint(profile, excerpt_options)
+    }
+    # Convert numpy scalars to plain Python values for the checkpoint log
+    # (float32 goes through its shortest repr so the CSV keeps the same digits as before)
+    return {col: float(str(val)) if isinstance(val, np.float32) else val.item() if isinstance(val, np.generic) else val
+            for col, val in row.items()}
+
+def process_track(task):
+    """
+    Extracts the features of a single track (used by the worker processes).
+    
+    Parameters:
+    -----------
+    task : tuple
+        Tuple (track_id, audio_file, cache_config, extract_options), where cache_config
+        is (cache_dir, fingerprint, max_bytes) or None to disable the feature cache and
+        extract_options holds the extract_all_features arguments shared by all tracks
+        (stream, profile, excerpt_options)
+    
+    Returns:
+    --------
+    dict
+        Checkpoint record with 'track_id', 'status' ('ok', 'failed' or 'missing')
+        and, for completed tracks, the output 'row'
+    """
+    track_id, audio_file, cache_config, extract_options = task
+    
+    if not os.path.exists(audio_file):
+        return {'track_id': track_id, 'status': 'missing'}
+    
+    cache = open_cache(*cache_config) if cache_config else None
+    features = cached_extraction(cache, audio_file, partial(extract_all_features, **extract_options))
+    if features is None:
+        return {'track_id': track_id, 'status': 'failed'}
+    
+    return {'track_id': track_id, 'status': 'ok', 'row': build_output_row(track_id, features, extract_options['profile'],
+                                                                 extract_options['excerpt_options'])}
+
+def checkpoint_header(fingerprint):
+    """
+    First record of a checkpoint log, identifying the extractor that wrote its rows.
+    
+    Parameters:
+    -----------
+    fingerprint : str
+        Extractor fingerprint (version, profile, stream and excerpt options)
+    
+    Returns:
+    --------
+    dict
+        Header record
+    """
+    return {'status': 'header', 'extractor': fingerprint}
+
+def load_checkpoint(checkpoint_path, fingerprint=None):
+    """
+    Reads the rows of the tracks already completed from the checkpoint log.
+    
+    Parameters:
+    -----------
+    checkpoint_path : str
+        Path to the JSON Lines checkpoint log
+    fingerprint : str, optional
+        Extractor fingerprint of the current run; when given, the log must have been
+        written by the same extractor (see checkpoint_header), otherwise ValueError
+        is raised
+    
+    Returns:
+    --------
+    dict
+        Dictionary {track_id: row} of the completed tracks
+    """
+    completed = {}
+    if not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0:
+        return completed
+    
+    header = None
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave the last line truncated: ignore it
+                continue
+            if record.get('status') == 'header':
+                header = record.get('extractor')
+            elif record.get('status') == 'ok':
+                completed[record['track_id']] = record['row']
+    
+    # Rows from a different extractor (profile, stream or excerpt options) must not be
+    # mixed with the rows of this run in the same output table
+    if fingerprint is not None and header != fingerprint:
+        raise ValueError(f"il checkpoint è stato scritto dall'estrattore {header or 'sconosciuto'}, "
+                         f"le opzioni correnti corrispondono a {fingerprint}")
+    
+    return completed
+
+def run_tasks(tasks, n_workers, max_in_flight):
+    """
+    Runs process_track over the tasks with a process pool, keeping at most
+    max_in_flight tasks submitted at any time, and yields the records as they complete.
+    
+    Parameters:
+    -----------
+    tasks : list
+        List of (track_id, audio_file, cache_config, extract_options) tuples
+    n_workers : int
+        Number of worker processes (1 runs everything in the current process)
+    max_in_flight : int
+        Maximum number of tasks submitted to the pool at the same time
+    
+    Yields:
+    -------
+    dict
+        Checkpoint record returned by process_track
+    """
+    if n_workers <= 1:
+        for task in tasks:
+            yield process_track(task)
+        return
+    
+    task_iter = iter(tasks)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = {executor.submit(process_track, task): task for task in islice(task_iter, max_in_flight)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                track_id = pending.pop(future)[0]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print(f"Error in the worker process for track {track_id}: {e}")
+                    yield {'track_id': track_id, 'status': 'failed'}
+            # Refill the pool up to the in-flight limit
+            for task in islice(task_iter, max_in_flight - len(pending)):
+                pending[executor.submit(process_track, task)] = task
+
 def main(args=None):
     # Parse command line arguments if provided
     if args is None:
@@ -303,6 +470,23 @@ def main(args=None):
         parser.add_argument('--audio-dir', type=str, help='Directory containing audio files')
         parser.add_argument('--output-dir', type=str, help='Directory for output files')
         parser.add_argument('--track-ids', type=str, help='Comma-separated list of track IDs to process')
+        parser.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count - 1)')
+        parser.add_argument('--max-in-flight', type=int, help='Maximum number of tracks queued to the workers (default: 2 x workers)')
+        parser.add_argument('--checkpoint', type=str, help='Per-track checkpoint log (default: <output-dir>/audio_features_checkpoint.jsonl)')
+        parser.add_argument('--resume', action='store_true', help='Skip the tracks already completed in the checkpoint log')
+        parser.add_argument('--cache-dir', type=str, help='Feature cache directory (default: <project>/feature_cache)')
+        parser.add_argument('--cache-max-gb', type=float, help='Maximum size of the feature cache in GB')
+        parser.add_argument('--no-cache', action='store_true', help='Always recompute the features, ignoring the cache')
+        parser.add_argument('--stream', action='store_true', help='Decode the audio in blocks with constant memory (for long tracks)')
+        parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                            help='Extraction profile: analysis sampling rate, resampler and STFT size (default: accurate)')
+        parser.add_argument('--excerpt-windows', type=int, default=0,
+                            help='Only analyze this many windows of each track instead of the whole file (0 to disable)')
+        parser.add_argument('--excerpt-length', type=float, default=DEFAULT_LENGTH, help='Length in seconds of each window')
+        parser.add_argument('--excerpt-mode', choices=EXCERPT_MODES, default='peaks',
+                            help='Windows around the energy peaks (cheap probing pass) or evenly spaced')
+        parser.add_argument('--store-dir', type=str, help='Feature store dataset directory (default: <project>/features/deam_complete)')
+        parser.add_argument('--csv', action='store_true', help='Also write the legacy timestamped CSV file')
         args = parser.parse_args()
     
     # Get project paths with optional custom directories
@@ -311,9 +495,36 @@ def main(args=None):
         custom_output_dir=args.output_dir if hasattr(args, 'output_dir') and args.output_dir else None
     )
     
-    # Create DataFrames to store the results
-    basic_results = pd.DataFrame(columns=['track_id', 'rms', 'spectral', 'rolloff', 'Chromatic scale', 'Predominant Key', 'MFCC'])
-    tonality_results = pd.DataFrame(columns=['track_id', 'key', 'mode', 'scale_name', 'key_full', 'key_correlation', 'scale_correlation', 'scale_pitches'])
+    # Worker pool configuration
+    n_workers = getattr(args, 'workers', None) or max(1, multiprocessing.cpu_count() - 1)
+    max_in_flight = getattr(args, 'max_in_flight', None) or 2 * n_workers
+    checkpoint_path = getattr(args, 'checkpoint', None) or os.path.join(paths['output_dir'], 'audio_features_checkpoint.jsonl')
+    resume = getattr(args, 'resume', False)
+    stream = getattr(args, 'stream', False)
+    profile = getattr(args, 'profile', None) or DEFAULT_PROFILE
+    excerpt_options = make_excerpt_options(getattr(args, 'excerpt_windows', 0),
+                                           getattr(args, 'excerpt_length', DEFAULT_LENGTH),
+                                           getattr(args, 'excerpt_mode', 'peaks'))
+    extract_options = {'stream': stream, 'profile': profile, 'excerpt_options': excerpt_options}
+    
+    # Extractor fingerprint: keys the feature cache and identifies the checkpoint log
+    params = {}
+    if stream:
+        params['stream'] = True
+    if profile != DEFAULT_PROFILE:
+        params['profile'] = profile_fingerprint(profile)
+    if excerpt_options:
+        params['excerpt'] = excerpt_options
+    fingerprint = extractor_fingerprint('complete', EXTRACTOR_VERSION, params or None)
+    
+    # Feature cache keyed by audio content and extractor fingerprint
+    if getattr(args, 'no_cache', False):
+        cache_config = None
+    else:
+        cache_dir = getattr(args, 'cache_dir', None) or str(paths['base_dir'] / 'feature_cache')
+        cache_max_gb = getattr(args, 'cache_max_gb', None)
+        max_bytes = int(cache_max_gb * 1024 ** 3) if cache_max_gb else DEFAULT_MAX_BYTES
+        cache_config = (cache_dir, fingerprint, max_bytes)
     
     # Initialize track processing statistics
     processed_tracks = 0
@@ -340,89 +551,80 @@ def main(args=None):
         
         print(f"Trovati {len(track_ids)} file audio da elaborare.")
     
-    # Create DataFrames to store the results
-    basic_results = pd.DataFrame(columns=['track_id', 'rms', 'spectral', 'rolloff', 'Chromatic scale', 'Predominant Key', 'MFCC'])
-    tonality_results = pd.DataFrame(columns=['track_id', 'key', 'mode', 'scale_name', 'key_full', 'key_correlation', 'scale_correlation', 'scale_pitches'])
+    # Rows of the completed tracks, accumulated in a list and converted to a DataFrame once
+    if resume and os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path) > 0:
+        try:
+            completed = load_checkpoint(checkpoint_path, fingerprint)
+        except ValueError as e:
+            print(f"ERRORE: impossibile riprendere dal checkpoint {checkpoint_path}: {e}.")
+            print("Riesegui con le stesse opzioni --profile, --stream ed --excerpt-* oppure senza --resume.")
+            return None
+        print(f"Ripresa dal checkpoint {checkpoint_path}: {len(completed)} tracce già completate.")
+        # Terminate a line left truncated by a crash before appending new records
+        with open(checkpoint_path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    else:
+        completed = {}
+        # Start a new checkpoint log, headed by the extractor fingerprint
+        with open(checkpoint_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(checkpoint_header(fingerprint)) + '\n')
     
-    # Process each track
-    for track_id in track_ids:
-        # Find the audio file for this track ID
-        audio_file = os.path.join(paths['audio_dir'], f"{track_id}.mp3")
-        
-        if os.path.exists(audio_file):
-            print(f"Elaborazione traccia {track_id}...")
-            
-            # Extract all features at once
-            features = extract_all_features(audio_file)
+    rows = [completed[track_id] for track_id in track_ids if track_id in completed]
+    resumed_tracks = len(rows)
+    tasks = [(track_id, os.path.join(paths['audio_dir'], f"{track_id}.mp3"), cache_config, extract_options)
+             for track_id in track_ids if track_id not in completed]
+    
+    print(f"Elaborazione di {len(tasks)} tracce con {n_workers} processi...")
+    
+    # Process the tracks, appending every result to the checkpoint log as soon as it is available
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        for record in run_tasks(tasks, n_workers, max_in_flight):
+            track_id = record['track_id']
+            checkpoint.write(json.dumps(record) + '\n')
+            checkpoint.flush()
             
-            if features is not None:
-                # Add basic features to basic_results DataFrame
-                basic_row = pd.DataFrame({
-                    'track_id': [track_id],
-                    'rms': [features['rms']],
-                    'spectral': [features['spectral_centroid']],
-                    'rolloff': [features['spectral_rolloff']],
-                    'Chromatic scale': [features['chroma_mean']],
-                    'Predominant Key': [features['predominant_key']],
-                    'MFCC': [features['mfcc_1']]  # Using the first MFCC coefficient as an example
-                })
-                basic_results = pd.concat([basic_results, basic_row], ignore_index=True)
-                
-                # Add tonality features to tonality_results DataFrame
-                tonality_row = pd.DataFrame({
-                    'track_id': [track_id],
-                    'key': [features['key']],
-                    'mode': [features['mode']],
-                    'scale_name': [features['scale_name']],
-                    'key_full': [features['key_full']],
-                    'key_correlation': [features['key_correlation']],
-                    'scale_correlation': [features['scale_correlation']],
-                    'scale_pitches': [features['scale_pitches']]
-                })
-                tonality_results = pd.concat([tonality_results, tonality_row], ignore_index=True)
-                
+            if record['status'] == 'ok':
+                rows.append(record['row'])
                 processed_tracks += 1
                 print(f"Elaborazione completata per la traccia {track_id}")
-                
-                # Save intermediate results every 50 tracks to prevent data loss
-                if processed_tracks % 50 == 0:
-                    intermediate_file = os.path.join(paths['output_dir'], 'audio_features_intermediate.csv')
-                    pd.merge(basic_results, tonality_results, on='track_id', how='outer').to_csv(intermediate_file, index=False)
-                    print(f"Salvataggio intermedio effettuato dopo {processed_tracks} tracce elaborate.")
+            elif record['status'] == 'missing':
+                skipped_tracks += 1
+                print(f"File audio per la traccia {track_id} non trovato in {os.path.join(paths['audio_dir'], f'{track_id}.mp3')}")
             else:
                 failed_tracks += 1
                 print(f"Impossibile estrarre le caratteristiche per la traccia {track_id}")
-        else:
-            skipped_tracks += 1
-            print(f"File audio per la traccia {track_id} non trovato in {audio_file}")
     
     # Calculate total tracks processed
-    total_tracks = len(track_ids) if 'track_ids' in locals() else 0
+    total_tracks = len(track_ids)
     
     # Print processing summary
     print("\nRiepilogo elaborazione:")
     print(f"Tracce totali: {total_tracks}")
     print(f"Tracce elaborate con successo: {processed_tracks}")
+    print(f"Tracce riprese dal checkpoint: {resumed_tracks}")
     print(f"Tracce fallite: {failed_tracks}")
     print(f"Tracce saltate (file non trovati): {skipped_tracks}")
     
-    # Display summary of the results
-    print("\nRiepilogo delle caratteristiche estratte:")
-    print(f"Numero di tracce con caratteristiche audio di base: {len(basic_results)}")
-    print(f"Numero di tracce con caratteristiche di tonalità: {len(tonality_results)}")
-    
-    # Create a merged DataFrame with all features
-    all_features = pd.merge(basic_results, tonality_results, on='track_id', how='outer')
-    print(f"Numero totale di tracce nel dataset finale: {len(all_features)}")
+    # Create a DataFrame with all features, sorted by track
+    all_features = pd.DataFrame(rows, columns=OUTPUT_COLUMNS).sort_values('track_id').reset_index(drop=True)
+    print(f"\nNumero totale di tracce nel dataset finale: {len(all_features)}")
     
     # Add timestamp to filename to prevent overwriting previous analyses
     from datetime import datetime
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Save to the configured output directory
-    output_file = os.path.join(paths['output_dir'], f'audio_tonality_features_complete_{timestamp}.csv')
-    all_features.to_csv(output_file, index=False)
-    print(f"\nTutte le caratteristiche sono state unite e salvate in:\n{output_file}")
+    # Append the run to the columnar feature store (typed Parquet partition + LATEST pointer)
+    store_dir = getattr(args, 'store_dir', None) or get_store_paths(paths['base_dir'])['deam_complete']
+    output_file = write_features(all_features, store_dir, run_id=timestamp)
+    print(f"\nTutte le caratteristiche sono state unite e salvate nel feature store:\n{output_file}")
+    
+    # Optionally also save the legacy CSV to the configured output directory
+    if getattr(args, 'csv', False):
+        csv_file = os.path.join(paths['output_dir'], f'audio_tonality_features_complete_{timestamp}.csv')
+        all_features.to_csv(csv_file, index=False)
+        print(f"File CSV salvato in:\n{csv_file}")
     
     # Save a summary report
     summary_file = os.path.join(paths['output_dir'], f'analysis_summary_{timestamp}.txt')
@@ -431,9 +633,12 @@ def main(args=None):
         f.write(f"Data: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
         f.write(f"Tracce totali nel database: {total_tracks}\n")
         f.write(f"Tracce elaborate con successo: {processed_tracks}\n")
+        f.write(f"Tracce riprese dal checkpoint: {resumed_tracks}\n")
         f.write(f"Tracce fallite: {failed_tracks}\n")
         f.write(f"Tracce saltate (file non trovati): {skipped_tracks}\n\n")
         f.write(f"File di output: {output_file}\n")
+        f.write(f"Checkpoint: {checkpoint_path}\n")
+        f.write(f"Profilo di estrazione: {profile_fingerprint(profile, excerpt_options)}\n")
         
         # Add information about audio directory path
         f.write(f"\nDirectory audio utilizzata: {paths['audio_dir']}\n")
@@ -445,4 +650,4 @@ def main(args=None):
     return all_features  # Return the DataFrame for potential further processing
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
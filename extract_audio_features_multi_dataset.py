@@ -1,14 +1,30 @@
 import os
-import librosa
+import soundfile as sf
 import numpy as np
 import pandas as pd
-import music21
 import argparse
 from pathlib import Path
 import time
+from functools import partial
+import json
+import tempfile
 import multiprocessing
 from tqdm import tqdm
 
+from feature_store import get_store_paths, write_features
+from feature_cache import DEFAULT_MAX_BYTES, cached_extraction, extractor_fingerprint, open_cache
+from feature_registry import FEATURE_SETS, categorical_columns, extract_feature_set
+from tempo_estimation import TEMPO_METHODS, make_tempo_options
+from extraction_profiles import DEFAULT_PROFILE, PROFILES, profile_fingerprint
+from excerpts import DEFAULT_LENGTH, EXCERPT_MODES, make_excerpt_options
+from scheduling import (estimate_cost, plan_chunks, load_cost_model, save_cost_model, predict_makespan,
+                        schedule_report, print_schedule_report, MIN_COST_MODEL_FILES)
+from supervised_pool import SupervisedPool, file_signature, is_quarantined, load_quarantine, save_quarantine
+
+# Versione del codice di estrazione, parte dell'impronta della cache delle feature:
+# va incrementata ogni volta che cambiano le feature calcolate
+EXTRACTOR_VERSION = 1
+
 # Configurazione dei percorsi
 def get_project_paths(custom_metadata_path=None, custom_output_dir=None):
     """
@@ -47,7 +63,8 @@ def get_project_paths(custom_metadata_path=None, custom_output_dir=None):
         'output_dir': output_dir
     }
 
-def extract_audio_features(audio_path, duration=None):
+def extract_audio_features(audio_path, duration=None, stream=False, raise_errors=False, tempo_options=None,
+                           profile=DEFAULT_PROFILE, excerpt_options=None):
     """
     Estrae le caratteristiche audio da un file audio
     
@@ -57,6 +74,21 @@ def extract_audio_features(audio_path, duration=None):
         Percorso al file audio
     duration : float, optional
         Durata in secondi da caricare (None per caricare l'intero file)
+    stream : bool
+        Se True decodifica il file a blocchi con accumulatori progressivi
+        (memoria costante, per brani completi e mix lunghi)
+    raise_errors : bool
+        Se True propaga le eccezioni invece di restituire None, così che il
+        supervisore dei processi ne registri tipo e messaggio
+    tempo_options : dict, optional
+        Opzioni della stima del tempo (metodo, finestra di analisi, sottocampionamento),
+        vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione (frequenza di analisi, ricampionatore, parametri STFT),
+        vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Se indicato analizza solo alcune finestre del brano (ad esempio 3 x 10 s attorno
+        ai picchi di energia), vedi excerpts.make_excerpt_options
     
     Returns:
     --------
@@ -64,147 +96,129 @@ def extract_audio_features(audio_path, duration=None):
         Dizionario con le caratteristiche audio estratte
     """
     try:
-        # Carica il file audio
-        y, sr = librosa.load(audio_path, duration=duration)
-        
-        # Calcola le caratteristiche audio per l'intero brano
-        # 1. Energia (RMS)
-        rms = np.mean(librosa.feature.rms(y=y)[0])
-        
-        # 2. Centroide spettrale (brillantezza)
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)[0])
-        
-        # 3. Rolloff spettrale (distribuzione dell'energia)
-        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)[0])
-        
-        # 4. Scala cromatica (rappresentazione delle classi di altezza)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        chroma_mean = np.mean(chroma)
-        
-        # Determina la tonalità predominante
-        chroma_sum = np.sum(chroma, axis=1)
-        key_index = np.argmax(chroma_sum)
-        key_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        key = key_names[key_index]
-        
-        # 5. Contrasto spettrale (differenza tra picchi e valli nello spettro)
-        contrast = np.mean(librosa.feature.spectral_contrast(y=y, sr=sr))
-        
-        # 6. Tempo (BPM)
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        
-        # 7. Zero-crossing rate (misura del rumore)
-        zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(y=y)[0])
-        
-        # 8. MFCC (Mel-frequency cepstral coefficients)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        mfcc_means = np.mean(mfcc, axis=1)
-        
-        # 9. Bandwidth spettrale
-        bandwidth = np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)[0])
-        
-        # 10. Flatness spettrale (misura di quanto lo spettro è simile al rumore bianco)
-        flatness = np.mean(librosa.feature.spectral_flatness(y=y)[0])
-        
-        # 11. Flux spettrale (misura di quanto rapidamente cambia lo spettro)
-        # Calcola la differenza tra frame consecutivi dello spettrogramma
-        stft = np.abs(librosa.stft(y))
-        flux = np.mean(np.diff(stft, axis=1))
-        
-        # 12. Roughness (dissonanza)
-        # Approssimazione basata sul contrasto spettrale
-        roughness = np.std(librosa.feature.spectral_contrast(y=y, sr=sr))
-        
-        # 13. Irregularity (irregolarità dello spettro)
-        # Approssimazione basata sulla deviazione standard del centroide spettrale
-        irregularity = np.std(librosa.feature.spectral_centroid(y=y, sr=sr)[0])
-        
-        # 14. Mode (maggiore o minore)
-        # Utilizziamo music21 per determinare la modalità
-        try:
-            # Converti il chroma in una rappresentazione di note
-            chroma_max = np.argmax(chroma_sum)
-            notes = []
-            for i, val in enumerate(chroma_sum):
-                if val > 0.5 * chroma_sum[chroma_max]:  # Considera solo le note significative
-                    notes.append(i)
-            
-            # Crea un oggetto chord di music21
-            chord_notes = [music21.pitch.Pitch(key_names[note]) for note in notes]
-            if chord_notes:
-                chord = music21.chord.Chord(chord_notes)
-                # Determina se l'accordo è maggiore o minore
-                mode = 'major' if chord.quality == 'major' else 'minor'
-            else:
-                mode = 'unknown'
-        except Exception as e:
-            print(f"Errore nella determinazione della modalità: {e}")
-            mode = 'unknown'
-        
-        # Crea un dizionario con tutte le caratteristiche estratte
-        features = {
-            'rms_energy': rms,
-            'spectral_centroid': spectral_centroid,
-            'spectral_rolloff': spectral_rolloff,
-            'chroma_mean': chroma_mean,
-            'key': key,
-            'spectral_contrast': contrast,
-            'tempo': tempo,
-            'zero_crossing_rate': zero_crossing_rate,
-            'spectral_bandwidth': bandwidth,
-            'spectral_flatness': flatness,
-            'spectral_flux': flux,
-            'roughness': roughness,
-            'irregularity': irregularity,
-            'mode': mode
-        }
-        
-        # Aggiungi i coefficienti MFCC
-        for i, mfcc_val in enumerate(mfcc_means):
-            features[f'mfcc_{i+1}'] = mfcc_val
-        
-        return features
+        # Insieme di feature della tabella multi-dataset, calcolato dal registro:
+        # un solo piano spettrale condiviso da tutti i descrittori
+        return extract_feature_set(audio_path, 'multi_dataset', duration=duration, stream=stream,
+                                   tempo_options=tempo_options, profile=profile,
+                                   excerpt_options=excerpt_options)
     
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Errore durante l'estrazione delle caratteristiche audio: {e}")
         return None
 
-def process_audio_file(args):
+# Colonne delle feature restituite da extract_audio_features, nell'ordine di output
+FEATURE_COLUMNS = list(FEATURE_SETS['multi_dataset'])
+
+# Colonne testuali (le altre sono numeriche)
+TEXT_COLUMNS = categorical_columns('multi_dataset')
+
+# Impostazioni comuni a tutti i task di un processo, ricevute una sola volta all'avvio
+_worker_config = {}
+
+def init_worker(base_dir, cache_config, extract_options, warm_up=False):
+    """
+    Inizializza un processo di estrazione con le impostazioni comuni a tutti i task
+    
+    Parameters:
+    -----------
+    base_dir : str
+        Directory di base del progetto
+    cache_config : tuple
+        (cache_dir, fingerprint, max_bytes) della cache delle feature, None per disattivarla
+    extract_options : dict
+        Argomenti di extract_audio_features comuni a tutti i file (stream, tempo_options, profile,
+        excerpt_options)
+    warm_up : bool
+        Se True esegue un'estrazione su un segnale sintetico, così che la compilazione JIT
+        di librosa/numba non venga conteggiata nel timeout del primo file
+    """
+    _worker_config.update(base_dir=Path(base_dir), cache_config=cache_config, extract_options=extract_options)
+    if warm_up:
+        sr = 22050
+        t = np.arange(2 * sr) / sr
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            warm_path = os.path.join(tmp_dir, 'warm_up.wav')
+            sf.write(warm_path, 0.3 * np.sin(2 * np.pi * 440 * t), sr)
+            extract_audio_features(warm_path, **extract_options)
+
+def process_audio_file(task):
     """
     Funzione per processare un singolo file audio (utilizzata per il multiprocessing)
     
     Parameters:
     -----------
-    args : tuple
-        Tupla contenente (row, base_dir)
+    task : tuple
+        Tupla compatta (index, dataset, file_path) con la posizione del file nei metadati;
+        le impostazioni comuni arrivano da init_worker
     
     Returns:
     --------
-    dict
-        Dizionario con le caratteristiche audio estratte e i metadati
+    tuple
+        Tupla (index, values, cached) con i valori delle feature nell'ordine di
+        FEATURE_COLUMNS e True se sono stati letti dalla cache; gli errori di estrazione
+        vengono propagati al supervisore
     """
-    row, base_dir = args
+    index, dataset, file_path = task
     
     # Costruisci il percorso completo al file audio
-    dataset_dir = base_dir / row['dataset']
-    audio_path = dataset_dir / row['file_path']
+    audio_path = _worker_config['base_dir'] / dataset / file_path
+    if not audio_path.exists():
+        raise FileNotFoundError(f"File audio non trovato: {audio_path}")
     
-    # Estrai le caratteristiche audio
-    features = extract_audio_features(audio_path)
-    
-    if features is not None:
-        # Aggiungi i metadati
-        features['song_id'] = row['song_id']
-        features['dataset'] = row['dataset']
-        features['file_path'] = str(row['file_path'])
-        return features
-    else:
-        return None
+    # Estrai le caratteristiche audio (o leggile dalla cache)
+    cache_config = _worker_config['cache_config']
+    cache = open_cache(*cache_config) if cache_config else None
+    features, cached = cached_extraction(cache, audio_path, partial(extract_audio_features, raise_errors=True,
+                                                                    **_worker_config['extract_options']),
+                                         return_hit=True)
+    
+    return index, tuple(features[col] if col in TEXT_COLUMNS else float(np.ravel(features[col])[0])
+                        for col in FEATURE_COLUMNS), cached
+
+def print_failure_report(failures, restarts):
+    """
+    Stampa il riepilogo dei file non estratti, raggruppati per motivo
+    
+    Parameters:
+    -----------
+    failures : list
+        Elenco dei fallimenti (dizionari con reason, error_type, detail, ...)
+    restarts : int
+        Numero di processi sostituiti dopo un timeout o un crash
+    """
+    if not failures:
+        return
+    print(f"\nFile non estratti: {len(failures)} (processi riavviati: {restarts})")
+    for reason in ['timeout', 'crash', 'error']:
+        group = [failure for failure in failures if failure['reason'] == reason]
+        if not group:
+            continue
+        print(f"  {reason}: {len(group)}")
+        for failure in group[:5]:
+            print(f"    {failure['dataset']}/{failure['file_path']}: {failure['error_type']} - {failure['detail']}")
+        if len(group) > 5:
+            print(f"    ... e altri {len(group) - 5}")
 
-def extract_features_from_metadata(metadata_df, base_dir, n_jobs=None):
+def extract_features_from_metadata(metadata_df, base_dir, n_jobs=None, cache_config=None, stream=False,
+                                   cost_estimate='header', timeout=None, quarantine_path=None,
+                                   retry_quarantined=False, tempo_options=None, profile=DEFAULT_PROFILE,
+                                   excerpt_options=None, cost_model_path=None):
     """
     Estrae le caratteristiche audio per tutti i file nel DataFrame dei metadati
     
+    Ai processi vengono inviati solo task compatti (indice, dataset, percorso) e i risultati
+    vengono scritti direttamente in array colonnari preallocati, evitando di serializzare
+    una Series pandas e un dizionario per file. I task sono ordinati per durata stimata,
+    dal più lungo al più corto, e raggruppati in blocchi di costo simile che i processi
+    prelevano da una coda condivisa, così che i brani lunghi non restino in coda alla fine.
+    
+    I processi sono supervisionati: un file che supera il timeout o che fa terminare il
+    processo (crash del decoder) viene registrato come fallito e il processo sostituito.
+    I file falliti finiscono in una quarantena persistente e vengono saltati nelle
+    esecuzioni successive finché non vengono modificati.
+    
     Parameters:
     -----------
     metadata_df : DataFrame
@@ -213,30 +227,152 @@ def extract_features_from_metadata(metadata_df, base_dir, n_jobs=None):
         Directory di base del progetto
     n_jobs : int, optional
         Numero di processi paralleli da utilizzare
+    cache_config : tuple, optional
+        (cache_dir, fingerprint, max_bytes) della cache delle feature, None per disattivarla
+    stream : bool
+        Se True decodifica i file a blocchi con memoria costante
+    cost_estimate : str
+        Stima del costo di ogni file: 'header' (durata dall'intestazione) o 'size'
+        (dalla dimensione del file)
+    timeout : float, optional
+        Tempo massimo in secondi per un singolo file, None per nessun limite
+    quarantine_path : str o Path, optional
+        File JSON della quarantena, None per disattivarla
+    retry_quarantined : bool
+        Se True riprova anche i file in quarantena
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione; la sua impronta viene salvata nella colonna extraction_profile
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti, vedi excerpts.make_excerpt_options
+    cost_model_path : str o Path, optional
+        File JSON dei modelli di costo delle esecuzioni precedenti, usati per prevedere
+        il makespan e aggiornati con i tempi di questa esecuzione (None per disattivarli)
     
     Returns:
     --------
     DataFrame
-        DataFrame con le caratteristiche audio estratte
+        DataFrame con le caratteristiche audio estratte; il confronto tra makespan
+        previsto ed effettivo è in features_df.attrs['schedule'] e l'elenco dei file
+        non estratti, con il motivo, in features_df.attrs['failures']
     """
-    print(f"Estrazione delle caratteristiche audio per {len(metadata_df)} file...")
+    n_files = len(metadata_df)
+    print(f"Estrazione delle caratteristiche audio per {n_files} file...")
     
-    # Prepara gli argomenti per il multiprocessing
-    args_list = [(row, base_dir) for _, row in metadata_df.iterrows()]
+    # Prepara i task compatti per il multiprocessing
+    datasets = metadata_df['dataset'].astype(str).tolist()
+    file_paths = metadata_df['file_path'].astype(str).tolist()
+    tasks = list(zip(range(n_files), datasets, file_paths))
     
     # Determina il numero di processi
     if n_jobs is None:
         n_jobs = max(1, multiprocessing.cpu_count() - 1)
     
-    # Estrai le caratteristiche in parallelo
-    all_features = []
-    with multiprocessing.Pool(processes=n_jobs) as pool:
-        for features in tqdm(pool.imap_unordered(process_audio_file, args_list), total=len(args_list)):
-            if features is not None:
-                all_features.append(features)
+    # Salta i file in quarantena (non modificati dall'ultimo fallimento)
+    base_dir = Path(base_dir)
+    audio_paths = [str(base_dir / dataset / file_path) for dataset, file_path in zip(datasets, file_paths)]
+    quarantine = load_quarantine(quarantine_path) if quarantine_path else {}
+    if quarantine and not retry_quarantined:
+        positions = [i for i in range(n_files) if not is_quarantined(quarantine, audio_paths[i])]
+        if len(positions) < n_files:
+            print(f"{n_files - len(positions)} file in quarantena saltati (usa --retry-quarantined per riprovarli)")
+    else:
+        positions = list(range(n_files))
+    
+    # Stima economica del costo di ogni file e pianificazione dal più lungo al più corto
+    costs = [estimate_cost(audio_paths[i], cost_estimate) for i in positions]
+    if excerpt_options:
+        # Nella modalità a estratti viene decodificata solo la durata complessiva delle finestre
+        excerpt_seconds = excerpt_options['windows'] * excerpt_options['length']
+        costs = [min(cost, excerpt_seconds) for cost in costs]
+    planned_chunks = plan_chunks(costs, n_jobs)
+    chunks = [[positions[k] for k in chunk] for chunk in planned_chunks]
+    
+    # Makespan previsto con il modello di costo delle esecuzioni precedenti con la stessa configurazione
+    cost_model_key = f"{profile_fingerprint(profile, excerpt_options)}|stream={stream}|{cost_estimate}"
+    cost_model = load_cost_model(cost_model_path, cost_model_key) if cost_model_path else None
+    if cost_model:
+        print(f"Makespan previsto: {predict_makespan(costs, planned_chunks, n_jobs, cost_model):.1f} s")
     
-    # Crea un DataFrame con tutte le caratteristiche
-    features_df = pd.DataFrame(all_features)
+    # Array colonnari preallocati per i risultati
+    columns = {col: np.empty(n_files, dtype=object) if col in TEXT_COLUMNS else np.full(n_files, np.nan)
+               for col in FEATURE_COLUMNS}
+    extracted = np.zeros(n_files, dtype=bool)
+    fresh = np.zeros(n_files, dtype=bool)
+    task_times = np.zeros(n_files)
+    
+    song_ids = metadata_df['song_id'].tolist()
+    failures = []
+    recovered = 0
+    
+    # Estrai le caratteristiche in parallelo: ogni processo preleva il blocco successivo appena libero
+    extract_options = {'stream': stream, 'tempo_options': tempo_options, 'profile': profile,
+                       'excerpt_options': excerpt_options}
+    pool = SupervisedPool(n_jobs, process_audio_file, initializer=init_worker,
+                          initargs=(str(base_dir), cache_config, extract_options, bool(timeout)), timeout=timeout)
+    start_time = time.perf_counter()
+    with tqdm(total=len(positions)) as progress:
+        for index, status, payload, elapsed in pool.run([[(i, tasks[i]) for i in chunk] for chunk in chunks]):
+            task_times[index] = elapsed
+            if status == 'ok':
+                extracted[index] = True
+                fresh[index] = not payload[2]
+                for col, value in zip(FEATURE_COLUMNS, payload[1]):
+                    columns[col][index] = value
+                # Un file in quarantena riprovato con successo ne esce
+                if quarantine.pop(audio_paths[index], None) is not None:
+                    recovered += 1
+            else:
+                error_type, detail = payload
+                failures.append({
+                    'song_id': song_ids[index],
+                    'dataset': datasets[index],
+                    'file_path': file_paths[index],
+                    'reason': status,
+                    'error_type': error_type,
+                    'detail': detail,
+                    'elapsed': round(elapsed, 3)
+                })
+            progress.update(1)
+    wall_time = time.perf_counter() - start_time
+    
+    # Aggiorna la quarantena: i file mancanti non vi finiscono, perché non sono "velenosi"
+    if quarantine_path:
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for failure in failures:
+            if failure['error_type'] == 'FileNotFoundError':
+                continue
+            audio_path = str(base_dir / failure['dataset'] / failure['file_path'])
+            quarantine[audio_path] = {
+                'reason': failure['reason'],
+                'error_type': failure['error_type'],
+                'detail': failure['detail'],
+                'signature': file_signature(audio_path),
+                'timestamp': timestamp
+            }
+        if failures or recovered:
+            save_quarantine(quarantine_path, quarantine)
+    
+    # Crea un DataFrame con le caratteristiche dei file estratti e i relativi metadati
+    features_df = pd.DataFrame({col: values[extracted] for col, values in columns.items()})
+    features_df['song_id'] = metadata_df['song_id'].to_numpy()[extracted]
+    features_df['dataset'] = np.asarray(datasets, dtype=object)[extracted]
+    features_df['file_path'] = np.asarray(file_paths, dtype=object)[extracted]
+    features_df['extraction_profile'] = profile_fingerprint(profile, excerpt_options)
+    
+    # Confronto tra makespan previsto ed effettivo
+    # Il modello di costo si adatta solo ai file estratti davvero in questa esecuzione
+    report = schedule_report(costs, planned_chunks, task_times[positions].tolist(), n_jobs, wall_time, cost_model,
+                             fit_mask=fresh[positions])
+    report['worker_restarts'] = pool.restarts
+    if cost_model_path and report['fitted_files'] >= MIN_COST_MODEL_FILES:
+        save_cost_model(cost_model_path, cost_model_key,
+                        (report['seconds_per_file'], report['seconds_per_audio_second']), report['fitted_files'])
+    print_schedule_report(report)
+    print_failure_report(failures, pool.restarts)
+    features_df.attrs['schedule'] = report
+    features_df.attrs['failures'] = failures
     
     return features_df
 
@@ -246,6 +382,35 @@ def main():
     parser.add_argument('--metadata', type=str, help='Percorso al file dei metadati unificati')
     parser.add_argument('--output-dir', type=str, help='Directory per i file di output')
     parser.add_argument('--n-jobs', type=int, help='Numero di processi paralleli da utilizzare')
+    parser.add_argument('--cache-dir', type=str, help='Directory della cache delle feature (default: <progetto>/feature_cache)')
+    parser.add_argument('--cache-max-gb', type=float, help='Dimensione massima della cache delle feature in GB')
+    parser.add_argument('--no-cache', action='store_true', help='Ricalcola sempre le feature ignorando la cache')
+    parser.add_argument('--cost-estimate', choices=['header', 'size'], default='header',
+                        help='Stima della durata dei file per la pianificazione: dall\'intestazione o dalla dimensione')
+    parser.add_argument('--stream', action='store_true', help='Decodifica l\'audio a blocchi con memoria costante (per brani lunghi)')
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help='Profilo di estrazione: frequenza di analisi, ricampionatore e parametri STFT')
+    parser.add_argument('--excerpt-windows', type=int, default=0,
+                        help='Analizza solo questo numero di finestre del brano invece dell\'intero file (0 per disattivare)')
+    parser.add_argument('--excerpt-length', type=float, default=DEFAULT_LENGTH, help='Durata in secondi di ogni finestra')
+    parser.add_argument('--excerpt-mode', choices=EXCERPT_MODES, default='peaks',
+                        help='Finestre attorno ai picchi di energia (sondaggio rapido) o equidistanti')
+    parser.add_argument('--tempo-method', choices=TEMPO_METHODS, default='onset',
+                        help='Stima del tempo: tempogramma dell\'inviluppo di onset (default, stesso BPM del beat tracking), '
+                             'beat tracking completo o autocorrelazione dell\'inviluppo')
+    parser.add_argument('--tempo-window', type=float, help='Analizza il tempo solo sui secondi centrali del brano (es. 30)')
+    parser.add_argument('--tempo-downsample', type=int, default=1,
+                        help='Fattore di sottocampionamento dell\'inviluppo per --tempo-method autocorr')
+    parser.add_argument('--store-dir', type=str, help='Directory del dataset nel feature store (default: <progetto>/features/multi_dataset)')
+    parser.add_argument('--csv', action='store_true', help='Salva anche il file CSV con timestamp')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Tempo massimo in secondi per un singolo file (default: 600, 0 per nessun limite)')
+    parser.add_argument('--quarantine', type=str,
+                        help='File JSON dei file in quarantena (default: <output-dir>/extraction_quarantine.json)')
+    parser.add_argument('--retry-quarantined', action='store_true', help='Riprova anche i file in quarantena')
+    parser.add_argument('--cost-model', type=str,
+                        help='File JSON del modello di costo per la previsione del makespan '
+                             '(default: <output-dir>/extraction_cost_model.json)')
     args = parser.parse_args()
     
     # Ottieni i percorsi del progetto
@@ -265,19 +430,67 @@ def main():
     metadata_df = pd.read_csv(paths['metadata_path'])
     print(f"Metadati caricati con successo. Forma: {metadata_df.shape}")
     
+    # Opzioni della stima del tempo (vuote con i valori predefiniti)
+    tempo_options = make_tempo_options(args.tempo_method, args.tempo_window, args.tempo_downsample)
+    
+    # Opzioni della modalità a estratti (vuote se disattivata)
+    excerpt_options = make_excerpt_options(args.excerpt_windows, args.excerpt_length, args.excerpt_mode)
+    
+    # Cache delle feature indirizzata per contenuto audio e impronta dell'estrattore
+    if args.no_cache:
+        cache_config = None
+    else:
+        cache_dir = args.cache_dir or str(paths['base_dir'] / 'feature_cache')
+        max_bytes = int(args.cache_max_gb * 1024 ** 3) if args.cache_max_gb else DEFAULT_MAX_BYTES
+        params = {}
+        if args.stream:
+            params['stream'] = True
+        if tempo_options:
+            params['tempo'] = tempo_options
+        if args.profile != DEFAULT_PROFILE:
+            params['profile'] = profile_fingerprint(args.profile)
+        if excerpt_options:
+            params['excerpt'] = excerpt_options
+        fingerprint = extractor_fingerprint('multi_dataset', EXTRACTOR_VERSION, params or None)
+        cache_config = (cache_dir, fingerprint, max_bytes)
+    
     # Estrai le caratteristiche audio
     start_time = time.time()
     features_df = extract_features_from_metadata(
         metadata_df, 
         paths['base_dir'],
-        n_jobs=args.n_jobs
+        n_jobs=args.n_jobs,
+        cache_config=cache_config,
+        stream=args.stream,
+        tempo_options=tempo_options,
+        profile=args.profile,
+        excerpt_options=excerpt_options,
+        cost_estimate=args.cost_estimate,
+        timeout=args.timeout or None,
+        quarantine_path=args.quarantine or paths['output_dir'] / 'extraction_quarantine.json',
+        retry_quarantined=args.retry_quarantined,
+        cost_model_path=args.cost_model or paths['output_dir'] / 'extraction_cost_model.json'
     )
     end_time = time.time()
     
-    # Salva le caratteristiche estratte
+    # Salva le caratteristiche estratte nel feature store (partizione Parquet tipizzata + puntatore LATEST)
     timestamp = time.strftime("%Y%m%d_%H%M%S")
-    output_path = paths['output_dir'] / f'audio_features_multi_dataset_{timestamp}.csv'
-    features_df.to_csv(output_path, index=False)
+    store_dir = args.store_dir or get_store_paths(paths['base_dir'])['multi_dataset']
+    output_path = write_features(features_df, store_dir, run_id=timestamp)
+    
+    # Salva opzionalmente anche il file CSV
+    if args.csv:
+        csv_path = paths['output_dir'] / f'audio_features_multi_dataset_{timestamp}.csv'
+        features_df.to_csv(csv_path, index=False)
+        print(f"File CSV salvato in: {csv_path}")
+    
+    # Rapporto strutturato dei file non estratti, con il motivo
+    failures = features_df.attrs['failures']
+    if failures:
+        failures_path = paths['output_dir'] / f'extraction_failures_{timestamp}.json'
+        with open(failures_path, 'w', encoding='utf-8') as f:
+            json.dump(failures, f, indent=2, ensure_ascii=False)
+        print(f"Rapporto dei file non estratti salvato in: {failures_path}")
     
     print(f"\nEstrazione completata in {end_time - start_time:.2f} secondi.")
     print(f"Caratteristiche audio estratte per {len(features_df)} file.")
@@ -0,0 +1,60 @@
+# Profili di estrazione: frequenza di analisi, ricampionatore e parametri STFT
+#
+# - 'accurate': impostazioni predefinite di librosa.load (22050 Hz, soxr_hq), quelle
+#   con cui è stata calcolata la tabella di riferimento
+# - 'fast': 16000 Hz con ricampionatore di qualità media e FFT più corta
+# - 'ultrafast': 11025 Hz con il ricampionatore più rapido; il contrasto spettrale usa
+#   5 bande, perché la sesta supererebbe la frequenza di Nyquist
+PROFILES = {
+    'accurate': {'sr': 22050, 'res_type': 'soxr_hq', 'n_fft': 2048, 'hop_length': 512, 'contrast_bands': 6},
+    'fast': {'sr': 16000, 'res_type': 'soxr_mq', 'n_fft': 1024, 'hop_length': 512, 'contrast_bands': 6},
+    'ultrafast': {'sr': 11025, 'res_type': 'soxr_qq', 'n_fft': 1024, 'hop_length': 512, 'contrast_bands': 5}
+}
+
+DEFAULT_PROFILE = 'accurate'
+
+# Qualità di soxr.ResampleStream corrispondente a ogni ricampionatore (estrazione in streaming)
+SOXR_QUALITIES = {'soxr_vhq': 'VHQ', 'soxr_hq': 'HQ', 'soxr_mq': 'MQ', 'soxr_lq': 'LQ', 'soxr_qq': 'QQ'}
+
+def get_profile(name=DEFAULT_PROFILE):
+    """
+    Restituisce le impostazioni di un profilo di estrazione
+
+    Parameters:
+    -----------
+    name : str
+        Nome del profilo in PROFILES
+
+    Returns:
+    --------
+    dict
+        Copia delle impostazioni (sr, res_type, n_fft, hop_length, contrast_bands)
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Profilo di estrazione non valido: {name} (validi: {', '.join(PROFILES)})")
+    return dict(PROFILES[name])
+
+def profile_fingerprint(name=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Impronta leggibile di un profilo, salvata in ogni riga delle tabelle di feature
+
+    Parameters:
+    -----------
+    name : str
+        Nome del profilo in PROFILES
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti (vedi excerpts.make_excerpt_options), aggiunte
+        all'impronta quando le feature sono calcolate solo su alcune finestre
+
+    Returns:
+    --------
+    str
+        Stringa del tipo 'accurate:22050:soxr_hq:2048:512:6', seguita ad esempio da
+        '+excerpt:peaks:3x10' nella modalità a estratti
+    """
+    profile = get_profile(name)
+    fingerprint = ':'.join(str(value) for value in [name, profile['sr'], profile['res_type'], profile['n_fft'],
+                                                    profile['hop_length'], profile['contrast_bands']])
+    if excerpt_options:
+        fingerprint += f"+excerpt:{excerpt_options['mode']}:{excerpt_options['windows']}x{excerpt_options['length']:g}"
+    return fingerprint
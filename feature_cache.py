@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Dimensione massima predefinita della cache su disco (2 GB)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Dimensione dei blocchi letti per calcolare l'hash del contenuto
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def extractor_fingerprint(name, version, params=None):
+    """
+    Calcola l'impronta di un estrattore a partire da nome, versione e parametri
+
+    Parameters:
+    -----------
+    name : str
+        Nome dell'estrattore (es. 'complete', 'multi_dataset', 'predict')
+    version : str
+        Versione dell'estrattore, da incrementare quando cambiano le feature calcolate
+    params : dict, optional
+        Parametri di estrazione che influenzano il risultato (sr, n_fft, duration, ...)
+
+    Returns:
+    --------
+    str
+        Impronta esadecimale di 16 caratteri
+    """
+    payload = json.dumps({'name': name, 'version': version, 'params': params or {}}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def file_content_hash(path):
+    """
+    Calcola l'hash SHA-1 del contenuto di un file leggendolo a blocchi
+
+    Parameters:
+    -----------
+    path : str o Path
+        Percorso al file
+
+    Returns:
+    --------
+    str
+        Hash esadecimale del contenuto
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """
+    Cache su disco delle feature estratte, indirizzata per contenuto
+
+    Ogni voce è identificata dall'hash del contenuto del file audio e dall'impronta
+    dell'estrattore, quindi un file rinominato o copiato riusa le feature già calcolate,
+    mentre una modifica dell'estrattore invalida automaticamente la cache. Per evitare
+    di rileggere l'intero file ad ogni esecuzione, l'hash viene memorizzato insieme a
+    dimensione e mtime del file (percorso veloce). Le feature sono salvate in formato
+    binario compatto (.npz) e le voci meno usate di recente vengono eliminate quando
+    la dimensione totale supera max_bytes.
+
+    Parameters:
+    -----------
+    cache_dir : str o Path
+        Directory della cache
+    fingerprint : str
+        Impronta dell'estrattore (vedi extractor_fingerprint)
+    max_bytes : int
+        Dimensione massima della cache in byte
+    """
+
+    def __init__(self, cache_dir, fingerprint, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = self.cache_dir / 'index.sqlite'
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'content_hash TEXT, fingerprint TEXT, size INTEGER, last_access REAL, '
+                         'PRIMARY KEY (content_hash, fingerprint))')
+
+    @contextmanager
+    def _connect(self):
+        # Una connessione per operazione: la cache può essere usata da più processi
+        conn = sqlite3.connect(self._db_path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _entry_path(self, content_hash):
+        return self.cache_dir / content_hash[:2] / f'{content_hash}_{self.fingerprint}.npz'
+
+    def content_hash(self, audio_path):
+        """
+        Restituisce l'hash del contenuto del file, usando dimensione+mtime come percorso veloce
+
+        Parameters:
+        -----------
+        audio_path : str o Path
+            Percorso al file audio
+
+        Returns:
+        --------
+        str
+            Hash del contenuto del file
+        """
+        audio_path = os.path.abspath(audio_path)
+        stat = os.stat(audio_path)
+        with self._connect() as conn:
+            row = conn.execute('SELECT size, mtime_ns, content_hash FROM files WHERE path = ?',
+                               (audio_path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        content_hash = file_content_hash(audio_path)
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                         (audio_path, stat.st_size, stat.st_mtime_ns, content_hash))
+        return content_hash
+
+    def get(self, audio_path):
+        """
+        Legge dalla cache le feature di un file audio
+
+        Parameters:
+        -----------
+        audio_path : str o Path
+            Percorso al file audio
+
+        Returns:
+        --------
+        dict o None
+            Dizionario delle feature, oppure None se non presenti in cache
+        """
+        content_hash = self.content_hash(audio_path)
+        entry_path = self._entry_path(content_hash)
+        try:
+            with np.load(entry_path, allow_pickle=False) as data:
+                # Ricostruisce gli scalari numpy con il tipo originale (es. float32)
+                features = {name: np.dtype(dtype).type(value) for name, dtype, value in zip(
+                    data['numeric_names'].tolist(), data['numeric_dtypes'].tolist(), data['numeric_values'])}
+                features.update(zip(data['text_names'].tolist(), data['text_values'].tolist()))
+                order = data['order'].tolist()
+        except (OSError, KeyError, ValueError):
+            return None
+
+        with self._connect() as conn:
+            conn.execute('UPDATE entries SET last_access = ? WHERE content_hash = ? AND fingerprint = ?',
+                         (time.time(), content_hash, self.fingerprint))
+        return {name: features[name] for name in order}
+
+    def put(self, audio_path, features):
+        """
+        Salva in cache le feature di un file audio
+
+        Parameters:
+        -----------
+        audio_path : str o Path
+            Percorso al file audio
+        features : dict
+            Dizionario delle feature (valori numerici scalari o stringhe)
+        """
+        content_hash = self.content_hash(audio_path)
+        entry_path = self._entry_path(content_hash)
+        entry_path.parent.mkdir(exist_ok=True)
+
+        features = normalize_features(features)
+        numeric = {k: v for k, v in features.items() if not isinstance(v, str)}
+        text = {k: v for k, v in features.items() if isinstance(v, str)}
+
+        # Scrittura atomica: un lettore concorrente non vede mai un file parziale
+        tmp_path = entry_path.with_name(f'{entry_path.stem}.{os.getpid()}.tmp.npz')
+        np.savez_compressed(
+            tmp_path,
+            order=np.array(list(features), dtype=str),
+            numeric_names=np.array(list(numeric), dtype=str),
+            numeric_dtypes=np.array([np.asarray(v).dtype.str for v in numeric.values()], dtype=str),
+            numeric_values=np.array(list(numeric.values()), dtype=np.float64),
+            text_names=np.array(list(text), dtype=str),
+            text_values=np.array(list(text.values()), dtype=str)
+        )
+        os.replace(tmp_path, entry_path)
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                         (content_hash, self.fingerprint, entry_path.stat().st_size, time.time()))
+        self.evict()
+
+    def evict(self):
+        """
+        Elimina le voci usate meno di recente finché la cache non rientra in max_bytes
+        """
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for content_hash, fingerprint, size in conn.execute(
+                    'SELECT content_hash, fingerprint, size FROM entries ORDER BY last_access').fetchall():
+                entry_path = self.cache_dir / content_hash[:2] / f'{content_hash}_{fingerprint}.npz'
+                try:
+                    entry_path.unlink()
+                except FileNotFoundError:
+                    pass
+                conn.execute('DELETE FROM entries WHERE content_hash = ? AND fingerprint = ?',
+                             (content_hash, fingerprint))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+def normalize_features(features):
+    """
+    Riduce ogni feature a uno scalare o a una stringa (es. il tempo restituito come array
+    di un elemento da librosa.beat.beat_track), così che i valori letti dalla cache e
+    quelli appena estratti abbiano la stessa forma
+
+    Parameters:
+    -----------
+    features : dict
+        Dizionario delle feature
+
+    Returns:
+    --------
+    dict
+        Dizionario con valori scalari numpy o stringhe
+    """
+    return {k: v if isinstance(v, str) else np.ravel(v)[0] for k, v in features.items()}
+
+_open_caches = {}
+
+def open_cache(cache_dir, fingerprint, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Restituisce la cache per (cache_dir, fingerprint), aprendola una sola volta per processo
+
+    Parameters:
+    -----------
+    cache_dir : str o Path o None
+        Directory della cache (None per disattivare la cache)
+    fingerprint : str
+        Impronta dell'estrattore
+    max_bytes : int
+        Dimensione massima della cache in byte
+
+    Returns:
+    --------
+    FeatureCache o None
+        Cache aperta, oppure None se cache_dir è None
+    """
+    if cache_dir is None:
+        return None
+    key = (str(cache_dir), fingerprint, max_bytes)
+    if key not in _open_caches:
+        _open_caches[key] = FeatureCache(cache_dir, fingerprint, max_bytes)
+    return _open_caches[key]
+
+def cached_extraction(cache, audio_path, extract_fn, return_hit=False):
+    """
+    Restituisce le feature dalla cache o le estrae e le salva in cache
+
+    Parameters:
+    -----------
+    cache : FeatureCache o None
+        Cache da usare (None per estrarre sempre)
+    audio_path : str o Path
+        Percorso al file audio
+    extract_fn : callable
+        Funzione audio_path -> dict di feature (o None in caso di errore)
+    return_hit : bool
+        Se True restituisce anche se le feature sono state lette dalla cache
+
+    Returns:
+    --------
+    dict o None, oppure tuple
+        Dizionario delle feature; con return_hit la coppia (feature, letto dalla cache)
+    """
+    # Senza cache, o per file inesistenti, l'estrattore gestisce e segnala l'errore
+    if cache is None or not os.path.exists(audio_path):
+        features = extract_fn(audio_path)
+        return (features, False) if return_hit else features
+
+    features = cache.get(audio_path)
+    if features is not None:
+        return (features, True) if return_hit else features
+
+    features = extract_fn(audio_path)
+    if features is not None:
+        features = normalize_features(features)
+        cache.put(audio_path, features)
+    return (features, False) if return_hit else features
@@ -0,0 +1,441 @@
+import numpy as np
+import librosa
+
+from excerpts import ExcerptPlan
+from extraction_profiles import DEFAULT_PROFILE, SOXR_QUALITIES, get_profile
+from spectral_plan import SpectralPlan
+from streaming import StreamingPlan
+from tonality import KEY_NAMES, SCALE_NAMES, SCALE_PITCHES, chord_quality, match_scales
+
+# Registro delle feature: nome -> funzione di calcolo e dipendenze dichiarate
+FEATURES = {}
+
+def register_feature(name, descriptors=(), inputs=(), categorical=False):
+    """
+    Registra una feature calcolata da un piano spettrale
+
+    La funzione decorata riceve il piano spettrale e una funzione get(nome) che
+    restituisce il valore (memorizzato) di un'altra feature del registro.
+
+    Parameters:
+    -----------
+    name : str
+        Nome della feature nel registro
+    descriptors : tuple
+        Descrittori del piano spettrale usati direttamente (vedi SpectralPlan.descriptor),
+        più 'spectral_flux' e 'tempo'
+    inputs : tuple
+        Altre feature del registro da cui dipende
+    categorical : bool
+        True per le feature testuali, codificate con variabili dummy dai modelli
+    """
+    def decorator(compute):
+        FEATURES[name] = {'compute': compute, 'descriptors': tuple(descriptors),
+                          'inputs': tuple(inputs), 'categorical': categorical}
+        return compute
+    return decorator
+
+# --- Descrittori del segnale e dello spettro ---
+
+@register_feature('rms_energy', descriptors=('rms',))
+def _rms_energy(plan, get):
+    return plan.mean('rms')
+
+@register_feature('zero_crossing_rate', descriptors=('zero_crossing_rate',))
+def _zero_crossing_rate(plan, get):
+    return plan.mean('zero_crossing_rate')
+
+@register_feature('spectral_centroid', descriptors=('spectral_centroid',))
+def _spectral_centroid(plan, get):
+    return plan.mean('spectral_centroid')
+
+@register_feature('spectral_rolloff', descriptors=('spectral_rolloff',))
+def _spectral_rolloff(plan, get):
+    return plan.mean('spectral_rolloff')
+
+@register_feature('spectral_bandwidth', descriptors=('spectral_bandwidth',))
+def _spectral_bandwidth(plan, get):
+    return plan.mean('spectral_bandwidth')
+
+@register_feature('spectral_flatness', descriptors=('spectral_flatness',))
+def _spectral_flatness(plan, get):
+    return plan.mean('spectral_flatness')
+
+@register_feature('spectral_contrast', descriptors=('spectral_contrast',))
+def _spectral_contrast(plan, get):
+    return plan.mean('spectral_contrast')
+
+@register_feature('spectral_flux', descriptors=('spectral_flux',))
+def _spectral_flux(plan, get):
+    return plan.mean('spectral_flux')
+
+@register_feature('roughness', descriptors=('spectral_contrast',))
+def _roughness(plan, get):
+    # Approssimazione della dissonanza basata sul contrasto spettrale
+    return plan.std('spectral_contrast')
+
+@register_feature('irregularity', descriptors=('spectral_centroid',))
+def _irregularity(plan, get):
+    # Approssimazione basata sulla deviazione standard del centroide spettrale
+    return plan.std('spectral_centroid')
+
+@register_feature('mfcc_means', descriptors=('mfcc',))
+def _mfcc_means(plan, get):
+    return plan.mean('mfcc', axis=1)
+
+def _register_mfcc(index):
+    @register_feature(f'mfcc_{index + 1}', inputs=('mfcc_means',))
+    def _mfcc(plan, get):
+        return get('mfcc_means')[index]
+
+for _index in range(13):
+    _register_mfcc(_index)
+
+@register_feature('tempo', descriptors=('tempo',))
+def _tempo(plan, get):
+    return plan.tempo()
+
+# --- Chroma e tonalità ---
+
+@register_feature('chroma_mean', descriptors=('chroma',))
+def _chroma_mean(plan, get):
+    return plan.mean('chroma')
+
+@register_feature('chroma_sum', descriptors=('chroma',))
+def _chroma_sum(plan, get):
+    return plan.sum('chroma')
+
+@register_feature('chroma_profile', inputs=('chroma_sum',))
+def _chroma_profile(plan, get):
+    # Profilo delle classi di altezza normalizzato
+    chroma_sum = get('chroma_sum')
+    return chroma_sum / np.sum(chroma_sum)
+
+@register_feature('key_index', inputs=('chroma_profile',))
+def _key_index(plan, get):
+    return np.argmax(get('chroma_profile'))
+
+@register_feature('key', inputs=('key_index',), categorical=True)
+def _key(plan, get):
+    return KEY_NAMES[get('key_index')]
+
+@register_feature('chord_mode', inputs=('chroma_sum',), categorical=True)
+def _chord_mode(plan, get):
+    # Qualità dell'accordo formato dalle note significative (stesso risultato di
+    # music21.chord.Chord(...).quality, senza importare music21)
+    try:
+        chroma_sum = get('chroma_sum')
+        chroma_max = np.argmax(chroma_sum)
+        notes = [i for i, val in enumerate(chroma_sum) if val > 0.5 * chroma_sum[chroma_max]]
+        if notes:
+            return 'major' if chord_quality(notes) == 'major' else 'minor'
+        return 'unknown'
+    except Exception as e:
+        print(f"Errore nella determinazione della modalità: {e}")
+        return 'unknown'
+
+@register_feature('scale_match', inputs=('chroma_profile', 'key_index'))
+def _scale_match(plan, get):
+    # Punteggio di tutte le scale sulla tonica predominante, calcolato in blocco
+    _, scale_indices, scale_correlations = match_scales(get('chroma_profile'), [get('key_index')])
+    return SCALE_NAMES[scale_indices[0]], scale_correlations[0]
+
+@register_feature('scale_name', inputs=('scale_match',), categorical=True)
+def _scale_name(plan, get):
+    return get('scale_match')[0]
+
+@register_feature('scale_correlation', inputs=('scale_match',))
+def _scale_correlation(plan, get):
+    return get('scale_match')[1]
+
+@register_feature('scale_mode', inputs=('scale_name',), categorical=True)
+def _scale_mode(plan, get):
+    # Modalità dal nome della scala (per le scale modali ed esotiche, il nome stesso)
+    scale_name = get('scale_name')
+    if 'Minor' in scale_name:
+        return 'minor'
+    if 'Major' in scale_name:
+        return 'major'
+    return scale_name.lower()
+
+@register_feature('key_full', inputs=('key', 'scale_name'), categorical=True)
+def _key_full(plan, get):
+    return f"{get('key')} {get('scale_name')}"
+
+@register_feature('key_correlation', inputs=('chroma_profile', 'key_index'))
+def _key_correlation(plan, get):
+    # Forza della tonalità: peso della tonica rispetto alla media delle classi di altezza
+    chroma_profile = get('chroma_profile')
+    return float(chroma_profile[get('key_index')] / np.mean(chroma_profile))
+
+@register_feature('scale_pitches', inputs=('key_index', 'scale_name'), categorical=True)
+def _scale_pitches(plan, get):
+    return SCALE_PITCHES[(get('key_index'), get('scale_name'))]
+
+# Insiemi di feature: colonna di output -> feature del registro
+MFCC_COLUMNS = {f'mfcc_{i}': f'mfcc_{i}' for i in range(1, 14)}
+
+FEATURE_SETS = {
+    # Tabella di extract_audio_features_multi_dataset.py
+    'multi_dataset': {
+        'rms_energy': 'rms_energy',
+        'spectral_centroid': 'spectral_centroid',
+        'spectral_rolloff': 'spectral_rolloff',
+        'chroma_mean': 'chroma_mean',
+        'key': 'key',
+        'spectral_contrast': 'spectral_contrast',
+        'tempo': 'tempo',
+        'zero_crossing_rate': 'zero_crossing_rate',
+        'spectral_bandwidth': 'spectral_bandwidth',
+        'spectral_flatness': 'spectral_flatness',
+        'spectral_flux': 'spectral_flux',
+        'roughness': 'roughness',
+        'irregularity': 'irregularity',
+        'mode': 'chord_mode',
+        **MFCC_COLUMNS
+    },
+    # Feature di base di extract_audio_features_complete.py
+    'deam_basic': {
+        'rms': 'rms_energy',
+        'spectral_centroid': 'spectral_centroid',
+        'spectral_rolloff': 'spectral_rolloff',
+        'chroma_mean': 'chroma_mean',
+        'predominant_key': 'key',
+        **MFCC_COLUMNS
+    },
+    # Feature di tonalità e scala di extract_audio_features_complete.py
+    'deam_tonality': {
+        'key': 'key',
+        'mode': 'scale_mode',
+        'scale_name': 'scale_name',
+        'key_full': 'key_full',
+        'key_correlation': 'key_correlation',
+        'scale_correlation': 'scale_correlation',
+        'scale_pitches': 'scale_pitches'
+    },
+    # Colonne della tabella DEAM completa, su cui vengono addestrati i modelli
+    'deam_complete': {
+        'rms': 'rms_energy',
+        'spectral': 'spectral_centroid',
+        'rolloff': 'spectral_rolloff',
+        'Chromatic scale': 'chroma_mean',
+        'Predominant Key': 'key',
+        'MFCC': 'mfcc_1',
+        'key': 'key',
+        'mode': 'scale_mode',
+        'scale_name': 'scale_name',
+        'key_full': 'key_full',
+        'key_correlation': 'key_correlation',
+        'scale_correlation': 'scale_correlation',
+        'scale_pitches': 'scale_pitches'
+    }
+}
+
+def get_feature_set(feature_set, columns=None):
+    """
+    Restituisce la mappa colonna -> feature di un insieme, eventualmente ridotta
+
+    Parameters:
+    -----------
+    feature_set : str o dict
+        Nome di un insieme in FEATURE_SETS oppure mappa colonna -> feature del registro
+    columns : list, optional
+        Colonne da mantenere (None per tutte)
+
+    Returns:
+    --------
+    dict
+        Mappa colonna di output -> nome della feature nel registro
+    """
+    mapping = FEATURE_SETS[feature_set] if isinstance(feature_set, str) else feature_set
+    if columns is None:
+        return dict(mapping)
+    return {col: mapping[col] for col in columns}
+
+def categorical_columns(feature_set):
+    """
+    Colonne testuali di un insieme di feature
+
+    Parameters:
+    -----------
+    feature_set : str o dict
+        Nome di un insieme in FEATURE_SETS oppure mappa colonna -> feature
+
+    Returns:
+    --------
+    list
+        Colonne le cui feature sono categoriche
+    """
+    return [col for col, name in get_feature_set(feature_set).items() if FEATURES[name]['categorical']]
+
+def resolve_dependencies(feature_names):
+    """
+    Risolve il grafo delle dipendenze di un insieme di feature
+
+    Parameters:
+    -----------
+    feature_names : iterable
+        Nomi delle feature richieste
+
+    Returns:
+    --------
+    tuple
+        (features, descriptors): tutte le feature da calcolare (incluse quelle intermedie)
+        e i descrittori del piano spettrale necessari
+    """
+    features = set()
+    pending = list(feature_names)
+    while pending:
+        name = pending.pop()
+        if name in features:
+            continue
+        if name not in FEATURES:
+            raise KeyError(f"Feature non registrata: {name}")
+        features.add(name)
+        pending.extend(FEATURES[name]['inputs'])
+
+    descriptors = {descriptor for name in features for descriptor in FEATURES[name]['descriptors']}
+    return features, descriptors
+
+def columns_for_model(model_features, feature_set):
+    """
+    Colonne di un insieme di feature necessarie a un modello addestrato
+
+    Le feature del modello sono le colonne numeriche della tabella di addestramento e
+    le variabili dummy delle colonne categoriche (es. 'key_A#' per la colonna 'key').
+
+    Parameters:
+    -----------
+    model_features : list
+        Elenco delle feature del modello (contenuto di <target>_features.pkl)
+    feature_set : str o dict
+        Insieme di feature su cui il modello è stato addestrato
+
+    Returns:
+    --------
+    list
+        Colonne dell'insieme da estrarre, nell'ordine dell'insieme
+    """
+    mapping = get_feature_set(feature_set)
+    # Le colonne categoriche più lunghe per prime, così che 'key_full_...' non venga
+    # attribuita alla colonna 'key'
+    categorical = sorted(categorical_columns(mapping), key=len, reverse=True)
+    needed = set()
+    for name in model_features:
+        if name in mapping:
+            needed.add(name)
+            continue
+        for col in categorical:
+            if name.startswith(f'{col}_'):
+                needed.add(col)
+                break
+    return [col for col in mapping if col in needed]
+
+def compute_features(plan, feature_set, columns=None):
+    """
+    Calcola le feature di un insieme da un piano spettrale
+
+    Ogni feature (e ogni rappresentazione intermedia del piano) viene calcolata una
+    sola volta e solo se richiesta, direttamente o come dipendenza.
+
+    Parameters:
+    -----------
+    plan : SpectralPlan o StreamingPlan
+        Piano spettrale del brano
+    feature_set : str o dict
+        Nome di un insieme in FEATURE_SETS oppure mappa colonna -> feature
+    columns : list, optional
+        Colonne da calcolare (None per tutte quelle dell'insieme)
+
+    Returns:
+    --------
+    dict
+        Dizionario colonna -> valore
+    """
+    values = {}
+
+    def get(name):
+        if name not in values:
+            values[name] = FEATURES[name]['compute'](plan, get)
+        return values[name]
+
+    return {col: get(name) for col, name in get_feature_set(feature_set, columns).items()}
+
+def build_plan(audio_path, feature_set, columns=None, duration=None, stream=False, tempo_options=None,
+               profile=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Decodifica un file audio e prepara il piano spettrale per un insieme di feature
+
+    Parameters:
+    -----------
+    audio_path : str o Path
+        Percorso al file audio
+    feature_set : str o dict
+        Nome di un insieme in FEATURE_SETS oppure mappa colonna -> feature
+    columns : list, optional
+        Colonne da calcolare (None per tutte quelle dell'insieme)
+    duration : float, optional
+        Durata in secondi da caricare (None per caricare l'intero file)
+    stream : bool
+        Se True decodifica il file a blocchi, accumulando solo i descrittori necessari
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione (frequenza di analisi, ricampionatore, parametri STFT),
+        vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Se indicato analizza solo alcune finestre del brano (windows, length, mode),
+        vedi excerpts.ExcerptPlan; ha la precedenza su stream
+
+    Returns:
+    --------
+    SpectralPlan, StreamingPlan o ExcerptPlan
+        Piano spettrale del brano
+    """
+    settings = get_profile(profile)
+    if excerpt_options:
+        _, descriptors = resolve_dependencies(get_feature_set(feature_set, columns).values())
+        return ExcerptPlan(audio_path, sr=settings['sr'], n_fft=settings['n_fft'], hop_length=settings['hop_length'],
+                           duration=duration, descriptors=descriptors, tempo_options=tempo_options,
+                           res_type=settings['res_type'], contrast_bands=settings['contrast_bands'],
+                           **excerpt_options)
+    if stream:
+        _, descriptors = resolve_dependencies(get_feature_set(feature_set, columns).values())
+        return StreamingPlan(audio_path, sr=settings['sr'], n_fft=settings['n_fft'], hop_length=settings['hop_length'],
+                             duration=duration, descriptors=descriptors, tempo_options=tempo_options,
+                             quality=SOXR_QUALITIES[settings['res_type']], contrast_bands=settings['contrast_bands'])
+    y, sr = librosa.load(audio_path, sr=settings['sr'], duration=duration, res_type=settings['res_type'])
+    return SpectralPlan(y, sr, n_fft=settings['n_fft'], hop_length=settings['hop_length'],
+                        tempo_options=tempo_options, contrast_bands=settings['contrast_bands'])
+
+def extract_feature_set(audio_path, feature_set, columns=None, duration=None, stream=False, tempo_options=None,
+                        profile=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Estrae da un file audio le feature di un insieme, calcolando solo le dipendenze necessarie
+
+    Parameters:
+    -----------
+    audio_path : str o Path
+        Percorso al file audio
+    feature_set : str o dict
+        Nome di un insieme in FEATURE_SETS oppure mappa colonna -> feature
+    columns : list, optional
+        Colonne da calcolare (None per tutte quelle dell'insieme)
+    duration : float, optional
+        Durata in secondi da caricare (None per caricare l'intero file)
+    stream : bool
+        Se True decodifica il file a blocchi con memoria costante
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti, vedi excerpts.make_excerpt_options
+
+    Returns:
+    --------
+    dict
+        Dizionario colonna -> valore
+    """
+    plan = build_plan(audio_path, feature_set, columns, duration, stream, tempo_options, profile, excerpt_options)
+    return compute_features(plan, feature_set, columns)
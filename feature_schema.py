@@ -0,0 +1,152 @@
+import json
+
+import numpy as np
+
+# Nome del file dello schema, salvato accanto ai modelli addestrati
+FEATURE_SCHEMA_FILE = 'feature_schema.json'
+
+# Colonne categoriche codificate one-hot (in questo ordine, dopo le colonne numeriche)
+ONE_HOT_COLUMNS = ['key', 'mode', 'scale_name']
+
+class FeatureSchema:
+    """
+    Schema delle feature di input dei modelli: ordine delle colonne e vocabolari
+
+    Le colonne sono numeriche oppure one-hot del tipo '<colonna categorica>_<categoria>',
+    con le categorie di ogni colonna categorica elencate nel suo vocabolario (quelle
+    eliminate da drop_first o mai viste in addestramento non hanno una colonna e
+    producono una riga di zeri). Lo stesso schema codifica la tabella di addestramento
+    (predict_emotions.prepare_data) e le feature estratte in predizione, scrivendo i
+    valori direttamente in una matrice NumPy.
+
+    Parameters:
+    -----------
+    columns : list
+        Colonne di input, nell'ordine atteso dai modelli
+    categories : dict
+        Dizionario colonna categorica -> categorie con una colonna one-hot
+    """
+
+    def __init__(self, columns, categories):
+        self.columns = list(columns)
+        self.categories = {name: [str(value) for value in values] for name, values in categories.items()}
+
+        one_hot = {f'{name}_{value}': (name, value) for name, values in self.categories.items() for value in values}
+        self.numeric = [column for column in self.columns if column not in one_hot]
+        # Posizioni precalcolate per la codifica: (indice, feature) numeriche e, per ogni
+        # colonna categorica, categoria -> indice della colonna one-hot
+        self._numeric_positions = [(j, column) for j, column in enumerate(self.columns) if column not in one_hot]
+        self._category_positions = {name: {} for name in self.categories}
+        for j, column in enumerate(self.columns):
+            if column in one_hot:
+                name, value = one_hot[column]
+                self._category_positions[name][value] = j
+
+    @classmethod
+    def from_columns(cls, columns, numeric_columns=(), categorical_columns=ONE_HOT_COLUMNS):
+        """
+        Ricostruisce lo schema dai soli nomi delle colonne (modelli salvati senza schema)
+
+        Parameters:
+        -----------
+        columns : list
+            Colonne di input dei modelli
+        numeric_columns : iterable
+            Colonne sicuramente numeriche anche se iniziano con il nome di una colonna
+            categorica (es. 'key_correlation')
+        categorical_columns : list
+            Colonne categoriche codificate one-hot
+
+        Returns:
+        --------
+        FeatureSchema
+            Schema con le categorie ricavate dai nomi delle colonne one-hot
+        """
+        numeric_columns = set(numeric_columns)
+        categories = {}
+        for column in columns:
+            if column in numeric_columns:
+                continue
+            prefix = next((name for name in categorical_columns if column.startswith(name + '_')), None)
+            if prefix is not None:
+                categories.setdefault(prefix, []).append(column[len(prefix) + 1:])
+        return cls(columns, categories)
+
+    def to_dict(self):
+        return {'columns': self.columns, 'categories': self.categories}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['columns'], data['categories'])
+
+    def save(self, path):
+        """Salva lo schema in JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Carica uno schema salvato con save"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def encode_rows(self, rows, out=None):
+        """
+        Codifica una lista di dizionari di feature
+
+        Le feature numeriche assenti valgono 0 (None diventa NaN), le categorie fuori dal
+        vocabolario producono zeri in tutte le colonne one-hot della loro colonna.
+
+        Parameters:
+        -----------
+        rows : list
+            Lista di dizionari con le caratteristiche audio estratte
+        out : np.ndarray, optional
+            Matrice preallocata (almeno len(rows) righe, len(columns) colonne) in cui
+            scrivere il risultato, riutilizzabile tra una chiamata e l'altra
+
+        Returns:
+        --------
+        np.ndarray
+            Matrice (len(rows), len(columns))
+        """
+        if out is None:
+            X = np.zeros((len(rows), len(self.columns)))
+        else:
+            X = out[:len(rows)]
+            X.fill(0.0)
+        for i, row in enumerate(rows):
+            for j, name in self._numeric_positions:
+                if name in row:
+                    value = row[name]
+                    X[i, j] = np.nan if value is None else value
+            for name, positions in self._category_positions.items():
+                j = positions.get(str(row.get(name)))
+                if j is not None:
+                    X[i, j] = 1.0
+        return X
+
+    def encode_frame(self, df):
+        """
+        Codifica un DataFrame (es. la tabella di addestramento) in modo vettoriale
+
+        Parameters:
+        -----------
+        df : DataFrame
+            DataFrame con tutte le colonne numeriche e categoriche dello schema
+
+        Returns:
+        --------
+        np.ndarray
+            Matrice (len(df), len(columns))
+        """
+        X = np.zeros((len(df), len(self.columns)))
+        X[:, [j for j, _ in self._numeric_positions]] = df[self.numeric].to_numpy(dtype=np.float64)
+        rows = np.arange(len(df))
+        for name, positions in self._category_positions.items():
+            if name not in df.columns:
+                continue
+            columns = df[name].astype(str).map(positions).to_numpy(dtype=np.float64)
+            found = ~np.isnan(columns)
+            X[rows[found], columns[found].astype(np.int64)] = 1.0
+        return X
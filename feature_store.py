@@ -0,0 +1,197 @@
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Colonne salvate come categoriche (dizionario Arrow)
+CATEGORICAL_COLUMNS = ['key', 'mode', 'scale_name', 'Predominant Key', 'key_full', 'dataset', 'extraction_profile']
+
+# File con il nome dell'ultima esecuzione scritta
+LATEST_FILE = 'LATEST'
+
+def get_store_paths(base_dir=None):
+    """
+    Definisce i percorsi dei dataset del feature store
+
+    Parameters:
+    -----------
+    base_dir : str o Path, optional
+        Directory base del progetto (default: directory di questo file)
+
+    Returns:
+    --------
+    dict
+        Dizionario con la directory del feature store e dei singoli dataset
+    """
+    base_dir = Path(base_dir) if base_dir else Path(os.path.dirname(os.path.abspath(__file__)))
+    store_dir = base_dir / 'features'
+    return {
+        'store_dir': store_dir,
+        'deam_complete': store_dir / 'deam_complete',
+        'multi_dataset': store_dir / 'multi_dataset',
+        'deam_dynamic': store_dir / 'deam_dynamic'
+    }
+
+def is_feature_store(path):
+    """
+    Verifica se un percorso è un dataset del feature store (e non un file CSV)
+
+    Parameters:
+    -----------
+    path : str o Path
+        Percorso da verificare
+
+    Returns:
+    --------
+    bool
+        True se il percorso è una directory con almeno un'esecuzione scritta
+    """
+    return (Path(path) / LATEST_FILE).exists()
+
+def to_store_types(df):
+    """
+    Converte le colonne nei tipi del feature store: categoriche per tonalità/modalità/scala,
+    float32 per i descrittori, stringhe per le altre colonne testuali
+
+    Parameters:
+    -----------
+    df : DataFrame
+        DataFrame con le feature
+
+    Returns:
+    --------
+    DataFrame
+        Copia del DataFrame con i tipi convertiti
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype('float32')
+        elif df[col].dtype == object:
+            df[col] = df[col].astype('string')
+    return df
+
+def latest_run(dataset_dir):
+    """
+    Restituisce l'identificativo dell'ultima esecuzione scritta nel dataset
+
+    Parameters:
+    -----------
+    dataset_dir : str o Path
+        Directory del dataset nel feature store
+
+    Returns:
+    --------
+    str o None
+        Identificativo dell'esecuzione, None se il dataset è vuoto
+    """
+    latest_path = Path(dataset_dir) / LATEST_FILE
+    if not latest_path.exists():
+        return None
+    return latest_path.read_text(encoding='utf-8').strip()
+
+def write_features(df, dataset_dir, run_id=None):
+    """
+    Scrive le feature come nuova partizione Parquet (solo append) e aggiorna il puntatore LATEST
+
+    Ogni chiamata aggiunge un file part-N.parquet alla partizione run=<run_id>; le
+    partizioni esistenti non vengono mai riscritte.
+
+    Parameters:
+    -----------
+    df : DataFrame
+        DataFrame con le feature
+    dataset_dir : str o Path
+        Directory del dataset nel feature store (es. features/deam_complete)
+    run_id : str, optional
+        Identificativo dell'esecuzione (default: timestamp corrente)
+
+    Returns:
+    --------
+    Path
+        Percorso del file Parquet scritto
+    """
+    dataset_dir = Path(dataset_dir)
+    run_id = run_id or time.strftime("%Y%m%d_%H%M%S")
+    run_dir = dataset_dir / f'run={run_id}'
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    part_index = len(list(run_dir.glob('part-*.parquet')))
+    part_path = run_dir / f'part-{part_index}.parquet'
+
+    table = pa.Table.from_pandas(to_store_types(df), preserve_index=False)
+    tmp_path = part_path.with_suffix('.tmp')
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, part_path)
+
+    # Aggiorna il puntatore all'ultima esecuzione in modo atomico
+    latest_tmp = dataset_dir / f'{LATEST_FILE}.tmp'
+    latest_tmp.write_text(run_id, encoding='utf-8')
+    os.replace(latest_tmp, dataset_dir / LATEST_FILE)
+
+    return part_path
+
+def read_features(dataset_dir, columns=None, run='latest'):
+    """
+    Legge le feature dal feature store, solo per le colonne richieste
+
+    Parameters:
+    -----------
+    dataset_dir : str o Path
+        Directory del dataset nel feature store
+    columns : list, optional
+        Colonne da leggere (None per tutte)
+    run : str
+        'latest' per l'ultima esecuzione, 'all' per tutte (con la colonna 'run'),
+        oppure l'identificativo di un'esecuzione specifica
+
+    Returns:
+    --------
+    DataFrame
+        DataFrame con le feature richieste
+    """
+    dataset_dir = Path(dataset_dir)
+
+    if run == 'all':
+        dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive',
+                             exclude_invalid_files=True)
+        table = dataset.to_table(columns=columns)
+        return table.to_pandas()
+
+    if run == 'latest':
+        run = latest_run(dataset_dir)
+        if run is None:
+            raise FileNotFoundError(f"Nessuna esecuzione trovata nel feature store {dataset_dir}")
+
+    part_paths = sorted((dataset_dir / f'run={run}').glob('part-*.parquet'))
+    if not part_paths:
+        raise FileNotFoundError(f"Esecuzione {run} non trovata nel feature store {dataset_dir}")
+
+    tables = [pq.read_table(path, columns=columns, memory_map=True) for path in part_paths]
+    return pa.concat_tables(tables, promote_options='permissive').to_pandas()
+
+def load_feature_table(path, columns=None):
+    """
+    Carica una tabella di feature da un file CSV o da un dataset del feature store
+
+    Parameters:
+    -----------
+    path : str o Path
+        File CSV oppure directory di un dataset del feature store
+    columns : list, optional
+        Colonne da leggere (None per tutte)
+
+    Returns:
+    --------
+    DataFrame
+        DataFrame con le feature
+    """
+    if is_feature_store(path):
+        return read_features(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
@@ -0,0 +1,355 @@
+import os
+import json
+import math
+import time
+import hashlib
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+# Modi di ricerca degli iperparametri:
+# - 'grid': GridSearchCV esaustiva, ogni configurazione addestrata fino in fondo
+# - 'halving': dimezzamenti successivi, le configurazioni peggiori vengono scartate
+#   dopo essere state valutate con un budget ridotto (alberi o campioni)
+SEARCH_MODES = ['grid', 'halving']
+
+# Parametro usato come budget nei modelli a ensemble: tra un turno e l'altro gli alberi
+# già addestrati vengono riutilizzati (warm_start) e ne vengono aggiunti solo di nuovi.
+# Gli altri modelli usano come budget il numero di campioni di training. Nella griglia il
+# parametro ha il prefisso 'model__', oppure 'model__estimator__' per i modelli avvolti
+# in MultiOutputRegressor (vedi model_param_prefix).
+ESTIMATOR_RESOURCE = 'n_estimators'
+
+# Fattore di riduzione: a ogni turno sopravvive 1/FACTOR delle configurazioni
+FACTOR = 3
+
+# Budget minimo in campioni per i modelli senza n_estimators
+MIN_SAMPLES = 100
+
+# Arresto anticipato del Gradient Boosting: iterazioni senza miglioramento sulla
+# frazione di validazione interna prima di fermare l'aggiunta di stadi
+N_ITER_NO_CHANGE = 10
+VALIDATION_FRACTION = 0.1
+
+class TrialLog:
+    """
+    Registro persistente delle prove della ricerca (un oggetto JSON per riga)
+
+    Ogni prova è identificata da un'impronta di modello, parametri, budget, dati e
+    schema di cross-validation: rieseguendo una ricerca interrotta, le prove già
+    registrate vengono lette dal file invece di essere riaddestrate.
+
+    Parameters:
+    -----------
+    path : str, optional
+        Percorso del file JSONL (None per non salvare le prove)
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.trials = {}
+        self.reused = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Riga troncata da un'interruzione durante la scrittura
+                        continue
+                    self.trials[trial['key']] = trial
+
+    @staticmethod
+    def make_key(**fields):
+        """Impronta di una prova a partire dai campi che ne determinano il risultato"""
+        return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        trial = self.trials.get(key)
+        if trial is not None:
+            self.reused += 1
+        return trial
+
+    def record(self, trial):
+        self.trials[trial['key']] = trial
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(trial, default=str) + '\n')
+                f.flush()
+
+def data_fingerprint(X, y):
+    """
+    Impronta dei dati di training, per non riutilizzare prove calcolate su dati diversi
+
+    Parameters:
+    -----------
+    X : DataFrame o np.ndarray
+        Feature di training
+    y : Series o np.ndarray
+        Target di training
+
+    Returns:
+    --------
+    str
+        Impronta esadecimale di valori e colonne
+    """
+    digest = hashlib.sha1()
+    if isinstance(X, pd.DataFrame):
+        digest.update(','.join(map(str, X.columns)).encode())
+    digest.update(np.ascontiguousarray(np.asarray(X, dtype=float)).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y, dtype=float)).tobytes())
+    return digest.hexdigest()
+
+def halving_schedule(n_candidates, min_resource, max_resource, factor=FACTOR):
+    """
+    Budget di ogni turno dei dimezzamenti successivi
+
+    Parameters:
+    -----------
+    n_candidates : int
+        Numero di configurazioni al primo turno
+    min_resource : int
+        Budget del primo turno
+    max_resource : int
+        Budget dell'ultimo turno
+    factor : int
+        Fattore di riduzione delle configurazioni e di crescita del budget
+
+    Returns:
+    --------
+    list
+        Budget crescenti, l'ultimo sempre pari a max_resource
+    """
+    # Turni necessari per ridursi a una configurazione, limitati da quanti budget distinti
+    # stanno tra min_resource e max_resource (più il turno finale a max_resource)
+    n_rounds = 1 + math.ceil(math.log(max(n_candidates, 1), factor))
+    n_rounds = min(n_rounds, 2 + math.floor(math.log(max_resource / max(min_resource, 1), factor)))
+    resources = [int(min(max_resource, min_resource * factor ** i)) for i in range(n_rounds - 1)]
+    resources = sorted(set(resources + [int(max_resource)]))
+    return resources
+
+def model_param_prefix(model):
+    """
+    Prefisso dei parametri del modello di base nella griglia della pipeline
+
+    Parameters:
+    -----------
+    model : estimator
+        Passo 'model' della pipeline
+
+    Returns:
+    --------
+    str
+        'model__estimator__' per i modelli avvolti (MultiOutputRegressor), altrimenti 'model__'
+    """
+    from sklearn.multioutput import MultiOutputRegressor
+
+    return 'model__estimator__' if isinstance(model, MultiOutputRegressor) else 'model__'
+
+def _fit_trial(pipeline, params, resource, resource_value, X, y, train_idx, test_idx, warm_start):
+    """
+    Addestra una configurazione su una piega con un budget e ne calcola l'R² di validazione
+    (eseguita in un job separato; restituisce anche il modello, da riprendere al turno dopo)
+    """
+    from sklearn.metrics import r2_score
+
+    start = time.perf_counter()
+    model = pipeline.named_steps['model']
+    wrapped = model_param_prefix(model) != 'model__'
+    if resource != 'n_samples':
+        pipeline.set_params(**{resource: resource_value})
+        X_fit, y_fit = X[train_idx], y[train_idx]
+    else:
+        # Budget in campioni: i primi resource_value campioni della piega (già permutati)
+        X_fit, y_fit = X[train_idx[:resource_value]], y[train_idx[:resource_value]]
+    if warm_start and wrapped and hasattr(model, 'estimators_'):
+        # MultiOutputRegressor.fit clonerebbe il modello di base da zero: le copie per target
+        # già addestrate vengono riprese aggiungendo solo i nuovi alberi (lo scaler, adattato
+        # allo stesso training della piega, non cambia)
+        X_scaled = pipeline.named_steps['scaler'].transform(X_fit)
+        for k, estimator in enumerate(model.estimators_):
+            estimator.set_params(**{ESTIMATOR_RESOURCE: resource_value}).fit(X_scaled, y_fit[:, k])
+    else:
+        pipeline.fit(X_fit, y_fit)
+    score = r2_score(y[test_idx], pipeline.predict(X[test_idx]))
+    # Stadi effettivamente addestrati (con l'arresto anticipato), il massimo tra i target
+    n_estimators = max(getattr(estimator, 'n_estimators_', getattr(estimator, 'n_estimators', 0))
+                       for estimator in (model.estimators_ if wrapped else [model])) or None
+    return pipeline if warm_start else None, float(score), n_estimators, time.perf_counter() - start
+
+def halving_search(pipeline, param_grid, X, y, model_name='', cv=5, factor=FACTOR, early_stopping=True,
+                   trial_log=None, n_jobs=-1, random_state=42, verbose=True):
+    """
+    Ricerca degli iperparametri a dimezzamenti successivi con cross-validation
+
+    Al primo turno tutte le configurazioni vengono valutate con il budget minimo; a ogni
+    turno sopravvive la frazione 1/factor con l'R² medio migliore e il budget cresce di
+    factor, fino a quello massimo. Se la griglia contiene n_estimators il budget è il
+    numero di alberi, e i modelli di ogni piega vengono ripresi con warm_start invece di
+    essere riaddestrati; altrimenti il budget è il numero di campioni di training.
+    Per il Gradient Boosting si può attivare l'arresto anticipato, così che il numero di
+    stadi della griglia diventi un limite massimo.
+
+    Parameters:
+    -----------
+    pipeline : Pipeline
+        Pipeline con passi 'scaler' e 'model', non addestrata
+    param_grid : dict
+        Griglia dei parametri (nomi con prefisso 'model__', o 'model__estimator__' per i modelli
+        avvolti in MultiOutputRegressor, come per GridSearchCV)
+    X : DataFrame o np.ndarray
+        Feature di training
+    y : Series o np.ndarray
+        Target di training
+    model_name : str
+        Nome del modello, salvato nel registro delle prove
+    cv : int
+        Numero di pieghe della cross-validation
+    factor : int
+        Fattore di riduzione delle configurazioni e di crescita del budget
+    early_stopping : bool
+        Se True usa l'arresto anticipato per i modelli che lo supportano (n_iter_no_change)
+    trial_log : TrialLog, optional
+        Registro delle prove, per riprendere una ricerca interrotta
+    n_jobs : int
+        Numero di job paralleli (-1 per tutti i core)
+    random_state : int
+        Seed per la permutazione dei campioni
+    verbose : bool
+        Se True stampa l'avanzamento di ogni turno
+
+    Returns:
+    --------
+    tuple
+        (best_estimator addestrato su tutto X, best_params, best_score)
+    """
+    # scikit-learn è importato qui e non all'avvio del modulo, che predict_emotions.py
+    # importa anche solo per SEARCH_MODES e TrialLog
+    from sklearn.base import clone
+    from sklearn.model_selection import KFold, ParameterGrid
+
+    if trial_log is None:
+        trial_log = TrialLog()
+    X_values = np.asarray(X, dtype=float)
+    y_values = np.asarray(y, dtype=float)
+    fingerprint = data_fingerprint(X, y)
+
+    base = clone(pipeline)
+    model = base.named_steps['model']
+    model_params = model.get_params()
+    # Con più target il modello di base può essere avvolto in un MultiOutputRegressor
+    prefix = model_param_prefix(model)
+    base_params = model.estimator.get_params() if prefix != 'model__' else model_params
+    if early_stopping and 'n_iter_no_change' in base_params:
+        base.set_params(**{prefix + 'n_iter_no_change': N_ITER_NO_CHANGE,
+                           prefix + 'validation_fraction': VALIDATION_FRACTION})
+    if 'n_jobs' in model_params:
+        # Il parallelismo è sulle coppie (configurazione, piega), non dentro il modello
+        base.set_params(model__n_jobs=1)
+
+    grid = dict(param_grid)
+    estimator_resource = prefix + ESTIMATOR_RESOURCE
+    candidates_grid = {name: values for name, values in grid.items() if name != estimator_resource}
+    candidates = list(ParameterGrid(candidates_grid))
+    if estimator_resource in grid:
+        # I valori di n_estimators della griglia sono i budget dei turni
+        resource = estimator_resource
+        schedule = sorted(set(grid[estimator_resource]))
+    else:
+        resource = 'n_samples'
+        max_resource = int(len(X_values) * (cv - 1) / cv)
+        schedule = halving_schedule(len(candidates), min(max_resource, MIN_SAMPLES), max_resource, factor)
+        if len(candidates) == 1:
+            schedule = [max_resource]
+    warm_start = resource != 'n_samples' and 'warm_start' in base_params
+
+    rng = np.random.RandomState(random_state)
+    folds = [(rng.permutation(train_idx), test_idx)
+             for train_idx, test_idx in KFold(n_splits=cv).split(X_values)]
+
+    # Modelli addestrati al turno precedente, ripresi con warm_start: (configurazione, piega) -> pipeline
+    fitted = {}
+    alive = list(range(len(candidates)))
+    # Miglior punteggio di ogni configurazione e budget con cui è stato ottenuto: con gli
+    # alberi come budget n_estimators resta un iperparametro (più stadi di boosting non
+    # sono sempre meglio), con i campioni conta solo l'ultimo turno
+    scores = {}
+    best_budget = {}
+    for round_idx, resource_value in enumerate(schedule):
+        round_start = time.perf_counter()
+        keys = {}
+        pending = []
+        for i in alive:
+            params = candidates[i]
+            key = TrialLog.make_key(model=model_name, params=params, resource=resource,
+                                    resource_value=resource_value, data=fingerprint, cv=cv,
+                                    random_state=random_state, early_stopping=early_stopping)
+            keys[i] = key
+            if trial_log.get(key) is None:
+                for fold_idx in range(cv):
+                    previous = fitted.pop((i, fold_idx), None)
+                    if previous is None:
+                        previous = clone(base).set_params(**params)
+                        if warm_start:
+                            previous.set_params(**{prefix + 'warm_start': True})
+                    pending.append((i, fold_idx, previous))
+
+        # Addestra solo le prove che non sono già nel registro
+        outcomes = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_trial)(trial_pipeline, candidates[i], resource, resource_value, X_values, y_values,
+                                folds[fold_idx][0], folds[fold_idx][1], warm_start)
+            for i, fold_idx, trial_pipeline in pending)
+
+        fold_results = {}
+        for (i, fold_idx, _), (trial_pipeline, score, n_estimators, elapsed) in zip(pending, outcomes):
+            fold_results.setdefault(i, []).append((fold_idx, score, n_estimators, elapsed))
+            if trial_pipeline is not None:
+                fitted[(i, fold_idx)] = trial_pipeline
+        for i, results in fold_results.items():
+            results.sort()
+            trial_log.record({
+                'key': keys[i], 'model': model_name, 'params': candidates[i], 'resource': resource,
+                'resource_value': int(resource_value), 'round': round_idx,
+                'fold_scores': [score for _, score, _, _ in results],
+                'mean_score': float(np.mean([score for _, score, _, _ in results])),
+                'n_estimators': [n for _, _, n, _ in results],
+                'fit_time': float(sum(elapsed for _, _, _, elapsed in results))
+            })
+        for i in alive:
+            score = trial_log.trials[keys[i]]['mean_score']
+            if resource == 'n_samples' or i not in scores or score > scores[i]:
+                scores[i] = score
+                best_budget[i] = resource_value
+
+        ranked = sorted(alive, key=lambda i: scores[i], reverse=True)
+        if verbose:
+            round_best = max(trial_log.trials[keys[i]]['mean_score'] for i in alive)
+            print(f"Turno {round_idx + 1}/{len(schedule)}: {len(alive)} configurazioni con "
+                  f"{resource.replace(prefix, '')}={resource_value}, miglior R² {round_best:.4f} "
+                  f"({len(pending) // cv} addestrate, {len(alive) - len(pending) // cv} dal registro, "
+                  f"{time.perf_counter() - round_start:.1f} s)")
+        if round_idx < len(schedule) - 1:
+            alive = ranked[:max(1, math.ceil(len(alive) / factor))]
+            # Libera la memoria dei modelli scartati
+            fitted = {k: v for k, v in fitted.items() if k[0] in alive}
+        else:
+            alive = ranked
+
+    best = alive[0]
+    best_params = dict(candidates[best])
+    if resource != 'n_samples':
+        best_params[resource] = int(best_budget[best])
+
+    # Addestramento finale sull'intero training set
+    best_estimator = clone(base).set_params(**best_params)
+    if 'n_jobs' in model_params:
+        best_estimator.set_params(model__n_jobs=model_params['n_jobs'])
+    best_estimator.fit(X, y)
+    return best_estimator, best_params, scores[best]
@@ -179,38 +179,40 @@ def analyze_dataset_distribution(annotations_df):
         print("Nessuna annotazione da analizzare")
         return None
     
-    stats = {}
+    values = annotations_df[['arousal_mean', 'valence_mean']]
+    aggregations = ['mean', 'std', 'min', 'max']
     
     # Statistiche globali
-    stats['global'] = {
-        'count': len(annotations_df),
-        'arousal_mean': annotations_df['arousal_mean'].mean(),
-        'arousal_std': annotations_df['arousal_mean'].std(),
-        'valence_mean': annotations_df['valence_mean'].mean(),
-        'valence_std': annotations_df['valence_mean'].std(),
-        'arousal_min': annotations_df['arousal_mean'].min(),
-        'arousal_max': annotations_df['arousal_mean'].max(),
-        'valence_min': annotations_df['valence_mean'].min(),
-        'valence_max': annotations_df['valence_mean'].max(),
-    }
+    global_stats = values.agg(aggregations)
+    
+    # Statistiche per dataset, con un'unica aggregazione raggruppata
+    grouped = values.groupby(annotations_df['dataset'], sort=False)
+    dataset_stats = grouped.agg(aggregations)
+    dataset_counts = grouped.size()
     
-    # Statistiche per dataset
-    for dataset in annotations_df['dataset'].unique():
-        dataset_df = annotations_df[annotations_df['dataset'] == dataset]
-        stats[dataset] = {
-            'count': len(dataset_df),
-            'arousal_mean': dataset_df['arousal_mean'].mean(),
-            'arousal_std': dataset_df['arousal_mean'].std(),
-            'valence_mean': dataset_df['valence_mean'].mean(),
-            'valence_std': dataset_df['valence_mean'].std(),
-            'arousal_min': dataset_df['arousal_mean'].min(),
-            'arousal_max': dataset_df['arousal_mean'].max(),
-            'valence_min': dataset_df['valence_mean'].min(),
-            'valence_max': dataset_df['valence_mean'].max(),
-        }
+    stats = {'global': _distribution_stats(len(annotations_df), global_stats.T.stack())}
+    for dataset in dataset_stats.index:
+        stats[dataset] = _distribution_stats(dataset_counts[dataset], dataset_stats.loc[dataset])
     
     return stats
 
+def _distribution_stats(count, values):
+    """
+    Converte una riga di statistiche aggregate (indicizzata per colonna e statistica)
+    nel dizionario usato da print_dataset_statistics
+    """
+    return {
+        'count': int(count),
+        'arousal_mean': values[('arousal_mean', 'mean')],
+        'arousal_std': values[('arousal_mean', 'std')],
+        'valence_mean': values[('valence_mean', 'mean')],
+        'valence_std': values[('valence_mean', 'std')],
+        'arousal_min': values[('arousal_mean', 'min')],
+        'arousal_max': values[('arousal_mean', 'max')],
+        'valence_min': values[('valence_mean', 'min')],
+        'valence_max': values[('valence_mean', 'max')],
+    }
+
 def print_dataset_statistics(stats):
     """
     Stampa le statistiche sulla distribuzione dei dataset
@@ -242,7 +244,43 @@ def print_dataset_statistics(stats):
             print(f"  Range Arousal: [{dataset_stats['arousal_min']:.4f}, {dataset_stats['arousal_max']:.4f}]")
             print(f"  Range Valence: [{dataset_stats['valence_min']:.4f}, {dataset_stats['valence_max']:.4f}]")
 
-def create_quadrant_distribution(annotations_df):
+# Quadranti del modello circolare delle emozioni:
+# Q1: Arousal positivo, Valence positivo (felice, eccitato)
+# Q2: Arousal positivo, Valence negativo (arrabbiato, ansioso)
+# Q3: Arousal negativo, Valence negativo (triste, depresso)
+# Q4: Arousal negativo, Valence positivo (calmo, rilassato)
+QUADRANTS = ['Q1', 'Q2', 'Q3', 'Q4']
+
+def assign_quadrants(annotations_df, arousal_threshold=0.0, valence_threshold=0.0):
+    """
+    Assegna a ogni annotazione il quadrante del modello circolare delle emozioni
+    
+    Parameters:
+    -----------
+    annotations_df : DataFrame
+        DataFrame con le colonne arousal_mean e valence_mean
+    arousal_threshold : float
+        Valore di arousal che separa i quadranti alti (>=) da quelli bassi
+    valence_threshold : float
+        Valore di valence che separa i quadranti positivi (>=) da quelli negativi
+    
+    Returns:
+    --------
+    Series
+        Colonna categorica con i quadranti Q1-Q4 (NaN se arousal o valence mancano)
+    """
+    arousal = annotations_df['arousal_mean'].to_numpy(dtype=float)
+    valence = annotations_df['valence_mean'].to_numpy(dtype=float)
+    high_arousal = arousal >= arousal_threshold
+    positive_valence = valence >= valence_threshold
+    
+    # Q1 = 0, Q2 = 1, Q3 = 2, Q4 = 3; -1 per i valori mancanti
+    codes = np.where(high_arousal, np.where(positive_valence, 0, 1), np.where(positive_valence, 3, 2))
+    codes[np.isnan(arousal) | np.isnan(valence)] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, categories=QUADRANTS), index=annotations_df.index,
+                     name='quadrant')
+
+def create_quadrant_distribution(annotations_df, arousal_threshold=0.0, valence_threshold=0.0):
     """
     Crea una distribuzione dei brani nei quattro quadranti del modello circolare delle emozioni
     
@@ -250,6 +288,10 @@ def create_quadrant_distribution(annotations_df):
     -----------
     annotations_df : DataFrame
         DataFrame con le annotazioni unificate
+    arousal_threshold : float
+        Valore di arousal che separa i quadranti alti da quelli bassi
+    valence_threshold : float
+        Valore di valence che separa i quadranti positivi da quelli negativi
     
     Returns:
     --------
@@ -260,57 +302,20 @@ def create_quadrant_distribution(annotations_df):
         print("Nessuna annotazione da analizzare")
         return None
     
-    # Definizione dei quadranti:
-    # Q1: Arousal positivo, Valence positivo (felice, eccitato)
-    # Q2: Arousal positivo, Valence negativo (arrabbiato, ansioso)
-    # Q3: Arousal negativo, Valence negativo (triste, depresso)
-    # Q4: Arousal negativo, Valence positivo (calmo, rilassato)
-    
-    quadrants = {
-        'global': {
-            'Q1': 0,  # Arousal+, Valence+
-            'Q2': 0,  # Arousal+, Valence-
-            'Q3': 0,  # Arousal-, Valence-
-            'Q4': 0,  # Arousal-, Valence+
-        }
-    }
+    quadrant_codes = assign_quadrants(annotations_df, arousal_threshold, valence_threshold).cat.codes.to_numpy()
+    dataset_codes, datasets = pd.factorize(annotations_df['dataset'])
+    
+    # Tabella di contingenza dataset x quadrante con un unico conteggio sui codici combinati
+    # (i dataset sono nell'ordine di comparsa, le annotazioni senza quadrante sono escluse)
+    valid = quadrant_codes >= 0
+    global_counts = np.bincount(quadrant_codes[valid], minlength=len(QUADRANTS))
+    valid &= dataset_codes >= 0
+    counts = np.bincount(dataset_codes[valid] * len(QUADRANTS) + quadrant_codes[valid],
+                         minlength=len(datasets) * len(QUADRANTS)).reshape(len(datasets), len(QUADRANTS))
     
-    # Conteggio globale
-    for _, row in annotations_df.iterrows():
-        arousal = row['arousal_mean']
-        valence = row['valence_mean']
-        
-        if arousal >= 0 and valence >= 0:
-            quadrants['global']['Q1'] += 1
-        elif arousal >= 0 and valence < 0:
-            quadrants['global']['Q2'] += 1
-        elif arousal < 0 and valence < 0:
-            quadrants['global']['Q3'] += 1
-        elif arousal < 0 and valence >= 0:
-            quadrants['global']['Q4'] += 1
-    
-    # Conteggio per dataset
-    for dataset in annotations_df['dataset'].unique():
-        dataset_df = annotations_df[annotations_df['dataset'] == dataset]
-        quadrants[dataset] = {
-            'Q1': 0,  # Arousal+, Valence+
-            'Q2': 0,  # Arousal+, Valence-
-            'Q3': 0,  # Arousal-, Valence-
-            'Q4': 0,  # Arousal-, Valence+
-        }
-        
-        for _, row in dataset_df.iterrows():
-            arousal = row['arousal_mean']
-            valence = row['valence_mean']
-            
-            if arousal >= 0 and valence >= 0:
-                quadrants[dataset]['Q1'] += 1
-            elif arousal >= 0 and valence < 0:
-                quadrants[dataset]['Q2'] += 1
-            elif arousal < 0 and valence < 0:
-                quadrants[dataset]['Q3'] += 1
-            elif arousal < 0 and valence >= 0:
-                quadrants[dataset]['Q4'] += 1
+    quadrants = {'global': dict(zip(QUADRANTS, global_counts.tolist()))}
+    for dataset, row in zip(datasets, counts):
+        quadrants[dataset] = dict(zip(QUADRANTS, row.tolist()))
     
     return quadrants
 
@@ -354,6 +359,10 @@ def main():
     parser = argparse.ArgumentParser(description='Integra dataset emozionali per l\'analisi musicale')
     parser.add_argument('--metadata-dir', type=str, help='Directory contenente i file di metadati')
     parser.add_argument('--output-dir', type=str, help='Directory per i file di output')
+    parser.add_argument('--arousal-threshold', type=float, default=0.0,
+                        help='Valore di arousal che separa i quadranti alti da quelli bassi (default: 0)')
+    parser.add_argument('--valence-threshold', type=float, default=0.0,
+                        help='Valore di valence che separa i quadranti positivi da quelli negativi (default: 0)')
     args = parser.parse_args()
     
     # Ottieni i percorsi del progetto
@@ -402,7 +411,7 @@ def main():
     print_dataset_statistics(stats)
     
     # Crea e stampa la distribuzione nei quadranti
-    quadrants = create_quadrant_distribution(all_annotations)
+    quadrants = create_quadrant_distribution(all_annotations, args.arousal_threshold, args.valence_threshold)
     print_quadrant_distribution(quadrants)
     
     # Salva i dati unificati
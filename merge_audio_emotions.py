@@ -3,6 +3,8 @@ import os
 import argparse
 from pathlib import Path
 
+from feature_store import get_store_paths, is_feature_store, load_feature_table
+
 def get_project_paths(custom_audio_features_path=None, custom_annotations_dir=None, custom_output_dir=None):
     """
     Definisce i percorsi del progetto in modo dinamico.
@@ -10,7 +12,7 @@ def get_project_paths(custom_audio_features_path=None, custom_annotations_dir=No
     Parameters:
     -----------
     custom_audio_features_path : str, optional
-        Percorso personalizzato al file delle caratteristiche audio
+        Percorso personalizzato al file CSV o al dataset del feature store delle caratteristiche audio
     custom_annotations_dir : str, optional
         Percorso personalizzato alla directory delle annotazioni
     custom_output_dir : str, optional
@@ -24,9 +26,11 @@ def get_project_paths(custom_audio_features_path=None, custom_annotations_dir=No
     # Directory del progetto (directory principale)
     base_dir = Path(os.path.dirname(os.path.abspath(__file__)))
     
-    # File delle caratteristiche audio
+    # Caratteristiche audio: feature store se presente, altrimenti il file CSV storico
     if custom_audio_features_path:
         audio_features_path = Path(custom_audio_features_path)
+    elif is_feature_store(get_store_paths(base_dir)['deam_complete']):
+        audio_features_path = get_store_paths(base_dir)['deam_complete']
     else:
         audio_features_path = base_dir / 'audio_tonality_features_complete_20250404_133542.csv'
     
@@ -58,7 +62,8 @@ def get_project_paths(custom_audio_features_path=None, custom_annotations_dir=No
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Merge audio features with emotion annotations')
-    parser.add_argument('--audio-features', type=str, help='Path to the audio features CSV file')
+    parser.add_argument('--audio-features', type=str, help='Path to the audio features CSV file or feature store dataset')
+    parser.add_argument('--columns', type=str, help='Comma-separated audio feature columns to read (default: all)')
     parser.add_argument('--annotations-dir', type=str, help='Directory containing the annotations files')
     parser.add_argument('--output-dir', type=str, help='Directory for output files')
     args = parser.parse_args()
@@ -79,8 +84,11 @@ def main():
         print(f"File delle annotazioni non trovato: {paths['annotations_path']}")
         return
     
-    # Load the audio features CSV
-    audio_features = pd.read_csv(paths['audio_features_path'])
+    # Load the audio features (CSV or feature store), reading only the requested columns
+    columns = None
+    if args.columns:
+        columns = ['track_id'] + [c.strip() for c in args.columns.split(',') if c.strip() != 'track_id']
+    audio_features = load_feature_table(paths['audio_features_path'], columns=columns)
     
     # Load the annotations CSV with arousal and valence values
     annotations = pd.read_csv(paths['annotations_path'], skipinitialspace=True)
@@ -102,7 +110,8 @@ def main():
     
     # Display the first few rows of the merged dataframe
     print('\nFirst few rows of the merged dataframe:')
-    print(merged_df[['track_id', 'key', 'mode', 'arousal_mean', 'valence_mean']].head())
+    preview_cols = [c for c in ['track_id', 'key', 'mode', 'arousal_mean', 'valence_mean'] if c in merged_df.columns]
+    print(merged_df[preview_cols].head())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
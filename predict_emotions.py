@@ -1,30 +1,41 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression, Ridge, Lasso
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.svm import SVR
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-from sklearn.pipeline import Pipeline
 import joblib
+from joblib import Parallel, delayed
+import importlib
 import os
+import time
+import argparse
+
+from feature_store import load_feature_table
+from hyperparameter_search import SEARCH_MODES, TrialLog, halving_search
+from feature_schema import FEATURE_SCHEMA_FILE, ONE_HOT_COLUMNS, FeatureSchema
 
 # Impostazioni di visualizzazione
 pd.set_option('display.max_columns', None)
-sns.set_theme(style='whitegrid')
+
+# scikit-learn, matplotlib e seaborn sono importati solo nelle funzioni che li usano:
+# l'avvio dello script (e di ogni processo di joblib, che importa questo modulo per
+# eseguire i job) non paga i grafici, e --no-plot non li carica mai
+
+def _pyplot():
+    """Importa matplotlib e seaborn al primo grafico, con il tema dei grafici del progetto"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_theme(style='whitegrid')
+    return plt, sns
 
 # Funzione per caricare i dati
-def load_data(file_path):
+def load_data(file_path, columns=None):
     """
     Carica il dataset con le caratteristiche audio e le annotazioni emozionali
     
     Parameters:
     -----------
     file_path : str
-        Percorso al file CSV con i dati
+        Percorso al file CSV o al dataset del feature store con i dati
+    columns : list, optional
+        Colonne da leggere (None per tutte)
         
     Returns:
     --------
@@ -32,12 +43,43 @@ def load_data(file_path):
         DataFrame con i dati caricati
     """
     print(f"Caricamento dei dati da {file_path}...")
-    df = pd.read_csv(file_path)
+    df = load_feature_table(file_path, columns=columns)
     print(f"Dati caricati con successo. Forma: {df.shape}")
     return df
 
+# Colonne escluse dalle feature: identificativo, target e descrizioni testuali della tonalità
+EXCLUDE_COLS = ['track_id', 'arousal_mean', 'arousal_std', 'valence_mean', 'valence_std',
+                'Predominant Key', 'key_full', 'scale_pitches', 'extraction_profile']
+
+def build_feature_schema(df, target_cols=()):
+    """
+    Ricava lo schema delle feature dalla tabella di addestramento
+    
+    Le colonne numeriche mantengono l'ordine della tabella e sono seguite dalle colonne
+    one-hot di key, mode e scale_name, con le categorie nell'ordine di pd.get_dummies
+    e senza la prima (drop_first).
+    
+    Parameters:
+    -----------
+    df : DataFrame
+        DataFrame con i dati
+    target_cols : iterable
+        Colonne target da escludere, oltre a EXCLUDE_COLS
+        
+    Returns:
+    --------
+    FeatureSchema
+        Schema con l'ordine delle colonne e i vocabolari delle colonne categoriche
+    """
+    exclude = set(EXCLUDE_COLS) | set(target_cols)
+    categorical = [col for col in ONE_HOT_COLUMNS if col in df.columns]
+    numeric = [col for col in df.columns if col not in exclude and col not in categorical]
+    categories = {col: [str(value) for value in pd.get_dummies(df[col]).columns[1:]] for col in categorical}
+    columns = numeric + [f'{col}_{value}' for col in categorical for value in categories[col]]
+    return FeatureSchema(columns, categories)
+
 # Funzione per preparare i dati per il modello
-def prepare_data(df, target_col, test_size=0.2, random_state=42):
+def prepare_data(df, target_col, test_size=0.2, random_state=42, schema=None):
     """
     Prepara i dati per il modello, dividendo in features e target e in train e test set
     
@@ -45,12 +87,16 @@ def prepare_data(df, target_col, test_size=0.2, random_state=42):
     -----------
     df : DataFrame
         DataFrame con i dati
-    target_col : str
-        Nome della colonna target (arousal_mean o valence_mean)
+    target_col : str o list
+        Nome della colonna target (arousal_mean o valence_mean), oppure lista di colonne
+        target per un modello multi-output (y diventa un DataFrame con una colonna per target)
     test_size : float
         Proporzione del dataset da includere nel test split
     random_state : int
         Seed per la riproducibilità
+    schema : FeatureSchema, optional
+        Schema con cui codificare le feature (None per ricavarlo dai dati, vedi
+        build_feature_schema); è lo stesso encoder usato in predizione
         
     Returns:
     --------
@@ -58,8 +104,10 @@ def prepare_data(df, target_col, test_size=0.2, random_state=42):
         (X_train, X_test, y_train, y_test, feature_names)
     """
     # Verifica se le colonne emozionali sono presenti
-    if target_col not in df.columns:
-        raise ValueError(f"La colonna {target_col} non è presente nel dataset")
+    target_cols = [target_col] if isinstance(target_col, str) else list(target_col)
+    for col in target_cols:
+        if col not in df.columns:
+            raise ValueError(f"La colonna {col} non è presente nel dataset")
     
     # Crea una copia del dataframe per evitare warning di SettingWithCopyWarning
     df = df.copy()
@@ -84,39 +132,29 @@ def prepare_data(df, target_col, test_size=0.2, random_state=42):
                 print(f"Imputazione dei valori mancanti nella colonna {col} con il valore più frequente")
                 df[col] = df[col].fillna(df[col].mode()[0])
     
-    # Seleziona le feature numeriche rilevanti basate sull'analisi delle correlazioni
-    # Escludiamo track_id e le colonne target
-    exclude_cols = ['track_id', 'arousal_mean', 'arousal_std', 'valence_mean', 'valence_std', 
-                    'Predominant Key', 'key_full', 'scale_pitches']
-    
-    # Crea una lista di colonne da utilizzare come features
-    feature_cols = [col for col in df.columns if col not in exclude_cols]
-    
-    # Gestione delle colonne categoriche
-    categorical_cols = ['key', 'mode', 'scale_name']
-    for col in categorical_cols:
-        if col in df.columns:
-            # One-hot encoding per le colonne categoriche
-            df = pd.get_dummies(df, columns=[col], drop_first=True)
-    
-    # Aggiorna le feature dopo l'encoding
-    feature_cols = [col for col in df.columns if col not in exclude_cols and col != target_col]
+    # Seleziona le feature (escludendo track_id, le colonne target e le descrizioni testuali)
+    # e codifica one-hot le colonne categoriche con lo schema delle feature
+    if schema is None:
+        schema = build_feature_schema(df, target_cols)
+    feature_cols = schema.columns
     
     # Prepara X e y
-    X = df[feature_cols]
+    X = pd.DataFrame(schema.encode_frame(df), columns=feature_cols, index=df.index)
     y = df[target_col]
     
     # Verifica finale per NaN dopo la preparazione
-    if X.isnull().any().any() or y.isnull().any():
+    y_missing = y.isnull() if y.ndim == 1 else y.isnull().any(axis=1)
+    if X.isnull().any().any() or y_missing.any():
         print("\nATTENZIONE: Ci sono ancora valori NaN dopo la preparazione dei dati.")
         # Rimuovi le righe con valori NaN
         print("Rimozione delle righe con valori NaN...")
-        mask = ~(X.isnull().any(axis=1) | y.isnull())
+        mask = ~(X.isnull().any(axis=1) | y_missing)
         X = X.loc[mask]
         y = y.loc[mask]
         print(f"Dati dopo la rimozione dei NaN: {X.shape[0]} campioni")
     
     # Dividi in train e test set
+    from sklearn.model_selection import train_test_split
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
     
     print(f"Dati preparati: {X_train.shape[0]} campioni di training, {X_test.shape[0]} campioni di test")
@@ -124,8 +162,191 @@ def prepare_data(df, target_col, test_size=0.2, random_state=42):
     
     return X_train, X_test, y_train, y_test, feature_cols
 
+# Modelli confrontati, in ordine di presentazione dei risultati
+MODEL_NAMES = ['Linear Regression', 'Ridge Regression', 'Lasso Regression',
+               'Random Forest', 'Gradient Boosting', 'SVR']
+
+# Classe di ogni modello (modulo, nome), importata solo quando il modello viene creato
+MODEL_CLASSES = {
+    'Linear Regression': ('sklearn.linear_model', 'LinearRegression'),
+    'Ridge Regression': ('sklearn.linear_model', 'Ridge'),
+    'Lasso Regression': ('sklearn.linear_model', 'Lasso'),
+    'Random Forest': ('sklearn.ensemble', 'RandomForestRegressor'),
+    'Gradient Boosting': ('sklearn.ensemble', 'GradientBoostingRegressor'),
+    'SVR': ('sklearn.svm', 'SVR')
+}
+
+# Modelli che stimano nativamente più target con un solo fit
+NATIVE_MULTI_OUTPUT = {'Linear Regression', 'Ridge Regression', 'Lasso Regression', 'Random Forest'}
+
+# Target della modalità congiunta, nell'ordine delle colonne predette dal modello unico
+JOINT_TARGETS = ['arousal', 'valence']
+
+# Ordine di avvio dei job: i modelli più lenti da addestrare partono per primi, così che
+# il confronto non termini in attesa di un unico job lungo avviato per ultimo
+LAUNCH_ORDER = ['Random Forest', 'Gradient Boosting', 'SVR',
+                'Lasso Regression', 'Ridge Regression', 'Linear Regression']
+
+def make_estimator(name, **params):
+    """
+    Crea un modello non addestrato, importandone il modulo di scikit-learn solo ora
+
+    Parameters:
+    -----------
+    name : str
+        Nome del modello, uno di MODEL_NAMES
+    **params
+        Parametri del costruttore (es. random_state)
+
+    Returns:
+    --------
+    estimator
+        Modello non addestrato
+    """
+    module, class_name = MODEL_CLASSES[name]
+    return getattr(importlib.import_module(module), class_name)(**params)
+
+def make_multi_output(name, model):
+    """
+    Adatta un modello alla predizione congiunta di più target
+
+    I modelli lineari e Random Forest stimano nativamente più target con un solo fit
+    (Random Forest costruisce alberi condivisi); gli altri vengono avvolti in un
+    MultiOutputRegressor, che addestra una copia del modello per target.
+
+    Parameters:
+    -----------
+    name : str
+        Nome del modello, uno di MODEL_NAMES
+    model : estimator
+        Modello non addestrato
+
+    Returns:
+    --------
+    estimator
+        Modello che accetta un target bidimensionale
+    """
+    if name in NATIVE_MULTI_OUTPUT:
+        return model
+    from sklearn.multioutput import MultiOutputRegressor
+    return MultiOutputRegressor(model)
+
+def build_models(n_jobs=1, multi_output=False):
+    """
+    Crea i modelli di regressione da confrontare, non ancora addestrati
+
+    Parameters:
+    -----------
+    n_jobs : int
+        Numero di thread usati da Random Forest (-1 per tutti i core)
+    multi_output : bool
+        Se True i modelli predicono congiuntamente più target (vedi make_multi_output)
+
+    Returns:
+    --------
+    dict
+        Dizionario nome del modello -> stimatore, nell'ordine di MODEL_NAMES
+    """
+    params = {
+        'Random Forest': {'random_state': 42, 'n_jobs': n_jobs},
+        'Gradient Boosting': {'random_state': 42}
+    }
+    models = {name: make_estimator(name, **params.get(name, {})) for name in MODEL_NAMES}
+    if multi_output:
+        models = {name: make_multi_output(name, model) for name, model in models.items()}
+    return models
+
+def _fit_and_score(target_name, name, model, X_train_scaled, X_test_scaled, y_train, y_test):
+    """
+    Addestra un modello su un target e ne calcola le metriche (eseguita in un job separato)
+    """
+    from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+    
+    start = time.perf_counter()
+    model.fit(X_train_scaled, y_train)
+    train_r2 = model.score(X_train_scaled, y_train)
+    y_pred = model.predict(X_test_scaled)
+    return target_name, name, {
+        'model': model,
+        'train_r2': train_r2,
+        'test_r2': r2_score(y_test, y_pred),
+        'test_rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
+        'test_mae': mean_absolute_error(y_test, y_pred),
+        'fit_time': time.perf_counter() - start
+    }
+
+def _print_results_header():
+    print("-" * 100)
+    print(f"{'Target':<10} {'Modello':<20} {'R² (Train)':<12} {'R² (Test)':<12} {'RMSE (Test)':<12} "
+          f"{'MAE (Test)':<12} {'Tempo (s)':<10} {'Job':<8}")
+    print("-" * 100)
+
+def evaluate_models(datasets, n_jobs=-1):
+    """
+    Addestra e valuta tutti i modelli su tutti i target come un unico insieme di job paralleli
+
+    Ogni coppia (target, modello) è un job indipendente: i job vengono distribuiti sui
+    processi di joblib e la tabella dei risultati viene aggiornata, una riga alla volta,
+    man mano che i job terminano. Random Forest usa a sua volta più thread (n_jobs).
+    Lo scaler di ogni target viene adattato una sola volta, prima di avviare i job.
+
+    Parameters:
+    -----------
+    datasets : dict
+        Dizionario nome del target -> (X_train, X_test, y_train, y_test); se y è
+        bidimensionale i modelli predicono congiuntamente tutti i target (le metriche
+        sono la media sui target)
+    n_jobs : int
+        Numero di job contemporanei e di thread di Random Forest (-1 per tutti i core)
+
+    Returns:
+    --------
+    dict
+        Dizionario nome del target -> risultati, come restituiti da train_and_evaluate_models
+    """
+    from sklearn.preprocessing import StandardScaler
+    
+    scalers = {}
+    tasks = []
+    for target_name, (X_train, X_test, y_train, y_test) in datasets.items():
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        scalers[target_name] = scaler
+        models = build_models(n_jobs, multi_output=np.ndim(y_train) > 1)
+        for name in LAUNCH_ORDER:
+            tasks.append((target_name, name, models[name], X_train_scaled, X_test_scaled, y_train, y_test))
+
+    print(f"\nValutazione di {len(MODEL_NAMES)} modelli per {len(datasets)} target "
+          f"({len(tasks)} job, n_jobs={n_jobs}):")
+    _print_results_header()
+
+    # Risultati stampati nell'ordine di completamento dei job
+    collected = {target_name: {} for target_name in datasets}
+    jobs = (delayed(_fit_and_score)(*task) for task in tasks)
+    for done, (target_name, name, result) in enumerate(
+            Parallel(n_jobs=n_jobs, return_as='generator_unordered')(jobs), 1):
+        result['scaler'] = scalers[target_name]
+        collected[target_name][name] = result
+        print(f"{target_name:<10} {name:<20} {result['train_r2']:<12.4f} {result['test_r2']:<12.4f} "
+              f"{result['test_rmse']:<12.4f} {result['test_mae']:<12.4f} {result['fit_time']:<10.2f} "
+              f"{done}/{len(tasks)}", flush=True)
+
+    # Riepilogo finale per target, nell'ordine consueto dei modelli
+    all_results = {}
+    for target_name, results in collected.items():
+        all_results[target_name] = {name: results[name] for name in MODEL_NAMES}
+        print(f"\nRisultati per {target_name}:")
+        print("-" * 80)
+        print(f"{'Modello':<20} {'R² (Train)':<12} {'R² (Test)':<12} {'RMSE (Test)':<12} {'MAE (Test)':<12}")
+        print("-" * 80)
+        for name, result in all_results[target_name].items():
+            print(f"{name:<20} {result['train_r2']:<12.4f} {result['test_r2']:<12.4f} "
+                  f"{result['test_rmse']:<12.4f} {result['test_mae']:<12.4f}")
+    return all_results
+
 # Funzione per addestrare e valutare diversi modelli
-def train_and_evaluate_models(X_train, X_test, y_train, y_test, target_name):
+def train_and_evaluate_models(X_train, X_test, y_train, y_test, target_name, n_jobs=-1):
     """
     Addestra e valuta diversi modelli di regressione
     
@@ -137,106 +358,69 @@ def train_and_evaluate_models(X_train, X_test, y_train, y_test, target_name):
         Target di training e test
     target_name : str
         Nome del target (arousal o valence)
+    n_jobs : int
+        Numero di job contemporanei e di thread di Random Forest (-1 per tutti i core)
         
     Returns:
     --------
     dict
         Dizionario con i modelli addestrati e le loro performance
     """
-    # Definisci i modelli da testare
-    models = {
-        'Linear Regression': LinearRegression(),
-        'Ridge Regression': Ridge(),
-        'Lasso Regression': Lasso(),
-        'Random Forest': RandomForestRegressor(random_state=42),
-        'Gradient Boosting': GradientBoostingRegressor(random_state=42),
-        'SVR': SVR()
-    }
-    
-    # Crea un dizionario per memorizzare i risultati
-    results = {}
-    
-    # Standardizza i dati
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
-    print(f"\nValutazione dei modelli per la predizione di {target_name}:")
-    print("-" * 80)
-    print(f"{'Modello':<20} {'R² (Train)':<12} {'R² (Test)':<12} {'RMSE (Test)':<12} {'MAE (Test)':<12}")
-    print("-" * 80)
-    
-    # Addestra e valuta ogni modello
-    for name, model in models.items():
-        # Addestra il modello
-        model.fit(X_train_scaled, y_train)
-        
-        # Valuta sul training set
-        train_r2 = model.score(X_train_scaled, y_train)
-        
-        # Valuta sul test set
-        y_pred = model.predict(X_test_scaled)
-        test_r2 = r2_score(y_test, y_pred)
-        test_rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        test_mae = mean_absolute_error(y_test, y_pred)
-        
-        # Stampa i risultati
-        print(f"{name:<20} {train_r2:<12.4f} {test_r2:<12.4f} {test_rmse:<12.4f} {test_mae:<12.4f}")
-        
-        # Memorizza il modello e le sue performance
-        results[name] = {
-            'model': model,
-            'scaler': scaler,
-            'train_r2': train_r2,
-            'test_r2': test_r2,
-            'test_rmse': test_rmse,
-            'test_mae': test_mae
-        }
-    
-    return results
+    return evaluate_models({target_name: (X_train, X_test, y_train, y_test)}, n_jobs)[target_name]
 
 # Funzione per ottimizzare il miglior modello
-def optimize_best_model(X_train, y_train, best_model_name, target_name):
+def optimize_best_model(X_train, y_train, best_model_name, target_name, search='grid', trial_log=None, n_jobs=-1):
     """
-    Ottimizza gli iperparametri del miglior modello usando GridSearchCV
+    Ottimizza gli iperparametri del miglior modello usando GridSearchCV o dimezzamenti successivi
     
     Parameters:
     -----------
     X_train : DataFrame
         Feature di training
-    y_train : Series
-        Target di training
+    y_train : Series o DataFrame
+        Target di training (DataFrame con una colonna per target nella modalità congiunta)
     best_model_name : str
         Nome del miglior modello
     target_name : str
-        Nome del target (arousal o valence)
+        Nome del target (arousal, valence o joint)
+    search : str
+        Modo di ricerca, uno di hyperparameter_search.SEARCH_MODES ('grid' per GridSearchCV
+        esaustiva, 'halving' per dimezzamenti successivi con warm start e arresto anticipato)
+    trial_log : TrialLog, optional
+        Registro persistente delle prove, per riprendere una ricerca 'halving' interrotta
+    n_jobs : int
+        Numero di job paralleli della ricerca (-1 per tutti i core)
         
     Returns:
     --------
     tuple
         (best_model, best_params, best_score)
     """
+    from sklearn.model_selection import GridSearchCV
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    
     print(f"\nOttimizzazione del modello {best_model_name} per {target_name}...")
     
     # Definisci i parametri di ricerca in base al modello
     if best_model_name == 'Linear Regression':
-        model = LinearRegression()
+        model = make_estimator(best_model_name)
         param_grid = {}
     
     elif best_model_name == 'Ridge Regression':
-        model = Ridge()
+        model = make_estimator(best_model_name)
         param_grid = {
             'model__alpha': [0.01, 0.1, 1.0, 10.0, 100.0]
         }
     
     elif best_model_name == 'Lasso Regression':
-        model = Lasso()
+        model = make_estimator(best_model_name)
         param_grid = {
             'model__alpha': [0.001, 0.01, 0.1, 1.0, 10.0]
         }
     
     elif best_model_name == 'Random Forest':
-        model = RandomForestRegressor(random_state=42)
+        model = make_estimator(best_model_name, random_state=42)
         param_grid = {
             'model__n_estimators': [50, 100, 200],
             'model__max_depth': [None, 10, 20, 30],
@@ -244,7 +428,7 @@ def optimize_best_model(X_train, y_train, best_model_name, target_name):
         }
     
     elif best_model_name == 'Gradient Boosting':
-        model = GradientBoostingRegressor(random_state=42)
+        model = make_estimator(best_model_name, random_state=42)
         param_grid = {
             'model__n_estimators': [50, 100, 200],
             'model__learning_rate': [0.01, 0.1, 0.2],
@@ -252,26 +436,40 @@ def optimize_best_model(X_train, y_train, best_model_name, target_name):
         }
     
     elif best_model_name == 'SVR':
-        model = SVR()
+        model = make_estimator(best_model_name)
         param_grid = {
             'model__C': [0.1, 1, 10, 100],
             'model__gamma': ['scale', 'auto', 0.1, 0.01],
             'model__kernel': ['linear', 'rbf']
         }
     
+    # Con più target i modelli senza supporto nativo vengono avvolti in MultiOutputRegressor,
+    # i cui parametri hanno il prefisso 'estimator__'
+    if np.ndim(y_train) > 1 and best_model_name not in NATIVE_MULTI_OUTPUT:
+        model = make_multi_output(best_model_name, model)
+        param_grid = {name.replace('model__', 'model__estimator__', 1): values for name, values in param_grid.items()}
+    
     # Crea una pipeline con scaling e modello
     pipeline = Pipeline([
         ('scaler', StandardScaler()),
         ('model', model)
     ])
     
+    if search == 'halving':
+        best_model, best_params, best_score = halving_search(
+            pipeline, param_grid, X_train, y_train, model_name=f'{target_name}:{best_model_name}',
+            cv=5, trial_log=trial_log, n_jobs=n_jobs)
+        print(f"Migliori parametri: {best_params}")
+        print(f"Miglior punteggio R²: {best_score:.4f}")
+        return best_model, best_params, best_score
+    
     # Esegui la ricerca degli iperparametri
     grid_search = GridSearchCV(
         pipeline, 
         param_grid=param_grid if param_grid else {}, 
         cv=5, 
         scoring='r2',
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     
     grid_search.fit(X_train, y_train)
@@ -282,7 +480,7 @@ def optimize_best_model(X_train, y_train, best_model_name, target_name):
     return grid_search.best_estimator_, grid_search.best_params_, grid_search.best_score_
 
 # Funzione per analizzare l'importanza delle feature
-def analyze_feature_importance(model, feature_names, target_name):
+def analyze_feature_importance(model, feature_names, target_name, plot=True):
     """
     Analizza e visualizza l'importanza delle feature per il modello
     
@@ -294,6 +492,8 @@ def analyze_feature_importance(model, feature_names, target_name):
         Nomi delle feature
     target_name : str
         Nome del target (arousal o valence)
+    plot : bool
+        Se False stampa solo la tabella, senza disegnare né salvare il grafico
     """
     # Estrai il modello dalla pipeline se necessario
     if hasattr(model, 'named_steps') and 'model' in model.named_steps:
@@ -312,12 +512,14 @@ def analyze_feature_importance(model, feature_names, target_name):
         })
         
         # Visualizza le feature più importanti
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x='Importance', y='Feature', data=importance_df.head(15))
-        plt.title(f'Feature più importanti per la predizione di {target_name}')
-        plt.tight_layout()
-        plt.savefig(f'feature_importance_{target_name}.png')
-        plt.show()
+        if plot:
+            plt, sns = _pyplot()
+            plt.figure(figsize=(10, 6))
+            sns.barplot(x='Importance', y='Feature', data=importance_df.head(15))
+            plt.title(f'Feature più importanti per la predizione di {target_name}')
+            plt.tight_layout()
+            plt.savefig(f'feature_importance_{target_name}.png')
+            plt.show()
         
         print(f"\nFeature più importanti per {target_name}:")
         print(importance_df.head(10).to_string(index=False))
@@ -337,14 +539,16 @@ def analyze_feature_importance(model, feature_names, target_name):
         coef_df = coef_df.sort_values('Abs_Coefficient', ascending=False)
         
         # Visualizza i coefficienti più importanti
-        plt.figure(figsize=(10, 6))
-        colors = ['red' if c < 0 else 'blue' for c in coef_df.head(15)['Coefficient']]
-        sns.barplot(x='Coefficient', y='Feature', data=coef_df.head(15), palette=colors)
-        plt.title(f'Coefficienti più importanti per la predizione di {target_name}')
-        plt.axvline(x=0, color='black', linestyle='-', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig(f'coefficients_{target_name}.png')
-        plt.show()
+        if plot:
+            plt, sns = _pyplot()
+            plt.figure(figsize=(10, 6))
+            colors = ['red' if c < 0 else 'blue' for c in coef_df.head(15)['Coefficient']]
+            sns.barplot(x='Coefficient', y='Feature', data=coef_df.head(15), palette=colors)
+            plt.title(f'Coefficienti più importanti per la predizione di {target_name}')
+            plt.axvline(x=0, color='black', linestyle='-', alpha=0.3)
+            plt.tight_layout()
+            plt.savefig(f'coefficients_{target_name}.png')
+            plt.show()
         
         print(f"\nCoefficienti più importanti per {target_name}:")
         print(coef_df[['Feature', 'Coefficient']].head(10).to_string(index=False))
@@ -352,9 +556,9 @@ def analyze_feature_importance(model, feature_names, target_name):
         print("Il modello non supporta l'analisi dell'importanza delle feature.")
 
 # Funzione per salvare il modello
-def save_model(model, scaler, feature_names, target_name, output_dir='models'):
+def save_model(model, scaler, feature_names, target_name, output_dir='models', schema=None):
     """
-    Salva il modello, lo scaler e i nomi delle feature
+    Salva il modello, lo scaler, i nomi delle feature e lo schema delle feature
     
     Parameters:
     -----------
@@ -368,6 +572,9 @@ def save_model(model, scaler, feature_names, target_name, output_dir='models'):
         Nome del target (arousal o valence)
     output_dir : str
         Directory di output
+    schema : FeatureSchema, optional
+        Schema delle feature (ordine delle colonne e vocabolari), salvato in
+        FEATURE_SCHEMA_FILE e usato in predizione per codificare le feature
     """
     # Crea la directory se non esiste
     if not os.path.exists(output_dir):
@@ -385,14 +592,111 @@ def save_model(model, scaler, feature_names, target_name, output_dir='models'):
     feature_path = os.path.join(output_dir, f'{target_name}_features.pkl')
     joblib.dump(feature_names, feature_path)
     
+    # Salva lo schema delle feature
+    if schema is not None:
+        schema.save(os.path.join(output_dir, FEATURE_SCHEMA_FILE))
+    
     print(f"\nModello per {target_name} salvato in {model_path}")
 
+# Nome dell'artefatto della modalità congiunta
+JOINT_MODEL_FILE = 'emotion_model.pkl'
+
+def save_joint_model(model, feature_names, output_dir='models', targets=JOINT_TARGETS, schema=None):
+    """
+    Salva il modello congiunto di arousal e valence come unico artefatto
+    
+    L'artefatto contiene la pipeline (scaler e modello multi-output), l'ordine delle
+    feature e quello dei target predetti: una sola chiamata a predict restituisce
+    entrambe le dimensioni, sempre con la stessa matrice di feature.
+    
+    Parameters:
+    -----------
+    model : Pipeline
+        Pipeline addestrata con passi 'scaler' e 'model'
+    feature_names : list
+        Nomi delle feature, nell'ordine delle colonne di addestramento
+    output_dir : str
+        Directory di output
+    targets : list
+        Nomi dei target, nell'ordine delle colonne predette
+    schema : FeatureSchema, optional
+        Schema delle feature, salvato in FEATURE_SCHEMA_FILE
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    model_path = os.path.join(output_dir, JOINT_MODEL_FILE)
+    joblib.dump({'model': model, 'features': list(feature_names), 'targets': list(targets)}, model_path)
+    if schema is not None:
+        schema.save(os.path.join(output_dir, FEATURE_SCHEMA_FILE))
+    print(f"\nModello congiunto per {' e '.join(targets)} salvato in {model_path}")
+
+def train_joint_model(df, results_dir, n_jobs=-1, search='grid', trial_log=None, plot=True):
+    """
+    Addestra, ottimizza e salva un unico modello multi-output per arousal e valence
+    
+    I due target condividono la stessa preparazione dei dati, lo stesso scaler e la
+    stessa matrice di feature; il confronto tra modelli e la ricerca degli iperparametri
+    usano l'R² medio sui due target.
+    
+    Parameters:
+    -----------
+    df : DataFrame
+        DataFrame con i dati
+    results_dir : str
+        Directory dei risultati e del modello salvato
+    n_jobs : int
+        Numero di job paralleli (-1 per tutti i core)
+    search : str
+        Modo di ricerca degli iperparametri, vedi optimize_best_model
+    trial_log : TrialLog, optional
+        Registro persistente delle prove della ricerca 'halving'
+    plot : bool
+        Se False non disegna i grafici delle previsioni
+        
+    Returns:
+    --------
+    tuple
+        (best_model_name, dizionario target -> R² del modello ottimizzato sul test set)
+    """
+    print("\n" + "=" * 80)
+    print("PREDIZIONE CONGIUNTA DI AROUSAL E VALENCE")
+    print("=" * 80)
+    
+    target_cols = [f'{target}_mean' for target in JOINT_TARGETS]
+    schema = build_feature_schema(df, target_cols)
+    X_train, X_test, Y_train, Y_test, feature_names = prepare_data(df, target_cols, schema=schema)
+    
+    results = evaluate_models({'joint': (X_train, X_test, Y_train, Y_test)}, n_jobs=n_jobs)['joint']
+    best_model_name = max(results.items(), key=lambda x: x[1]['test_r2'])[0]
+    print(f"\nMiglior modello congiunto: {best_model_name} (R² medio = {results[best_model_name]['test_r2']:.4f})")
+    
+    best_model, best_params, best_score = optimize_best_model(
+        X_train, Y_train, best_model_name, 'joint', search=search, trial_log=trial_log, n_jobs=n_jobs)
+    
+    # Valuta il modello ottimizzato sul test set, target per target
+    from sklearn.metrics import mean_squared_error, r2_score
+    Y_pred = best_model.predict(X_test)
+    test_r2 = {}
+    print(f"\nPerformance del modello congiunto ottimizzato sul test set:")
+    for i, target in enumerate(JOINT_TARGETS):
+        test_r2[target] = r2_score(Y_test.iloc[:, i], Y_pred[:, i])
+        rmse = np.sqrt(mean_squared_error(Y_test.iloc[:, i], Y_pred[:, i]))
+        print(f"{target}: R² {test_r2[target]:.4f}, RMSE {rmse:.4f}")
+        if plot:
+            plot_predictions(Y_test.iloc[:, i], Y_pred[:, i], target, results_dir)
+    
+    save_joint_model(best_model, feature_names, results_dir, schema=schema)
+    return best_model_name, test_r2
+
 # Funzione per visualizzare le previsioni
 
 def plot_predictions(y_true, y_pred, target_name, results_dir):
     """
     Visualizza un scatter plot delle previsioni vs valori reali
     """
+    from sklearn.metrics import mean_squared_error, r2_score
+    plt, _ = _pyplot()
     plt.figure(figsize=(10, 6))
     plt.scatter(y_true, y_pred, alpha=0.5)
     min_val = min(min(y_true), min(y_pred))
@@ -417,6 +721,8 @@ def plot_all_model_predictions(X_train, X_test, y_train, y_test, best_model, rf_
     """
     Visualizza i grafici di previsione per il modello ottimizzato e Random Forest
     """
+    from sklearn.metrics import mean_squared_error, r2_score
+    plt, _ = _pyplot()
     fig, axes = plt.subplots(1, 2, figsize=(15, 5))
     
     # Plot per il modello ottimizzato
@@ -456,6 +762,24 @@ def plot_all_model_predictions(X_train, X_test, y_train, y_test, best_model, rf_
 
 # Funzione principale
 def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Addestra i modelli di predizione di arousal e valence')
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='Job paralleli del confronto tra modelli e thread di Random Forest (default: -1, tutti i core)')
+    parser.add_argument('--search', type=str, default='grid', choices=SEARCH_MODES,
+                        help='Ricerca degli iperparametri: grid (GridSearchCV esaustiva) o halving '
+                             '(dimezzamenti successivi con warm start e arresto anticipato)')
+    parser.add_argument('--trial-log', type=str,
+                        help='File JSONL delle prove della ricerca halving, per riprendere una ricerca '
+                             'interrotta (default: search_trials.jsonl nella directory dei risultati)')
+    parser.add_argument('--joint', action='store_true',
+                        help='Addestra un unico modello multi-output per arousal e valence '
+                             f'(salvato in {JOINT_MODEL_FILE}) invece di un modello per target')
+    parser.add_argument('--no-plot', action='store_true',
+                        help='Non disegna né salva i grafici (esecuzione headless, senza matplotlib)')
+    args = parser.parse_args()
+    plot = not args.no_plot
+
     # Carica i dati
     data_path = 'audio_tonality_features_with_emotions.csv'
     df = load_data(data_path)
@@ -477,26 +801,56 @@ def main():
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
     
+    # Registro delle prove della ricerca, condiviso da arousal e valence
+    trial_log = None
+    if args.search == 'halving':
+        trial_log = TrialLog(args.trial_log or os.path.join(results_dir, 'search_trials.jsonl'))
+        if trial_log.trials:
+            print(f"\nRegistro delle prove: {len(trial_log.trials)} prove già completate in {trial_log.path}")
+    
+    # Modalità congiunta: un solo modello e un solo artefatto per entrambi i target
+    if args.joint:
+        best_model_name, test_r2 = train_joint_model(df, results_dir, args.n_jobs, args.search, trial_log, plot)
+        print("\n" + "=" * 80)
+        print("CONCLUSIONI")
+        print("=" * 80)
+        print(f"Miglior modello congiunto: {best_model_name} "
+              f"(R² arousal = {test_r2['arousal']:.4f}, R² valence = {test_r2['valence']:.4f})")
+        print("\nIl modello è stato salvato nella directory:", results_dir)
+        print("\nPer utilizzarlo, eseguire predict_new_audio.py con l'opzione --joint")
+        return
+    
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.preprocessing import StandardScaler
+    
+    # Prepara i dati per arousal e valence, codificati con lo stesso schema delle feature
+    schema = build_feature_schema(df, ['arousal_mean', 'valence_mean'])
+    X_train_arousal, X_test_arousal, y_train_arousal, y_test_arousal, feature_names_arousal = \
+        prepare_data(df, 'arousal_mean', schema=schema)
+    X_train_valence, X_test_valence, y_train_valence, y_test_valence, feature_names_valence = \
+        prepare_data(df, 'valence_mean', schema=schema)
+    
+    # Addestra e valuta i modelli per entrambi i target in un unico insieme di job paralleli
+    all_results = evaluate_models({
+        'arousal': (X_train_arousal, X_test_arousal, y_train_arousal, y_test_arousal),
+        'valence': (X_train_valence, X_test_valence, y_train_valence, y_test_valence)
+    }, n_jobs=args.n_jobs)
+    arousal_results = all_results['arousal']
+    valence_results = all_results['valence']
+    
     # Predizione di Arousal
     print("\n" + "=" * 80)
     print("PREDIZIONE DI AROUSAL (ECCITAZIONE)")
     print("=" * 80)
     
-    # Prepara i dati per arousal
-    X_train_arousal, X_test_arousal, y_train_arousal, y_test_arousal, feature_names_arousal = \
-        prepare_data(df, 'arousal_mean')
-    
-    # Addestra e valuta i modelli per arousal
-    arousal_results = train_and_evaluate_models(
-        X_train_arousal, X_test_arousal, y_train_arousal, y_test_arousal, 'arousal')
-    
     # Trova il miglior modello per arousal
     best_arousal_model_name = max(arousal_results.items(), key=lambda x: x[1]['test_r2'])[0]
     print(f"\nMiglior modello per arousal: {best_arousal_model_name} (R² = {arousal_results[best_arousal_model_name]['test_r2']:.4f})")
     
     # Ottimizza il miglior modello per arousal
     best_arousal_model, best_arousal_params, best_arousal_score = optimize_best_model(
-        X_train_arousal, y_train_arousal, best_arousal_model_name, 'arousal')
+        X_train_arousal, y_train_arousal, best_arousal_model_name, 'arousal',
+        search=args.search, trial_log=trial_log, n_jobs=args.n_jobs)
     
     # Valuta il modello ottimizzato sul test set
     y_pred_arousal = best_arousal_model.predict(X_test_arousal)
@@ -507,47 +861,39 @@ def main():
     print(f"R²: {arousal_r2:.4f}")
     print(f"RMSE: {arousal_rmse:.4f}")
     
-    # Visualizza le previsioni per arousal
-    plot_predictions(y_test_arousal, y_pred_arousal, 'arousal', results_dir)
-    
-    # Visualizza le previsioni di tutti i modelli
-    plot_all_model_predictions(
-        X_train_arousal, X_test_arousal, 
-        y_train_arousal, y_test_arousal,
-        best_arousal_model, 
-        arousal_results['Random Forest'],
-        'arousal',
-        results_dir
-    )
+    # Visualizza le previsioni per arousal e quelle di tutti i modelli
+    if plot:
+        plot_predictions(y_test_arousal, y_pred_arousal, 'arousal', results_dir)
+        plot_all_model_predictions(
+            X_train_arousal, X_test_arousal, 
+            y_train_arousal, y_test_arousal,
+            best_arousal_model, 
+            arousal_results['Random Forest'],
+            'arousal',
+            results_dir
+        )
     
     # Analizza l'importanza delle feature per arousal
-    analyze_feature_importance(best_arousal_model, feature_names_arousal, 'arousal')
+    analyze_feature_importance(best_arousal_model, feature_names_arousal, 'arousal', plot)
     
     # Salva il modello per arousal
     save_model(best_arousal_model, best_arousal_model.named_steps['scaler'] 
                if hasattr(best_arousal_model, 'named_steps') else StandardScaler(), 
-               feature_names_arousal, 'arousal', results_dir)
+               feature_names_arousal, 'arousal', results_dir, schema=schema)
     
     # Predizione di Valence
     print("\n" + "=" * 80)
     print("PREDIZIONE DI VALENCE (POSITIVITÀ)")
     print("=" * 80)
     
-    # Prepara i dati per valence
-    X_train_valence, X_test_valence, y_train_valence, y_test_valence, feature_names_valence = \
-        prepare_data(df, 'valence_mean')
-    
-    # Addestra e valuta i modelli per valence
-    valence_results = train_and_evaluate_models(
-        X_train_valence, X_test_valence, y_train_valence, y_test_valence, 'valence')
-    
     # Trova il miglior modello per valence
     best_valence_model_name = max(valence_results.items(), key=lambda x: x[1]['test_r2'])[0]
     print(f"\nMiglior modello per valence: {best_valence_model_name} (R² = {valence_results[best_valence_model_name]['test_r2']:.4f})")
     
     # Ottimizza il miglior modello per valence
     best_valence_model, best_valence_params, best_valence_score = optimize_best_model(
-        X_train_valence, y_train_valence, best_valence_model_name, 'valence')
+        X_train_valence, y_train_valence, best_valence_model_name, 'valence',
+        search=args.search, trial_log=trial_log, n_jobs=args.n_jobs)
     
     # Valuta il modello ottimizzato sul test set
     y_pred_valence = best_valence_model.predict(X_test_valence)
@@ -558,24 +904,24 @@ def main():
     print(f"R²: {valence_r2:.4f}")
     print(f"RMSE: {valence_rmse:.4f}")
     
-    # Visualizza le previsioni per valence
-    plot_predictions(y_test_valence, y_pred_valence, 'valence', results_dir)
-
-    plot_all_model_predictions(
-        X_train_valence, X_test_valence, 
-        y_train_valence, y_test_valence,
-        best_valence_model, 
-        valence_results['Random Forest'],
-        'valence',
-        results_dir
-    )
+    # Visualizza le previsioni per valence e quelle di tutti i modelli
+    if plot:
+        plot_predictions(y_test_valence, y_pred_valence, 'valence', results_dir)
+        plot_all_model_predictions(
+            X_train_valence, X_test_valence, 
+            y_train_valence, y_test_valence,
+            best_valence_model, 
+            valence_results['Random Forest'],
+            'valence',
+            results_dir
+        )
     # Analizza l'importanza delle feature per valence
-    analyze_feature_importance(best_valence_model, feature_names_valence, 'valence')
+    analyze_feature_importance(best_valence_model, feature_names_valence, 'valence', plot)
     
     # Salva il modello per valence
     save_model(best_valence_model, best_valence_model.named_steps['scaler'] 
                if hasattr(best_valence_model, 'named_steps') else StandardScaler(), 
-               feature_names_valence, 'valence', results_dir)
+               feature_names_valence, 'valence', results_dir, schema=schema)
     
     # Conclusioni
     print("\n" + "=" * 80)
@@ -1,26 +1,70 @@
 import os
+import csv
+import json
+import glob
+import argparse
+import multiprocessing
+from functools import partial
 import numpy as np
-import pandas as pd
-import librosa
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
+from tqdm import tqdm
 
-# Impostazioni di visualizzazione
-pd.set_option('display.max_columns', None)
-sns.set_theme(style='whitegrid')
+from feature_cache import cached_extraction, extractor_fingerprint, open_cache
+from feature_registry import FEATURE_SETS, columns_for_model, extract_feature_set
+from tempo_estimation import TEMPO_METHODS, make_tempo_options
+from extraction_profiles import DEFAULT_PROFILE, PROFILES, profile_fingerprint
+from excerpts import DEFAULT_LENGTH, EXCERPT_MODES, make_excerpt_options
+from compiled_predictor import COMPILED_MODEL_FILE, CompiledPredictor
+from feature_schema import FEATURE_SCHEMA_FILE, FeatureSchema
 
-def extract_audio_features(audio_path, duration=None):
+# Versione del codice di estrazione, parte dell'impronta della cache delle feature:
+# va incrementata ogni volta che cambiano le feature calcolate
+EXTRACTOR_VERSION = 2
+
+# Insieme di feature della tabella su cui vengono addestrati i modelli (vedi feature_registry.py)
+PREDICTION_FEATURE_SET = 'deam_complete'
+
+# Estensioni audio considerate nella modalità batch
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+
+# Artefatto del modello congiunto di arousal e valence (predict_emotions.py --joint)
+JOINT_MODEL_FILE = 'emotion_model.pkl'
+
+# Colonne dei risultati scritti dalla modalità batch
+RESULT_COLUMNS = ['file', 'arousal', 'valence', 'status']
+
+# I moduli pesanti (pandas, joblib con scikit-learn, matplotlib e seaborn) sono importati
+# solo nei percorsi che li usano: la modalità batch con i modelli compilati e --no-plot
+# non li carica mai, così che l'avvio dello script resti nell'ordine dei decimi di secondo
+
+def extract_audio_features(audio_path, duration=None, stream=False, columns=None, tempo_options=None,
+                           profile=DEFAULT_PROFILE, excerpt_options=None):
     """
     Estrae le caratteristiche audio da un file audio
     
+    Le feature sono quelle della tabella di addestramento (PREDICTION_FEATURE_SET),
+    calcolate con le stesse definizioni usate in estrazione; indicando le colonne
+    richieste dai modelli (vedi model_columns) vengono valutate solo le dipendenze
+    necessarie, ad esempio senza beat tracking se il tempo non è un input del modello.
+    
     Parameters:
     -----------
     audio_path : str
         Percorso al file audio
     duration : float, optional
         Durata in secondi da caricare (None per caricare l'intero file)
+    stream : bool
+        Se True decodifica il file a blocchi con accumulatori progressivi
+        (memoria costante, per brani completi e mix lunghi)
+    columns : list, optional
+        Colonne da estrarre (None per tutte quelle dell'insieme)
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione (frequenza di analisi, ricampionatore e parametri STFT),
+        vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Se indicato analizza solo alcune finestre del brano, vedi excerpts.make_excerpt_options
     
     Returns:
     --------
@@ -28,71 +72,64 @@ def extract_audio_features(audio_path, duration=None):
         Dizionario con le caratteristiche audio estratte
     """
     try:
-        # Carica il file audio
-        y, sr = librosa.load(audio_path, duration=duration)
-        
-        # Calcola le caratteristiche audio per l'intero brano
-        # 1. Energia (RMS)
-        rms = np.mean(librosa.feature.rms(y=y)[0])
-        
-        # 2. Centroide spettrale (brillantezza)
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)[0])
-        
-        # 3. Rolloff spettrale (distribuzione dell'energia)
-        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)[0])
-        
-        # 4. Scala cromatica (rappresentazione delle classi di altezza)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        chroma_mean = np.mean(chroma)
-        
-        # Determina la tonalità predominante
-        chroma_sum = np.sum(chroma, axis=1)
-        key_index = np.argmax(chroma_sum)
-        # Mappa l'indice della tonalità alla notazione musicale (C, C#, D, ecc.)
-        key_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        predominant_key = key_names[key_index]
-        
-        # 5. MFCC (Mel-Frequency Cepstral Coefficients)
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-        mfcc_means = np.mean(mfccs, axis=1)
-        
-        # 6. Tempo (BPM)
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        
-        # 7. Modalità (maggiore/minore)
-        # Utilizziamo una semplice euristica basata sulla presenza di terze maggiori/minori
-        # Questo è un'approssimazione, per un'analisi più accurata si potrebbero usare librerie specializzate
-        chroma_3rd_major = chroma[(key_index + 4) % 12].mean()  # Terza maggiore
-        chroma_3rd_minor = chroma[(key_index + 3) % 12].mean()  # Terza minore
-        mode = 'major' if chroma_3rd_major > chroma_3rd_minor else 'minor'
-        
-        # Crea un dizionario con tutte le caratteristiche estratte
-        features = {
-            'rms': rms,
-            'spectral': spectral_centroid,
-            'rolloff': spectral_rolloff,
-            'Chromatic scale': chroma_mean,
-            'key': predominant_key,
-            'mode': mode,
-            'tempo': tempo
-        }
-        
-        # Aggiungi i coefficienti MFCC
-        features['MFCC'] = mfcc_means[0]  # Primo coefficiente MFCC
-        
-        # Aggiungi altre caratteristiche che potrebbero essere presenti nel dataset originale
-        # Queste sono approssimazioni e potrebbero richiedere adattamenti in base al dataset specifico
-        features['scale_name'] = 'Minor Pentatonic' if mode == 'minor' else 'Major Pentatonic'
-        features['key_correlation'] = np.max(chroma_sum) / np.sum(chroma_sum)
-        features['scale_correlation'] = 0.1  # Valore di default
-        
-        return features
+        return extract_feature_set(audio_path, PREDICTION_FEATURE_SET, columns, duration, stream, tempo_options,
+                                   profile, excerpt_options)
     
     except Exception as e:
         print(f"Errore nell'estrazione delle caratteristiche da {audio_path}: {e}")
         return None
 
-def load_models(models_dir='emotion_prediction_results'):
+def model_columns(models):
+    """
+    Colonne da estrarre per i modelli caricati, ricavate dalle loro liste di feature
+    
+    Parameters:
+    -----------
+    models : dict
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    
+    Returns:
+    --------
+    list
+        Colonne di PREDICTION_FEATURE_SET usate da almeno un modello
+    """
+    feature_names = [name for target in models.values() for name in target['features']]
+    return columns_for_model(feature_names, PREDICTION_FEATURE_SET)
+
+def prediction_fingerprint(columns, stream=False, tempo_options=None, profile=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Impronta della cache delle feature per la predizione
+    
+    Parameters:
+    -----------
+    columns : list
+        Colonne estratte (vedi model_columns)
+    stream : bool
+        Se True le feature sono estratte a blocchi
+    tempo_options : dict, optional
+        Opzioni della stima del tempo diverse da quelle predefinite
+    profile : str
+        Profilo di estrazione
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti
+    
+    Returns:
+    --------
+    str
+        Impronta dell'estrattore
+    """
+    params = {'columns': list(columns)}
+    if stream:
+        params['stream'] = True
+    if tempo_options:
+        params['tempo'] = tempo_options
+    if profile != DEFAULT_PROFILE:
+        params['profile'] = profile_fingerprint(profile)
+    if excerpt_options:
+        params['excerpt'] = excerpt_options
+    return extractor_fingerprint('predict', EXTRACTOR_VERSION, params)
+
+def load_models(models_dir='emotion_prediction_results', joint=False, compiled=False):
     """
     Carica i modelli salvati per la predizione di arousal e valence
     
@@ -100,15 +137,39 @@ def load_models(models_dir='emotion_prediction_results'):
     -----------
     models_dir : str
         Directory contenente i modelli salvati
+    joint : bool
+        Se True carica il modello congiunto multi-output (JOINT_MODEL_FILE, addestrato con
+        predict_emotions.py --joint) invece dei due modelli separati
+    compiled : bool
+        Se True carica l'artefatto compilato (COMPILED_MODEL_FILE, scritto da
+        compile_models.py), che richiede solo NumPy
     
     Returns:
     --------
     dict
-        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence; nella
+        modalità congiunta un'unica voce 'joint' con la pipeline, le feature e i target,
+        con l'artefatto compilato un'unica voce 'compiled' con il predittore
     """
     models = {}
     
     try:
+        if compiled:
+            predictor = CompiledPredictor(os.path.join(models_dir, COMPILED_MODEL_FILE))
+            models['compiled'] = {'model': predictor, 'features': predictor.columns, 'targets': predictor.targets}
+            print(f"Modelli compilati caricati con successo da {models_dir}")
+            return models
+        
+        # I modelli scikit-learn richiedono joblib (e scikit-learn) solo fuori dalla modalità compilata
+        import joblib
+        
+        if joint:
+            # Artefatto unico: pipeline con scaler, ordine delle feature e dei target
+            models['joint'] = joblib.load(os.path.join(models_dir, JOINT_MODEL_FILE))
+            models['joint']['schema'] = load_feature_schema(models_dir, models['joint']['features'])
+            print(f"Modello congiunto caricato con successo da {models_dir}")
+            return models
+        
         # Carica il modello per arousal
         arousal_model_path = os.path.join(models_dir, 'arousal_model.pkl')
         arousal_scaler_path = os.path.join(models_dir, 'arousal_scaler.pkl')
@@ -131,6 +192,9 @@ def load_models(models_dir='emotion_prediction_results'):
             'features': joblib.load(valence_features_path)
         }
         
+        for target in models.values():
+            target['schema'] = load_feature_schema(models_dir, target['features'])
+        
         print(f"Modelli caricati con successo da {models_dir}")
         return models
     
@@ -142,7 +206,65 @@ def load_models(models_dir='emotion_prediction_results'):
         print(f"Errore nel caricamento dei modelli: {e}")
         return None
 
-def prepare_features_for_prediction(audio_features, feature_names):
+def load_feature_schema(models_dir, feature_names):
+    """
+    Schema delle feature di un modello salvato
+    
+    Usa lo schema persistito in addestramento (FEATURE_SCHEMA_FILE) se le sue colonne
+    coincidono con le feature del modello; per i modelli salvati senza schema lo ricava
+    dai nomi delle feature, considerando numeriche le colonne della tabella di
+    addestramento (es. 'key_correlation').
+    
+    Parameters:
+    -----------
+    models_dir : str
+        Directory contenente i modelli salvati
+    feature_names : list
+        Lista dei nomi delle feature richieste dal modello
+    
+    Returns:
+    --------
+    FeatureSchema
+        Schema con l'ordine delle colonne e i vocabolari delle colonne categoriche
+    """
+    schema_path = os.path.join(models_dir, FEATURE_SCHEMA_FILE)
+    if os.path.exists(schema_path):
+        schema = FeatureSchema.load(schema_path)
+        if schema.columns == list(feature_names):
+            return schema
+        print(f"Attenzione: lo schema in {schema_path} non corrisponde alle feature del modello, viene ricostruito")
+    return FeatureSchema.from_columns(feature_names, numeric_columns=FEATURE_SETS[PREDICTION_FEATURE_SET])
+
+def prepare_feature_matrix(features_list, feature_names, schema=None):
+    """
+    Prepara la matrice delle caratteristiche per la predizione di più file in una volta
+    
+    I valori numerici e one-hot vengono scritti direttamente in una matrice NumPy dallo
+    schema delle feature, lo stesso encoder usato in addestramento: le categorie senza
+    colonna (eliminate da drop_first o mai viste) e le feature mancanti valgono 0, quindi
+    la riga di un file non dipende dagli altri file presenti nel batch.
+    
+    Parameters:
+    -----------
+    features_list : list
+        Lista di dizionari con le caratteristiche audio estratte
+    feature_names : list
+        Lista dei nomi delle feature richieste dal modello
+    schema : FeatureSchema, optional
+        Schema delle feature del modello (None per ricavarlo da feature_names)
+    
+    Returns:
+    --------
+    DataFrame
+        DataFrame (n_file, n_feature) con le caratteristiche pronte per la predizione
+    """
+    import pandas as pd
+    
+    if schema is None:
+        schema = FeatureSchema.from_columns(feature_names, numeric_columns=FEATURE_SETS[PREDICTION_FEATURE_SET])
+    return pd.DataFrame(schema.encode_rows(features_list), columns=schema.columns)
+
+def prepare_features_for_prediction(audio_features, feature_names, schema=None):
     """
     Prepara le caratteristiche audio per la predizione
     
@@ -152,31 +274,60 @@ def prepare_features_for_prediction(audio_features, feature_names):
         Dizionario con le caratteristiche audio estratte
     feature_names : list
         Lista dei nomi delle feature richieste dal modello
+    schema : FeatureSchema, optional
+        Schema delle feature del modello (None per ricavarlo da feature_names)
     
     Returns:
     --------
     DataFrame
         DataFrame con le caratteristiche pronte per la predizione
     """
-    # Crea un DataFrame con le caratteristiche estratte
-    features_df = pd.DataFrame([audio_features])
-    
-    # Gestione delle colonne categoriche con one-hot encoding
-    categorical_cols = ['key', 'mode', 'scale_name']
-    for col in categorical_cols:
-        if col in features_df.columns:
-            features_df = pd.get_dummies(features_df, columns=[col], drop_first=True)
-    
-    # Assicurati che tutte le feature richieste dal modello siano presenti
-    for feature in feature_names:
-        if feature not in features_df.columns:
-            # Se una feature manca, aggiungila con valore 0
-            features_df[feature] = 0
-    
-    # Seleziona solo le feature richieste dal modello nell'ordine corretto
-    return features_df[feature_names]
+    return prepare_feature_matrix([audio_features], feature_names, schema)
+
+def predict_batch(features_list, models):
+    """
+    Predice arousal e valence per più file con una sola chiamata vettoriale per target
+    
+    Con il modello congiunto la matrice delle feature viene preparata una sola volta e
+    una sola chiamata a predict restituisce entrambi i target.
+    
+    Parameters:
+    -----------
+    features_list : list
+        Lista di dizionari con le caratteristiche audio estratte
+    models : dict
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    
+    Returns:
+    --------
+    dict
+        Dizionario target -> array dei valori predetti (uno per file)
+    """
+    if 'compiled' in models:
+        predictor = models['compiled']['model']
+        Y = predictor.predict(predictor.encode(features_list))
+        return {target: Y[:, i] for i, target in enumerate(predictor.targets)}
+    
+    if 'joint' in models:
+        joint = models['joint']
+        X = prepare_feature_matrix(features_list, joint['features'], joint.get('schema'))
+        Y = np.asarray(joint['model'].predict(X)).reshape(len(X), len(joint['targets']))
+        return {target: Y[:, i] for i, target in enumerate(joint['targets'])}
+    
+    predictions = {}
+    matrices = {}
+    for target in ['arousal', 'valence']:
+        # La matrice viene codificata una sola volta se i due modelli usano le stesse feature
+        key = tuple(models[target]['features'])
+        if key not in matrices:
+            matrices[key] = prepare_feature_matrix(features_list, models[target]['features'], models[target].get('schema'))
+        X = matrices[key]
+        X_scaled = models[target]['scaler'].transform(X)
+        predictions[target] = models[target]['model'].predict(X_scaled)
+    return predictions
 
-def predict_emotions(audio_path, models):
+def predict_emotions(audio_path, models, cache=None, stream=False, tempo_options=None, profile=DEFAULT_PROFILE,
+                     excerpt_options=None):
     """
     Predice i valori di arousal e valence per un file audio
     
@@ -186,36 +337,208 @@ def predict_emotions(audio_path, models):
         Percorso al file audio
     models : dict
         Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    cache : FeatureCache, optional
+        Cache delle feature da cui leggere (e in cui salvare) le caratteristiche estratte
+    stream : bool
+        Se True decodifica il file a blocchi con memoria costante
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti, vedi excerpts.make_excerpt_options
     
     Returns:
     --------
     dict
         Dizionario con i valori predetti di arousal e valence
     """
-    # Estrai le caratteristiche audio
+    # Estrai le caratteristiche audio richieste dai modelli (o leggile dalla cache)
     print(f"Estrazione delle caratteristiche da {audio_path}...")
-    audio_features = extract_audio_features(audio_path)
+    audio_features = cached_extraction(cache, audio_path, partial(extract_audio_features, stream=stream,
+                                                                  columns=model_columns(models),
+                                                                  tempo_options=tempo_options,
+                                                                  profile=profile,
+                                                                  excerpt_options=excerpt_options))
     
     if audio_features is None:
         return None
     
-    predictions = {}
+    # Predici arousal e valence
+    predictions = predict_batch([audio_features], models)
+    return {target: values[0] for target, values in predictions.items()}
+
+def collect_audio_files(inputs=None, input_dir=None, file_list=None, recursive=False):
+    """
+    Raccoglie i file audio da analizzare in modalità batch
+    
+    Parameters:
+    -----------
+    inputs : list, optional
+        Percorsi di file o pattern glob (es. 'catalogo/*.mp3')
+    input_dir : str, optional
+        Directory da cui prendere tutti i file audio
+    file_list : str, optional
+        File di testo con un percorso audio per riga
+    recursive : bool
+        Se True cerca i file audio anche nelle sottodirectory di input_dir
+    
+    Returns:
+    --------
+    list
+        Lista ordinata e senza duplicati dei percorsi dei file audio
+    """
+    audio_files = []
     
-    # Predici arousal
-    arousal_features = prepare_features_for_prediction(
-        audio_features, models['arousal']['features'])
-    arousal_features_scaled = models['arousal']['scaler'].transform(arousal_features)
-    arousal_pred = models['arousal']['model'].predict(arousal_features_scaled)[0]
-    predictions['arousal'] = arousal_pred
+    for pattern in inputs or []:
+        matches = glob.glob(pattern, recursive=True)
+        audio_files.extend(matches if matches else [pattern])
     
-    # Predici valence
-    valence_features = prepare_features_for_prediction(
-        audio_features, models['valence']['features'])
-    valence_features_scaled = models['valence']['scaler'].transform(valence_features)
-    valence_pred = models['valence']['model'].predict(valence_features_scaled)[0]
-    predictions['valence'] = valence_pred
+    if input_dir:
+        walker = Path(input_dir).rglob('*') if recursive else Path(input_dir).glob('*')
+        audio_files.extend(str(p) for p in walker if p.suffix.lower() in AUDIO_EXTENSIONS)
     
-    return predictions
+    if file_list:
+        with open(file_list, 'r', encoding='utf-8') as f:
+            audio_files.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    
+    return sorted(set(audio_files))
+
+def extract_for_batch(task):
+    """
+    Estrae (o legge dalla cache) le caratteristiche di un file, da eseguire in un processo separato
+    
+    Parameters:
+    -----------
+    task : tuple
+        Tupla (audio_path, cache_config, extract_options); cache_config è (cache_dir, fingerprint)
+        oppure None, extract_options sono gli argomenti di extract_audio_features (stream,
+        columns richieste dai modelli, tempo_options, profile, excerpt_options)
+    
+    Returns:
+    --------
+    tuple
+        Tupla (audio_path, features) con features None in caso di errore
+    """
+    audio_path, cache_config, extract_options = task
+    if not os.path.exists(audio_path):
+        return audio_path, None
+    cache = open_cache(*cache_config) if cache_config else None
+    return audio_path, cached_extraction(cache, audio_path, partial(extract_audio_features, **extract_options))
+
+def write_results(rows, output_file, output_format, write_header=False):
+    """
+    Aggiunge le righe dei risultati al file di output (CSV o JSONL)
+    
+    Parameters:
+    -----------
+    rows : list
+        Lista di dizionari con le colonne RESULT_COLUMNS
+    output_file : file
+        File di output aperto in scrittura
+    output_format : str
+        'csv' oppure 'jsonl'
+    write_header : bool
+        Se True scrive l'intestazione CSV prima delle righe
+    """
+    if output_format == 'jsonl':
+        for row in rows:
+            output_file.write(json.dumps(row) + '\n')
+    else:
+        writer = csv.DictWriter(output_file, fieldnames=RESULT_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+    output_file.flush()
+
+def predict_directory(audio_files, models, output_path, cache_config=None, n_jobs=None, batch_size=1000,
+                      stream=False, tempo_options=None, profile=DEFAULT_PROFILE, excerpt_options=None):
+    """
+    Predice arousal e valence per molti file audio, scrivendo i risultati man mano
+    
+    L'estrazione delle caratteristiche avviene in parallelo; ogni batch di file estratti
+    viene riunito in un'unica matrice e predetto con una sola chiamata per target, poi
+    scritto subito nel file di output, così che la memoria resti limitata al batch.
+    
+    Parameters:
+    -----------
+    audio_files : list
+        Lista dei percorsi dei file audio
+    models : dict
+        Dizionario con i modelli, gli scaler e le feature per arousal e valence
+    output_path : str
+        File di output (.csv oppure .jsonl)
+    cache_config : tuple, optional
+        Tupla (cache_dir, fingerprint) della cache delle feature (None per disattivarla)
+    n_jobs : int, optional
+        Numero di processi per l'estrazione (default: numero di CPU - 1)
+    batch_size : int
+        Numero di file per matrice di predizione (0 per un'unica matrice con tutti i file)
+    stream : bool
+        Se True decodifica i file a blocchi con memoria costante
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    profile : str
+        Profilo di estrazione, vedi extraction_profiles.PROFILES
+    excerpt_options : dict, optional
+        Opzioni della modalità a estratti, vedi excerpts.make_excerpt_options
+    
+    Returns:
+    --------
+    dict
+        Conteggio dei file predetti ('ok') e non elaborabili ('failed')
+    """
+    if n_jobs is None:
+        n_jobs = max(1, multiprocessing.cpu_count() - 1)
+    batch_size = batch_size or len(audio_files) or 1
+    output_format = 'jsonl' if str(output_path).endswith('.jsonl') else 'csv'
+    extract_options = {'stream': stream, 'columns': model_columns(models), 'tempo_options': tempo_options,
+                       'profile': profile, 'excerpt_options': excerpt_options}
+    tasks = [(audio_path, cache_config, extract_options) for audio_path in audio_files]
+    counts = {'ok': 0, 'failed': 0}
+    
+    def flush(batch, output_file, write_header):
+        ok = [features for _, features in batch if features is not None]
+        predictions = predict_batch(ok, models) if ok else {}
+        rows = []
+        i = 0
+        for path, features in batch:
+            if features is None:
+                rows.append({'file': path, 'arousal': None, 'valence': None, 'status': 'failed'})
+                continue
+            rows.append({'file': path,
+                         'arousal': float(predictions['arousal'][i]),
+                         'valence': float(predictions['valence'][i]),
+                         'status': 'ok'})
+            i += 1
+        write_results(rows, output_file, output_format, write_header)
+        counts['ok'] += len(ok)
+        counts['failed'] += len(batch) - len(ok)
+    
+    with open(output_path, 'w', newline='', encoding='utf-8') as output_file:
+        write_header = True
+        batch = []
+        if n_jobs <= 1:
+            results = map(extract_for_batch, tasks)
+        else:
+            pool = multiprocessing.Pool(processes=n_jobs)
+            chunksize = max(1, min(32, len(tasks) // (4 * n_jobs)))
+            results = pool.imap_unordered(extract_for_batch, tasks, chunksize=chunksize)
+        try:
+            for result in tqdm(results, total=len(tasks)):
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    flush(batch, output_file, write_header)
+                    write_header = False
+                    batch = []
+            if batch or write_header:
+                flush(batch, output_file, write_header)
+        finally:
+            if n_jobs > 1:
+                pool.close()
+                pool.join()
+    
+    return counts
 
 def visualize_emotions(predictions):
     """
@@ -226,6 +549,12 @@ def visualize_emotions(predictions):
     predictions : dict
         Dizionario con i valori predetti di arousal e valence
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    # Impostazioni di visualizzazione
+    sns.set_theme(style='whitegrid')
+    
     # Crea un grafico bidimensionale
     plt.figure(figsize=(10, 8))
     
@@ -327,13 +656,79 @@ def describe_emotion(predictions):
     return f"Quadrante emozionale: {quadrant}\n\nIl brano è {intensity} e {positivity}.\n\n{description}\n\nValori predetti:\nArousal (Eccitazione): {arousal:.2f}/10\nValence (Positività): {valence:.2f}/10"
 
 def main():
+    # Parsing degli argomenti da linea di comando
+    parser = argparse.ArgumentParser(description='Predice arousal e valence di un file audio')
+    parser.add_argument('--cache-dir', type=str, help='Directory della cache delle feature (default: <progetto>/feature_cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Ricalcola sempre le feature ignorando la cache')
+    parser.add_argument('inputs', nargs='*', help='File audio o pattern glob da analizzare in modalità batch')
+    parser.add_argument('--input-dir', type=str, help='Directory con i file audio da analizzare in modalità batch')
+    parser.add_argument('--recursive', action='store_true', help='Cerca i file audio anche nelle sottodirectory di --input-dir')
+    parser.add_argument('--file-list', type=str, help='File di testo con un percorso audio per riga')
+    parser.add_argument('--output', type=str, default='emotion_predictions.csv', help='File dei risultati batch (.csv o .jsonl)')
+    parser.add_argument('--n-jobs', type=int, help='Numero di processi per l\'estrazione (default: numero di CPU - 1)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='File per matrice di predizione (0 per un\'unica matrice)')
+    parser.add_argument('--stream', action='store_true', help='Decodifica l\'audio a blocchi con memoria costante (per brani lunghi)')
+    parser.add_argument('--tempo-method', choices=TEMPO_METHODS, default='onset',
+                        help='Stima del tempo, se richiesto dai modelli: tempogramma dell\'inviluppo di onset (default), '
+                             'beat tracking completo o autocorrelazione dell\'inviluppo')
+    parser.add_argument('--tempo-window', type=float, help='Analizza il tempo solo sui secondi centrali del brano (es. 30)')
+    parser.add_argument('--tempo-downsample', type=int, default=1,
+                        help='Fattore di sottocampionamento dell\'inviluppo per --tempo-method autocorr')
+    parser.add_argument('--profile', choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help='Profilo di estrazione: frequenza di analisi, ricampionatore e dimensione della FFT')
+    parser.add_argument('--excerpt-windows', type=int, default=0,
+                        help='Analizza solo questo numero di finestre del brano invece dell\'intero file (0 per disattivare)')
+    parser.add_argument('--excerpt-length', type=float, default=DEFAULT_LENGTH, help='Durata in secondi di ogni finestra')
+    parser.add_argument('--excerpt-mode', choices=EXCERPT_MODES, default='peaks',
+                        help='Finestre attorno ai picchi di energia (sondaggio rapido) o equidistanti')
+    parser.add_argument('--models-dir', type=str, default='emotion_prediction_results', help='Directory dei modelli addestrati')
+    parser.add_argument('--joint', action='store_true',
+                        help=f'Usa il modello congiunto di arousal e valence ({JOINT_MODEL_FILE}, da predict_emotions.py --joint)')
+    parser.add_argument('--compiled', action='store_true',
+                        help=f'Usa i modelli compilati in array NumPy ({COMPILED_MODEL_FILE}, da compile_models.py)')
+    parser.add_argument('--no-plot', action='store_true',
+                        help='Non disegna né salva il grafico della predizione (esecuzione headless, senza matplotlib)')
+    args = parser.parse_args()
+    
     # Carica i modelli
-    models = load_models()
+    models = load_models(args.models_dir, args.joint, args.compiled)
     
     if models is None:
         print("Impossibile procedere senza i modelli. Esegui prima predict_emotions.py")
         return
     
+    # Opzioni della stima del tempo (vuote con i valori predefiniti)
+    tempo_options = make_tempo_options(args.tempo_method, args.tempo_window, args.tempo_downsample)
+    
+    # Opzioni della modalità a estratti (vuote se disattivata)
+    excerpt_options = make_excerpt_options(args.excerpt_windows, args.excerpt_length, args.excerpt_mode)
+    
+    # Cache delle feature indirizzata per contenuto audio e impronta dell'estrattore
+    # (che include le colonne richieste dai modelli)
+    if args.no_cache:
+        cache_config = None
+    else:
+        cache_dir = args.cache_dir or str(Path(os.path.dirname(os.path.abspath(__file__))) / 'feature_cache')
+        cache_config = (cache_dir, prediction_fingerprint(model_columns(models), args.stream, tempo_options,
+                                                         args.profile, excerpt_options))
+    
+    # Modalità batch: nessun input interattivo e nessun grafico per file
+    if args.inputs or args.input_dir or args.file_list:
+        audio_files = collect_audio_files(args.inputs, args.input_dir, args.file_list, args.recursive)
+        if not audio_files:
+            print("Nessun file audio trovato.")
+            return
+        print(f"Predizione di {len(audio_files)} file audio...")
+        counts = predict_directory(audio_files, models, args.output, cache_config,
+                                   n_jobs=args.n_jobs, batch_size=args.batch_size, stream=args.stream,
+                                   tempo_options=tempo_options, profile=args.profile,
+                                   excerpt_options=excerpt_options)
+        print(f"Predizioni completate: {counts['ok']} file, {counts['failed']} non elaborabili")
+        print(f"Risultati salvati in: {args.output}")
+        return
+    
+    cache = open_cache(*cache_config) if cache_config else None
+    
     # Chiedi all'utente di inserire il percorso al file audio
     audio_path = input("Inserisci il percorso al file audio da analizzare: ")
     
@@ -343,7 +738,8 @@ def main():
         return
     
     # Predici le emozioni
-    predictions = predict_emotions(audio_path, models)
+    predictions = predict_emotions(audio_path, models, cache, args.stream, tempo_options, args.profile,
+                                   excerpt_options)
     
     if predictions is None:
         print("Impossibile predire le emozioni per questo file audio.")
@@ -364,7 +760,8 @@ def main():
     print(describe_emotion(predictions))
     
     # Visualizza il grafico
-    visualize_emotions(predictions)
+    if not args.no_plot:
+        visualize_emotions(predictions)
 
 # Esegui lo script se chiamato direttamente
 if __name__ == "__main__":
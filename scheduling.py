@@ -0,0 +1,297 @@
+import os
+import json
+import heapq
+
+import numpy as np
+import soundfile as sf
+
+# Bitrate ipotizzato (byte al secondo) per stimare la durata dalla dimensione del file
+# quando l'intestazione non è leggibile (mp3 a 128 kbps)
+FALLBACK_BYTES_PER_SECOND = 128000 / 8
+
+# Numero di blocchi per processo: blocchi più piccoli bilanciano meglio la coda finale,
+# blocchi più grandi riducono l'overhead di comunicazione
+CHUNKS_PER_WORKER = 8
+
+# Numero minimo di file estratti davvero (non letti dalla cache né falliti) per adattare
+# e salvare il modello di costo
+MIN_COST_MODEL_FILES = 5
+
+def estimate_cost(audio_path, method='header'):
+    """
+    Stima in modo economico il costo di estrazione di un file (in secondi di audio)
+
+    Parameters:
+    -----------
+    audio_path : str o Path
+        Percorso al file audio
+    method : str
+        'header' per leggere la durata dall'intestazione del file (con ripiego sulla
+        dimensione), 'size' per stimarla solo dalla dimensione del file
+
+    Returns:
+    --------
+    float
+        Durata stimata in secondi (0 se il file non esiste)
+    """
+    try:
+        if method == 'header':
+            try:
+                return float(sf.info(str(audio_path)).duration)
+            except Exception:
+                pass
+        return os.path.getsize(audio_path) / FALLBACK_BYTES_PER_SECOND
+    except OSError:
+        return 0.0
+
+def simulate_makespan(costs, n_workers):
+    """
+    Simula l'esecuzione dinamica dei task: ogni task, nell'ordine dato, va al primo
+    processo libero (come con una coda condivisa da cui i processi prelevano il lavoro)
+
+    Parameters:
+    -----------
+    costs : list
+        Costo (durata) di ciascun task nell'ordine di sottomissione
+    n_workers : int
+        Numero di processi
+
+    Returns:
+    --------
+    float
+        Tempo di completamento dell'ultimo task (makespan)
+    """
+    finish_times = [0.0] * max(1, n_workers)
+    for cost in costs:
+        heapq.heappush(finish_times, heapq.heappop(finish_times) + cost)
+    return max(finish_times)
+
+def plan_chunks(costs, n_workers, chunks_per_worker=CHUNKS_PER_WORKER):
+    """
+    Ordina i task dal più lungo al più corto (LPT) e li raggruppa in blocchi di costo simile
+
+    I file lunghi restano da soli all'inizio della coda, mentre quelli brevi vengono
+    raggruppati; i processi prelevano un blocco alla volta dalla coda condivisa, quindi
+    chi finisce prima "ruba" il lavoro restante e la coda finale resta corta.
+
+    Parameters:
+    -----------
+    costs : list
+        Costo stimato di ciascun task
+    n_workers : int
+        Numero di processi
+    chunks_per_worker : int
+        Numero di blocchi desiderato per processo
+
+    Returns:
+    --------
+    list
+        Blocchi in ordine di sottomissione, come liste di posizioni dei task
+    """
+    order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+    target = sum(costs) / max(1, n_workers * chunks_per_worker)
+
+    chunks = []
+    current, current_cost = [], 0.0
+    for i in order:
+        current.append(i)
+        current_cost += costs[i]
+        if current_cost >= target:
+            chunks.append(current)
+            current, current_cost = [], 0.0
+    if current:
+        chunks.append(current)
+    return chunks
+
+def fit_cost_model(costs, task_times):
+    """
+    Stima il tempo di calcolo come a + b * costo (overhead fisso per file più una parte
+    proporzionale alla durata), con i minimi quadrati sui tempi misurati
+
+    Parameters:
+    -----------
+    costs : list
+        Costo stimato di ciascun task
+    task_times : list
+        Tempo di calcolo effettivo di ciascun task (secondi)
+
+    Returns:
+    --------
+    tuple
+        Coefficienti (a, b), entrambi non negativi
+    """
+    costs = np.asarray(costs, dtype=float)
+    task_times = np.asarray(task_times, dtype=float)
+    if len(costs) >= 2 and np.ptp(costs) > 0:
+        b, a = np.polyfit(costs, task_times, 1)
+        if a >= 0 and b >= 0:
+            return float(a), float(b)
+    total_cost = costs.sum()
+    return 0.0, float(task_times.sum() / total_cost) if total_cost > 0 else 0.0
+
+def load_cost_model(model_path, key):
+    """
+    Carica il modello di costo adattato nelle esecuzioni precedenti
+
+    Parameters:
+    -----------
+    model_path : str o Path
+        File JSON dei modelli di costo
+    key : str
+        Configurazione dell'estrazione (profilo, streaming, stima del costo)
+
+    Returns:
+    --------
+    tuple o None
+        Coefficienti (a, b) di fit_cost_model, None se non ci sono esecuzioni precedenti
+    """
+    try:
+        with open(model_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(key)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Impossibile leggere il modello di costo {model_path}: {e}")
+        return None
+    if not entry:
+        return None
+    return float(entry['seconds_per_file']), float(entry['seconds_per_audio_second'])
+
+def save_cost_model(model_path, key, cost_model, n_files):
+    """
+    Salva in modo atomico il modello di costo adattato in questa esecuzione
+
+    Parameters:
+    -----------
+    model_path : str o Path
+        File JSON dei modelli di costo
+    key : str
+        Configurazione dell'estrazione (profilo, streaming, stima del costo)
+    cost_model : tuple
+        Coefficienti (a, b) di fit_cost_model
+    n_files : int
+        Numero di file su cui è stato adattato
+    """
+    try:
+        with open(model_path, 'r', encoding='utf-8') as f:
+            models = json.load(f)
+    except (OSError, ValueError):
+        models = {}
+    models[key] = {'seconds_per_file': cost_model[0], 'seconds_per_audio_second': cost_model[1],
+                   'n_files': n_files}
+    tmp_path = f"{model_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(models, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, model_path)
+
+def predict_makespan(costs, chunks, n_workers, cost_model):
+    """
+    Makespan previsto prima dell'esecuzione, con un modello di costo già noto
+
+    Parameters:
+    -----------
+    costs : list
+        Costo stimato di ciascun task, nell'ordine originale dei task
+    chunks : list
+        Blocchi in ordine di sottomissione, come liste di posizioni dei task (None per
+        sottomettere i task uno alla volta nell'ordine originale)
+    n_workers : int
+        Numero di processi
+    cost_model : tuple
+        Coefficienti (a, b) di fit_cost_model
+
+    Returns:
+    --------
+    float
+        Makespan previsto in secondi
+    """
+    a, b = cost_model
+    predicted = [a + b * cost for cost in costs]
+    if chunks is None:
+        return simulate_makespan(predicted, n_workers)
+    return simulate_makespan([sum(predicted[i] for i in chunk) for chunk in chunks], n_workers)
+
+def schedule_report(costs, chunks, task_times, n_workers, wall_time, cost_model=None, fit_mask=None):
+    """
+    Confronta il makespan previsto prima dell'esecuzione con quello effettivo
+
+    Il costo stimato (secondi di audio) viene convertito in secondi di calcolo con il
+    modello a + b * costo (vedi fit_cost_model): la previsione usa il modello adattato
+    nelle esecuzioni precedenti, mentre il modello adattato ai tempi di questa esecuzione
+    dà solo un makespan a posteriori, che misura la bontà della pianificazione LPT e
+    viene salvato per prevedere l'esecuzione successiva. Il modello è adattato solo sui
+    task indicati da fit_mask: i file letti dalla cache o falliti subito non misurano il
+    costo di estrazione.
+
+    Parameters:
+    -----------
+    costs : list
+        Costo stimato di ciascun task, nell'ordine originale dei task
+    chunks : list
+        Blocchi in ordine di sottomissione, come liste di posizioni dei task
+    task_times : list
+        Tempo di calcolo effettivo di ciascun task (secondi), nell'ordine originale
+    n_workers : int
+        Numero di processi
+    wall_time : float
+        Tempo reale trascorso per l'estrazione (secondi)
+    cost_model : tuple, optional
+        Coefficienti (a, b) adattati nelle esecuzioni precedenti (None se non disponibili)
+    fit_mask : list, optional
+        Per ciascun task, True se il suo tempo va usato per adattare il modello (tutti se None)
+
+    Returns:
+    --------
+    dict
+        Makespan previsto (ordine originale e LPT, NaN senza esecuzioni precedenti),
+        a posteriori (NaN con meno di MIN_COST_MODEL_FILES task adattabili), effettivo
+        e limite inferiore
+    """
+    fit_mask = np.ones(len(costs), dtype=bool) if fit_mask is None else np.asarray(fit_mask, dtype=bool)
+    fitted_files = int(fit_mask.sum())
+    if fitted_files >= MIN_COST_MODEL_FILES:
+        fitted = fit_cost_model(np.asarray(costs, dtype=float)[fit_mask],
+                                np.asarray(task_times, dtype=float)[fit_mask])
+    else:
+        fitted = (float('nan'), float('nan'))
+    busy_time = float(sum(task_times))
+    return {
+        'n_workers': n_workers,
+        'estimated_audio_seconds': float(sum(costs)),
+        'busy_seconds': busy_time,
+        'seconds_per_file': fitted[0],
+        'seconds_per_audio_second': fitted[1],
+        'fitted_files': fitted_files,
+        'predicted_makespan_metadata_order': predict_makespan(costs, None, n_workers, cost_model)
+                                             if cost_model else float('nan'),
+        'predicted_makespan': predict_makespan(costs, chunks, n_workers, cost_model) if cost_model else float('nan'),
+        'fitted_makespan': predict_makespan(costs, chunks, n_workers, fitted)
+                           if fitted_files >= MIN_COST_MODEL_FILES else float('nan'),
+        'actual_makespan': wall_time,
+        'lower_bound': busy_time / max(1, n_workers)
+    }
+
+def print_schedule_report(report):
+    """
+    Stampa il confronto tra makespan previsto ed effettivo
+
+    Parameters:
+    -----------
+    report : dict
+        Dizionario restituito da schedule_report
+    """
+    print("\nPianificazione dei processi:")
+    print(f"  Processi: {report['n_workers']}, audio stimato: {report['estimated_audio_seconds']:.0f} s, "
+          f"tempo di calcolo totale: {report['busy_seconds']:.1f} s")
+    if np.isnan(report['predicted_makespan']):
+        print("  Makespan previsto: n/d (nessun modello di costo dalle esecuzioni precedenti)")
+    else:
+        print(f"  Makespan previsto (ordine dei metadati): {report['predicted_makespan_metadata_order']:.1f} s")
+        print(f"  Makespan previsto (dal più lungo al più corto): {report['predicted_makespan']:.1f} s")
+    if np.isnan(report['fitted_makespan']):
+        print(f"  Makespan a posteriori: n/d (solo {report['fitted_files']} file estratti senza cache)")
+    else:
+        print(f"  Makespan a posteriori (modello adattato a {report['fitted_files']} file estratti): "
+              f"{report['fitted_makespan']:.1f} s")
+    print(f"  Makespan effettivo: {report['actual_makespan']:.1f} s "
+          f"(limite inferiore {report['lower_bound']:.1f} s)")
@@ -0,0 +1,204 @@
+import numpy as np
+import librosa
+
+from tempo_estimation import estimate_tempo
+
+
+class SpectralPlan:
+    """
+    Piano spettrale condiviso per un singolo brano.
+
+    Calcola lo spettrogramma di ampiezza una sola volta e ne deriva, su richiesta,
+    tutti i descrittori spettrali e gli MFCC. Ogni rappresentazione intermedia
+    (spettrogramma di potenza, mel, chroma, inviluppo di onset, ...) viene calcolata
+    alla prima richiesta e poi riutilizzata, evitando FFT ridondanti.
+
+    Parameters:
+    -----------
+    y : np.ndarray
+        Segnale audio mono
+    sr : int
+        Frequenza di campionamento del segnale
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    center : bool
+        Se True i frame sono centrati (padding ai bordi, come librosa); False per i
+        blocchi dell'estrazione in streaming, i cui frame sono già contigui
+    top_db_ref : float, optional
+        Livello massimo (dB) da cui misurare la soglia di 80 dB del mel in dB
+        (None per usare il massimo del segnale, come librosa.power_to_db)
+    tempo_options : dict, optional
+        Opzioni della stima del tempo (method, window, downsample), vedi
+        tempo_estimation.estimate_tempo
+    contrast_bands : int
+        Numero di bande del contrasto spettrale (la banda più alta deve restare
+        sotto la frequenza di Nyquist)
+    """
+
+    def __init__(self, y, sr, n_fft=2048, hop_length=512, center=True, top_db_ref=None, tempo_options=None,
+                 contrast_bands=6):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.center = center
+        self.top_db_ref = top_db_ref
+        self.tempo_options = tempo_options or {}
+        self.contrast_bands = contrast_bands
+        self._cache = {}
+
+    def _get(self, name, compute):
+        """
+        Restituisce il valore in cache per `name`, calcolandolo alla prima richiesta
+        """
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    # --- Rappresentazioni intermedie ---
+
+    @property
+    def magnitude(self):
+        """Spettrogramma di ampiezza |STFT|"""
+        return self._get('magnitude', lambda: np.abs(
+            librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length, center=self.center)))
+
+    @property
+    def power(self):
+        """Spettrogramma di potenza |STFT|^2"""
+        return self._get('power', lambda: self.magnitude ** 2)
+
+    @property
+    def mel(self):
+        """Spettrogramma mel (potenza)"""
+        return self._get('mel', lambda: librosa.feature.melspectrogram(
+            S=self.power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    @property
+    def log_mel(self):
+        """Spettrogramma mel in dB"""
+        return self._get('log_mel', self._compute_log_mel)
+
+    def _compute_log_mel(self):
+        if self.top_db_ref is None:
+            return librosa.power_to_db(self.mel)
+        return np.maximum(librosa.power_to_db(self.mel, top_db=None), self.top_db_ref - 80.0)
+
+    @property
+    def chroma(self):
+        """Chromagramma (12 classi di altezza) derivato dallo spettrogramma di potenza"""
+        return self._get('chroma', lambda: librosa.feature.chroma_stft(
+            S=self.power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    @property
+    def onset_envelope(self):
+        """Inviluppo di onset calcolato dal mel in dB, come in librosa.beat.beat_track"""
+        return self._get('onset_envelope', lambda: librosa.onset.onset_strength(
+            S=self.log_mel, sr=self.sr, hop_length=self.hop_length, aggregate=np.median,
+            center=self.center))
+
+    def mfcc(self, n_mfcc=13):
+        """
+        Coefficienti MFCC derivati dal mel in cache
+
+        Parameters:
+        -----------
+        n_mfcc : int
+            Numero di coefficienti da calcolare
+
+        Returns:
+        --------
+        np.ndarray
+            Matrice (n_mfcc, n_frame) dei coefficienti
+        """
+        return self._get(f'mfcc_{n_mfcc}', lambda: librosa.feature.mfcc(
+            S=self.log_mel, n_mfcc=n_mfcc))
+
+    # --- Descrittori per frame ---
+
+    @property
+    def rms(self):
+        """Energia RMS per frame (dominio del tempo, nessuna FFT)"""
+        return self._get('rms', lambda: librosa.feature.rms(
+            y=self.y, frame_length=self.n_fft, hop_length=self.hop_length, center=self.center)[0])
+
+    @property
+    def zero_crossing_rate(self):
+        """Tasso di zero-crossing per frame (dominio del tempo, nessuna FFT)"""
+        return self._get('zero_crossing_rate', lambda: librosa.feature.zero_crossing_rate(
+            self.y, frame_length=self.n_fft, hop_length=self.hop_length, center=self.center)[0])
+
+    @property
+    def spectral_centroid(self):
+        """Centroide spettrale per frame"""
+        return self._get('spectral_centroid', lambda: librosa.feature.spectral_centroid(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0])
+
+    @property
+    def spectral_rolloff(self):
+        """Rolloff spettrale per frame"""
+        return self._get('spectral_rolloff', lambda: librosa.feature.spectral_rolloff(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0])
+
+    @property
+    def spectral_bandwidth(self):
+        """Bandwidth spettrale per frame"""
+        return self._get('spectral_bandwidth', lambda: librosa.feature.spectral_bandwidth(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)[0])
+
+    @property
+    def spectral_flatness(self):
+        """Flatness spettrale per frame"""
+        return self._get('spectral_flatness', lambda: librosa.feature.spectral_flatness(
+            S=self.magnitude, n_fft=self.n_fft, hop_length=self.hop_length)[0])
+
+    @property
+    def spectral_contrast(self):
+        """Contrasto spettrale (bande x frame)"""
+        return self._get('spectral_contrast', lambda: librosa.feature.spectral_contrast(
+            S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length,
+            n_bands=self.contrast_bands))
+
+    @property
+    def spectral_flux(self):
+        """Differenza dello spettrogramma di ampiezza tra frame consecutivi"""
+        return self._get('spectral_flux', lambda: np.diff(self.magnitude, axis=1))
+
+    def tempo(self):
+        """
+        Tempo stimato (BPM) dall'inviluppo di onset in cache, secondo tempo_options
+
+        Con le opzioni predefinite il BPM coincide con quello di librosa.beat.beat_track,
+        senza però collocare i singoli beat.
+
+        Returns:
+        --------
+        np.ndarray
+            Array di un elemento con il tempo in BPM
+        """
+        return self._get('tempo', lambda: estimate_tempo(
+            self.onset_envelope, self.sr, self.hop_length, **self.tempo_options))
+
+    # --- Riduzioni sui frame ---
+    # Le stesse riduzioni sono offerte da streaming.StreamingPlan, così che gli estrattori
+    # funzionino sia sul segnale intero sia in streaming a memoria costante.
+
+    def descriptor(self, name):
+        """
+        Restituisce il descrittore per frame con il nome indicato ('mfcc' per i 13 MFCC)
+        """
+        return self.mfcc() if name == 'mfcc' else getattr(self, name)
+
+    def mean(self, name, axis=None):
+        """Media del descrittore su tutti i valori (axis=None) o per riga (axis=1)"""
+        return np.mean(self.descriptor(name), axis=axis)
+
+    def std(self, name):
+        """Deviazione standard del descrittore su tutti i valori"""
+        return np.std(self.descriptor(name))
+
+    def sum(self, name, axis=1):
+        """Somma del descrittore sui frame (per riga)"""
+        return np.sum(self.descriptor(name), axis=axis)
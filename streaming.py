@@ -0,0 +1,389 @@
+import numpy as np
+import librosa
+import soundfile as sf
+import soxr
+
+from spectral_plan import SpectralPlan
+from tempo_estimation import estimate_tempo
+
+# Frequenza di campionamento di analisi (la stessa di librosa.load)
+TARGET_SR = 22050
+
+# Numero di frame analizzati per blocco (~12 secondi a 22050 Hz con hop di 512)
+BLOCK_FRAMES = 512
+
+# Campioni decodificati di nuovo prima di ogni lettura di un file MPEG: con libsndfile
+# (mpg123) le letture consecutive perdono il bit reservoir dei frame precedenti e ai bordi
+# compaiono discontinuità; riposizionarsi 10 frame (da 1152 campioni) prima dell'inizio
+# della lettura dà lo stesso segnale della lettura per intero
+MPEG_PRIMING_SAMPLES = 10 * 1152
+
+# Descrittori per frame accumulati durante lo streaming
+STREAMED_DESCRIPTORS = ['rms', 'zero_crossing_rate', 'spectral_centroid', 'spectral_rolloff',
+                        'spectral_bandwidth', 'spectral_flatness', 'spectral_contrast', 'chroma', 'mfcc']
+
+class RunningStats:
+    """
+    Media, varianza e somma per riga di un descrittore, aggiornate blocco per blocco
+
+    Usa l'aggiornamento a blocchi di Welford/Chan, numericamente stabile, così che la
+    memoria non dipenda dal numero di frame del brano.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean_ = None
+        self.m2 = None
+
+    def update(self, values):
+        """
+        Aggiunge un blocco di frame
+
+        Parameters:
+        -----------
+        values : np.ndarray
+            Matrice (n_righe, n_frame) oppure vettore (n_frame,) dei valori del blocco
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        n = values.shape[1]
+        if n == 0:
+            return
+        block_mean = values.mean(axis=1)
+        block_m2 = ((values - block_mean[:, None]) ** 2).sum(axis=1)
+        if self.count == 0:
+            self.count, self.mean_, self.m2 = n, block_mean, block_m2
+            return
+        total = self.count + n
+        delta = block_mean - self.mean_
+        self.mean_ = self.mean_ + delta * n / total
+        self.m2 = self.m2 + block_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def mean(self, axis=None):
+        """Media su tutti i valori (axis=None) o per riga (axis=1)"""
+        return self.mean_ if axis is not None else float(np.mean(self.mean_))
+
+    def std(self):
+        """Deviazione standard su tutti i valori (righe con lo stesso numero di frame)"""
+        second_moment = np.mean(self.m2 / self.count + self.mean_ ** 2)
+        return float(np.sqrt(max(second_moment - np.mean(self.mean_) ** 2, 0.0)))
+
+    def sum(self, axis=1):
+        """Somma per riga sui frame"""
+        return self.mean_ * self.count
+
+def iter_audio_blocks(audio_path, sr=TARGET_SR, n_fft=2048, hop_length=512,
+                      block_frames=BLOCK_FRAMES, duration=None, quality='HQ'):
+    """
+    Decodifica un file audio a blocchi, ricampionandolo in streaming a sr
+
+    Ogni blocco contiene frame interi e contigui: i blocchi consecutivi si sovrappongono
+    di n_fft - hop_length campioni, così che i frame siano gli stessi dell'analisi del
+    segnale intero (senza padding centrale). La memoria occupata è quella di un blocco.
+    Per i file MPEG ogni lettura riparte MPEG_PRIMING_SAMPLES campioni prima, così che il
+    segnale decodificato sia identico a quello letto per intero.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    sr : int
+        Frequenza di campionamento di analisi
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    block_frames : int
+        Numero di frame per blocco
+    duration : float, optional
+        Durata massima in secondi da analizzare (None per l'intero file)
+    quality : str
+        Qualità del ricampionatore soxr ('VHQ', 'HQ', 'MQ', 'LQ' o 'QQ')
+
+    Yields:
+    -------
+    np.ndarray
+        Blocco mono float32 di n_fft + (k - 1) * hop_length campioni
+    """
+    block_samples = n_fft + (block_frames - 1) * hop_length
+    max_samples = int(duration * sr) if duration else None
+    buffer = np.zeros(0, dtype=np.float32)
+    emitted = 0
+
+    with sf.SoundFile(audio_path) as f:
+        resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype='float32', quality=quality) \
+            if f.samplerate != sr else None
+        read_frames = max(1, int(np.ceil(block_frames * hop_length * f.samplerate / sr)))
+        priming = MPEG_PRIMING_SAMPLES if f.subtype.startswith('MPEG') else 0
+        position = 0
+
+        while True:
+            if priming:
+                start = max(0, position - priming)
+                f.seek(start)
+                data = f.read(read_frames + position - start, dtype='float32', always_2d=True)[position - start:]
+            else:
+                data = f.read(read_frames, dtype='float32', always_2d=True)
+            position += read_frames
+            last = len(data) < read_frames
+            y = data.mean(axis=1)
+            if resampler is not None:
+                y = resampler.resample_chunk(y, last=last)
+            buffer = np.concatenate([buffer, y])
+            if max_samples is not None and emitted + len(buffer) >= max_samples:
+                buffer = buffer[:max_samples - emitted]
+                last = True
+
+            while len(buffer) >= block_samples:
+                yield buffer[:block_samples]
+                consumed = block_frames * hop_length
+                buffer = buffer[consumed:]
+                emitted += consumed
+
+            if last:
+                # Ultimo blocco con i frame interi rimasti
+                if len(buffer) >= n_fft:
+                    n_frames = 1 + (len(buffer) - n_fft) // hop_length
+                    yield buffer[:n_fft + (n_frames - 1) * hop_length]
+                return
+
+def peak_mel_db(audio_path, sr=TARGET_SR, n_fft=2048, hop_length=512, block_frames=BLOCK_FRAMES,
+                duration=None, quality='HQ'):
+    """
+    Massimo (dB) dello spettrogramma mel dell'intero file, calcolato a blocchi
+
+    È il livello da cui librosa.power_to_db misura la soglia di 80 dB: calcolarlo con
+    una prima passata permette di applicare a ogni blocco la stessa soglia dell'analisi
+    del segnale intero, invece di una soglia che dipende dai blocchi già visti.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    sr : int
+        Frequenza di campionamento di analisi
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    block_frames : int
+        Numero di frame per blocco
+    duration : float, optional
+        Durata massima in secondi da analizzare (None per l'intero file)
+    quality : str
+        Qualità del ricampionatore soxr ('VHQ', 'HQ', 'MQ', 'LQ' o 'QQ')
+
+    Returns:
+    --------
+    float
+        Massimo del mel in dB (-inf se il file non contiene frame interi)
+    """
+    peak = 0.0
+    for y in iter_audio_blocks(audio_path, sr, n_fft, hop_length, block_frames, duration, quality):
+        peak = max(peak, float(SpectralPlan(y, sr, n_fft, hop_length, center=False).mel.max()))
+    return float(librosa.power_to_db(peak)) if peak > 0 else -np.inf
+
+def stream_decoding_error(audio_path, sr=TARGET_SR, n_fft=2048, hop_length=512,
+                          block_frames=BLOCK_FRAMES, quality='HQ', res_type='soxr_hq'):
+    """
+    Massima differenza tra il segnale decodificato a blocchi e quello di librosa.load
+
+    Verifica che la decodifica in streaming (in particolare degli MP3) dia lo stesso
+    segnale della lettura per intero usata dall'estrazione non in streaming.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    sr : int
+        Frequenza di campionamento di analisi
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    block_frames : int
+        Numero di frame per blocco
+    quality : str
+        Qualità del ricampionatore soxr usato in streaming
+    res_type : str
+        Ricampionatore usato da librosa.load
+
+    Returns:
+    --------
+    float
+        Massima differenza assoluta campione per campione
+    """
+    y, _ = librosa.load(audio_path, sr=sr, res_type=res_type)
+    blocks = list(iter_audio_blocks(audio_path, sr, n_fft, hop_length, block_frames, quality=quality))
+    if not blocks:
+        return 0.0
+    # I blocchi consecutivi si sovrappongono di n_fft - hop_length campioni
+    streamed = np.concatenate([blocks[0]] + [block[n_fft - hop_length:] for block in blocks[1:]])
+    n = min(len(streamed), len(y))
+    return float(np.abs(streamed[:n] - y[:n]).max())
+
+# Numero di frame del tempogramma calcolati per volta
+TEMPOGRAM_CHUNK_FRAMES = 4096
+
+def mean_tempogram(onset_envelope, sr=TARGET_SR, hop_length=512, ac_size=8.0,
+                   chunk_frames=TEMPOGRAM_CHUNK_FRAMES):
+    """
+    Media temporale del tempogramma, calcolata a blocchi di frame
+
+    Equivale a librosa.feature.tempogram(...).mean(axis=1) calcolato sullo stesso
+    inviluppo di onset (a meno degli arrotondamenti), ma senza mai costruire il
+    tempogramma completo (win_length x n_frame), che per un mix di un'ora occupa
+    diversi GB.
+
+    Parameters:
+    -----------
+    onset_envelope : np.ndarray
+        Inviluppo di onset
+    sr : int
+        Frequenza di campionamento
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    ac_size : float
+        Durata (secondi) della finestra di autocorrelazione, come in librosa.feature.tempo
+    chunk_frames : int
+        Numero di frame del tempogramma calcolati per volta
+
+    Returns:
+    --------
+    np.ndarray
+        Tempogramma medio (win_length, 1), da passare a librosa.feature.tempo(tg=...)
+    """
+    win_length = librosa.time_to_frames(ac_size, sr=sr, hop_length=hop_length).item()
+    n_frames = len(onset_envelope)
+    # Stesso padding centrato di librosa.feature.tempogram
+    padded = np.pad(onset_envelope, win_length // 2, mode='linear_ramp', end_values=[0, 0])
+    total = np.zeros(win_length)
+    for start in range(0, n_frames, chunk_frames):
+        stop = min(n_frames, start + chunk_frames)
+        total += librosa.feature.tempogram(
+            onset_envelope=padded[start:stop + win_length - 1], sr=sr, hop_length=hop_length,
+            win_length=win_length, center=False).sum(axis=1)
+    return (total / n_frames)[:, np.newaxis]
+
+class StreamingPlan:
+    """
+    Riduzioni dei descrittori spettrali calcolate in streaming a memoria costante
+
+    Offre le stesse riduzioni di SpectralPlan (mean, std, sum, tempo), ma
+    elaborando il file a blocchi: ogni blocco passa per uno SpectralPlan non centrato
+    e i suoi descrittori vengono accumulati in RunningStats. L'unico dato che cresce
+    con la durata è l'inviluppo di onset (un float per frame), necessario al tempo.
+
+    Parameters:
+    -----------
+    audio_path : str
+        Percorso al file audio
+    sr : int
+        Frequenza di campionamento di analisi
+    n_fft : int
+        Dimensione della finestra FFT
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    block_frames : int
+        Numero di frame per blocco
+    duration : float, optional
+        Durata massima in secondi da analizzare (None per l'intero file)
+    descriptors : iterable, optional
+        Descrittori da accumulare, tra STREAMED_DESCRIPTORS, 'spectral_flux' e 'tempo'
+        (None per tutti); gli stadi non necessari (STFT, mel, onset) non vengono calcolati
+    tempo_options : dict, optional
+        Opzioni della stima del tempo, vedi tempo_estimation.estimate_tempo
+    quality : str
+        Qualità del ricampionatore soxr ('VHQ', 'HQ', 'MQ', 'LQ' o 'QQ')
+    contrast_bands : int
+        Numero di bande del contrasto spettrale
+    """
+
+    def __init__(self, audio_path, sr=TARGET_SR, n_fft=2048, hop_length=512,
+                 block_frames=BLOCK_FRAMES, duration=None, descriptors=None, tempo_options=None,
+                 quality='HQ', contrast_bands=6):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.tempo_options = tempo_options or {}
+        if descriptors is None:
+            descriptors = STREAMED_DESCRIPTORS + ['spectral_flux', 'tempo']
+        descriptors = set(descriptors)
+        self.stats = {name: RunningStats() for name in STREAMED_DESCRIPTORS + ['spectral_flux']
+                      if name in descriptors}
+        self.n_frames = 0
+        self.onset_envelope = None
+        # Il mel in dB serve solo a MFCC e onset: la sua soglia di 80 dB è misurata, come
+        # nell'analisi del segnale intero, dal massimo dell'intero file (prima passata)
+        top_db_ref = None
+        if 'mfcc' in descriptors or 'tempo' in descriptors:
+            top_db_ref = peak_mel_db(audio_path, sr, n_fft, hop_length, block_frames, duration, quality)
+
+        onset_blocks = []
+        last_magnitude = None
+        last_log_mel = None
+
+        for y in iter_audio_blocks(audio_path, sr, n_fft, hop_length, block_frames, duration, quality):
+            plan = SpectralPlan(y, sr, n_fft, hop_length, center=False, top_db_ref=top_db_ref,
+                                contrast_bands=contrast_bands)
+
+            for name in STREAMED_DESCRIPTORS:
+                if name in self.stats:
+                    self.stats[name].update(plan.descriptor(name))
+
+            # Flusso spettrale e onset richiedono l'ultimo frame del blocco precedente
+            if 'spectral_flux' in self.stats:
+                magnitude = plan.magnitude
+                if last_magnitude is not None:
+                    magnitude = np.hstack([last_magnitude, magnitude])
+                self.stats['spectral_flux'].update(np.diff(magnitude, axis=1))
+                last_magnitude = plan.magnitude[:, -1:]
+
+            if 'tempo' in descriptors:
+                log_mel = plan.log_mel
+                if last_log_mel is not None:
+                    onset = librosa.onset.onset_strength(
+                        S=np.hstack([last_log_mel, log_mel]), sr=sr, hop_length=hop_length,
+                        aggregate=np.median, center=False)[1:]
+                else:
+                    onset = plan.onset_envelope
+                onset_blocks.append(onset)
+                last_log_mel = log_mel[:, -1:]
+
+            # I blocchi contengono solo frame interi e contigui
+            self.n_frames += 1 + (len(y) - n_fft) // hop_length
+
+        if self.n_frames == 0:
+            raise ValueError(f"File audio troppo corto per l'analisi in streaming: {audio_path}")
+        if onset_blocks:
+            self.onset_envelope = np.concatenate(onset_blocks)
+
+    @property
+    def duration(self):
+        """Durata analizzata in secondi"""
+        return librosa.frames_to_time(self.n_frames, sr=self.sr, hop_length=self.hop_length)
+
+    def tempo(self):
+        """
+        Tempo stimato (BPM) secondo tempo_options; i metodi basati sul tempogramma
+        usano il tempogramma medio calcolato a blocchi
+
+        Returns:
+        --------
+        np.ndarray
+            Array di un elemento con il tempo in BPM
+        """
+        return estimate_tempo(self.onset_envelope, self.sr, self.hop_length, **self.tempo_options,
+                              tg=lambda envelope: mean_tempogram(envelope, self.sr, self.hop_length))
+
+    def mean(self, name, axis=None):
+        """Media del descrittore su tutti i valori (axis=None) o per riga (axis=1)"""
+        return self.stats[name].mean(axis)
+
+    def std(self, name):
+        """Deviazione standard del descrittore su tutti i valori"""
+        return self.stats[name].std()
+
+    def sum(self, name, axis=1):
+        """Somma del descrittore sui frame (per riga)"""
+        return self.stats[name].sum(axis)
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+# Intervallo (secondi) con cui il supervisore controlla timeout e processi terminati
+POLL_INTERVAL = 0.5
+
+# Processi consecutivi morti senza aver iniziato alcun task dopo i quali il pool si arrende
+# (ad esempio un initializer che fa terminare il processo), invece di sostituirli all'infinito
+MAX_FAILED_STARTS = 3
+
+def _worker_main(func, initializer, initargs, conn):
+    """
+    Ciclo di un processo supervisionato: riceve blocchi di task, segnala l'inizio di ogni
+    task e ne restituisce il risultato (o l'errore) sulla propria pipe; un errore di
+    initializer viene segnalato al supervisore invece di far terminare il processo
+    """
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except Exception as e:
+            conn.send(('init_error', None, (type(e).__name__, str(e) or repr(e))))
+            return
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            break
+        for task_id, task in chunk:
+            conn.send(('start', task_id, None))
+            start = time.perf_counter()
+            try:
+                result = func(task)
+                conn.send(('ok', task_id, (result, time.perf_counter() - start)))
+            except Exception as e:
+                conn.send(('error', task_id, (type(e).__name__, str(e) or repr(e), time.perf_counter() - start)))
+        conn.send(('idle', None, None))
+
+class SupervisedPool:
+    """
+    Pool di processi con isolamento dei guasti
+
+    A differenza di multiprocessing.Pool, ogni processo ha una propria pipe e il
+    supervisore sa sempre quale task sta eseguendo e da quanto tempo. Un task che supera
+    il timeout fa terminare il processo; un processo che muore (crash nativo del decoder)
+    viene rilevato; in entrambi i casi il task viene segnalato come fallito, i task non
+    ancora iniziati del suo blocco tornano in coda e il processo viene sostituito. Se
+    initializer solleva un'eccezione, o se MAX_FAILED_STARTS processi consecutivi muoiono
+    prima di iniziare un task, run solleva RuntimeError invece di sostituirli ancora.
+
+    Parameters:
+    -----------
+    n_workers : int
+        Numero di processi
+    func : callable
+        Funzione (di modulo, serializzabile) applicata a ogni task
+    initializer : callable, optional
+        Funzione eseguita all'avvio di ogni processo
+    initargs : tuple
+        Argomenti di initializer
+    timeout : float, optional
+        Tempo massimo (secondi) per un singolo task, None per nessun limite
+    """
+
+    def __init__(self, n_workers, func, initializer=None, initargs=(), timeout=None):
+        self.n_workers = max(1, n_workers)
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.restarts = 0
+        self._workers = {}
+        self._failed_starts = 0
+
+    def _start_worker(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_worker_main, args=(self.func, self.initializer, self.initargs, child_conn), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[parent_conn] = {'process': process, 'remaining': None, 'current': None, 'dead': False,
+                                      'started': False}
+
+    def _stop_worker(self, conn):
+        state = self._workers.pop(conn)
+        process = state['process']
+        if process.is_alive():
+            process.terminate()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        conn.close()
+        return state
+
+    def run(self, chunks):
+        """
+        Esegue i task e ne restituisce i risultati man mano che sono disponibili
+
+        Parameters:
+        -----------
+        chunks : list
+            Blocchi di task in ordine di sottomissione; ogni blocco è una lista di
+            coppie (task_id, task)
+
+        Yields:
+        -------
+        tuple
+            (task_id, status, payload, elapsed): status è 'ok' con payload il risultato,
+            oppure 'error', 'timeout' o 'crash' con payload (error_type, detail)
+        """
+        pending = deque(chunks)
+        try:
+            for _ in range(min(self.n_workers, len(pending))):
+                self._start_worker()
+
+            while pending or any(state['remaining'] is not None for state in self._workers.values()):
+                # Assegna un blocco a ogni processo libero
+                for conn, state in list(self._workers.items()):
+                    if state['remaining'] is None and pending:
+                        chunk = pending.popleft()
+                        state['remaining'] = deque(chunk)
+                        try:
+                            conn.send(list(chunk))
+                        except OSError:
+                            # Il processo è già morto: il blocco torna in coda con il controllo sotto
+                            state['dead'] = True
+
+                for conn in wait(list(self._workers), timeout=POLL_INTERVAL):
+                    state = self._workers[conn]
+                    try:
+                        kind, task_id, payload = conn.recv()
+                    except (EOFError, OSError):
+                        # Il processo è morto: viene gestito dal controllo sotto
+                        state['dead'] = True
+                        continue
+                    if kind == 'init_error':
+                        error_type, detail = payload
+                        raise RuntimeError(f"Inizializzazione del processo fallita: {error_type}: {detail}")
+                    if kind == 'start':
+                        state['current'] = (task_id, time.monotonic())
+                        state['started'] = True
+                        self._failed_starts = 0
+                    elif kind == 'idle':
+                        state['remaining'] = None
+                    else:
+                        state['current'] = None
+                        state['remaining'] = deque(item for item in state['remaining'] if item[0] != task_id)
+                        if kind == 'ok':
+                            result, elapsed = payload
+                            yield task_id, 'ok', result, elapsed
+                        else:
+                            error_type, detail, elapsed = payload
+                            yield task_id, 'error', (error_type, detail), elapsed
+
+                # Controlla timeout e processi terminati
+                now = time.monotonic()
+                for conn, state in list(self._workers.items()):
+                    current = state['current']
+                    timed_out = bool(self.timeout) and current is not None and now - current[1] > self.timeout
+                    # Un processo terminato è considerato in crash solo dopo averne letto tutti i messaggi
+                    dead = state.get('dead') or (not state['process'].is_alive() and not conn.poll())
+                    if not timed_out and not dead:
+                        continue
+
+                    exitcode = state['process'].exitcode
+                    state = self._stop_worker(conn)
+                    if not state['started']:
+                        self._failed_starts += 1
+                        if self._failed_starts >= MAX_FAILED_STARTS:
+                            raise RuntimeError(f"{self._failed_starts} processi consecutivi terminati prima di "
+                                               f"iniziare un task (ultimo codice di uscita {exitcode})")
+                    self.restarts += 1
+                    if current is not None:
+                        task_id, started = current
+                        if timed_out:
+                            failure = ('timeout', ('Timeout', f"superato il limite di {self.timeout:.0f} s"))
+                        else:
+                            failure = ('crash', ('WorkerCrash', f"processo terminato con codice {exitcode}"))
+                        yield task_id, failure[0], failure[1], now - started
+                    # I task non ancora iniziati del blocco tornano in testa alla coda
+                    if state['remaining']:
+                        unstarted = [item for item in state['remaining'] if current is None or item[0] != current[0]]
+                        if unstarted:
+                            pending.appendleft(unstarted)
+                    if pending:
+                        self._start_worker()
+        finally:
+            for conn in list(self._workers):
+                try:
+                    conn.send(None)
+                except (OSError, ValueError):
+                    pass
+            for conn, state in list(self._workers.items()):
+                state['process'].join(1)
+                self._stop_worker(conn)
+
+def file_signature(path):
+    """
+    Firma (dimensione, mtime) di un file, usata per riprovare i file in quarantena modificati
+
+    Parameters:
+    -----------
+    path : str o Path
+        Percorso al file
+
+    Returns:
+    --------
+    list o None
+        [dimensione, mtime_ns], None se il file non esiste
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_quarantine(quarantine_path):
+    """
+    Carica l'elenco dei file in quarantena
+
+    Parameters:
+    -----------
+    quarantine_path : str o Path
+        File JSON della quarantena
+
+    Returns:
+    --------
+    dict
+        Dizionario percorso -> voce (reason, error_type, detail, signature, timestamp)
+    """
+    try:
+        with open(quarantine_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Impossibile leggere la quarantena {quarantine_path}: {e}")
+        return {}
+
+def save_quarantine(quarantine_path, quarantine):
+    """
+    Salva in modo atomico l'elenco dei file in quarantena
+
+    Parameters:
+    -----------
+    quarantine_path : str o Path
+        File JSON della quarantena
+    quarantine : dict
+        Dizionario percorso -> voce
+    """
+    tmp_path = f"{quarantine_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(quarantine, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, quarantine_path)
+
+def is_quarantined(quarantine, path):
+    """
+    Verifica se un file è in quarantena e non è stato modificato da allora
+
+    Parameters:
+    -----------
+    quarantine : dict
+        Dizionario percorso -> voce
+    path : str o Path
+        Percorso al file
+
+    Returns:
+    --------
+    bool
+        True se il file va saltato
+    """
+    entry = quarantine.get(str(path))
+    return entry is not None and entry.get('signature') == file_signature(path)
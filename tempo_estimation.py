@@ -0,0 +1,170 @@
+import numpy as np
+import librosa
+
+# Metodi di stima del tempo:
+# - 'onset': tempogramma medio dell'inviluppo di onset (stesso BPM di librosa.beat.beat_track,
+#   senza la programmazione dinamica che colloca i singoli beat)
+# - 'beat': librosa.beat.beat_track completo (riferimento)
+# - 'autocorr': autocorrelazione globale dell'inviluppo, eventualmente sottocampionato
+TEMPO_METHODS = ['onset', 'beat', 'autocorr']
+
+# Parametri della stima, gli stessi di librosa.feature.tempo
+START_BPM = 120.0
+STD_BPM = 1.0
+AC_SIZE = 8.0
+MAX_TEMPO = 320.0
+
+def central_window(onset_envelope, window, sr, hop_length):
+    """
+    Restituisce la porzione centrale dell'inviluppo di onset
+
+    Parameters:
+    -----------
+    onset_envelope : np.ndarray
+        Inviluppo di onset
+    window : float, optional
+        Durata in secondi della finestra di analisi (None per l'intero inviluppo)
+    sr : int
+        Frequenza di campionamento
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+
+    Returns:
+    --------
+    np.ndarray
+        Inviluppo limitato alla finestra centrale
+    """
+    if not window:
+        return onset_envelope
+    n_frames = max(1, int(round(window * sr / hop_length)))
+    if n_frames >= len(onset_envelope):
+        return onset_envelope
+    start = (len(onset_envelope) - n_frames) // 2
+    return onset_envelope[start:start + n_frames]
+
+def autocorrelation_tempo(onset_envelope, sr, hop_length, downsample=1):
+    """
+    Stima il tempo dal picco dell'autocorrelazione globale dell'inviluppo di onset
+
+    L'autocorrelazione viene calcolata una sola volta con la FFT sull'intero inviluppo
+    (invece che su una finestra di 8 s per ogni frame, come nel tempogramma); il picco
+    è pesato con lo stesso prior log-normale attorno a 120 BPM di librosa.feature.tempo
+    e raffinato con un'interpolazione parabolica, così che il sottocampionamento non
+    riduca la risoluzione in BPM.
+
+    Parameters:
+    -----------
+    onset_envelope : np.ndarray
+        Inviluppo di onset
+    sr : int
+        Frequenza di campionamento
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    downsample : int
+        Fattore di sottocampionamento dell'inviluppo (media su gruppi di frame)
+
+    Returns:
+    --------
+    float
+        Tempo stimato in BPM (0 se l'inviluppo è nullo)
+    """
+    downsample = max(1, int(downsample))
+    if downsample > 1:
+        n_frames = len(onset_envelope) // downsample * downsample
+        onset_envelope = onset_envelope[:n_frames].reshape(-1, downsample).mean(axis=1)
+    frame_rate = sr / (hop_length * downsample)
+
+    envelope = onset_envelope - np.mean(onset_envelope)
+    max_lag = min(len(envelope), int(np.ceil(AC_SIZE * frame_rate)))
+    if max_lag < 3:
+        return 0.0
+    ac = librosa.autocorrelate(envelope, max_size=max_lag)
+    if ac[0] <= 0:
+        return 0.0
+
+    lags = np.arange(1, max_lag)
+    bpms = 60.0 * frame_rate / lags
+    logprior = -0.5 * ((np.log2(bpms) - np.log2(START_BPM)) / STD_BPM) ** 2
+    strength = np.maximum(ac[1:] / ac[0], 0)
+    score = np.where(bpms <= MAX_TEMPO, np.log1p(1e6 * strength) + logprior, -np.inf)
+    best = int(np.argmax(score))
+
+    # Interpolazione parabolica del picco dell'autocorrelazione
+    lag = float(lags[best])
+    if 0 < best < len(lags) - 1:
+        left, center, right = ac[best], ac[best + 1], ac[best + 2]
+        denominator = left - 2 * center + right
+        if denominator < 0:
+            lag += 0.5 * (left - right) / denominator
+    return float(60.0 * frame_rate / lag)
+
+def make_tempo_options(method='onset', window=None, downsample=1):
+    """
+    Raccoglie le opzioni di stima del tempo diverse da quelle predefinite
+
+    Parameters:
+    -----------
+    method : str
+        Metodo di stima, uno di TEMPO_METHODS
+    window : float, optional
+        Durata in secondi della finestra centrale da analizzare (None per l'intero brano)
+    downsample : int
+        Fattore di sottocampionamento dell'inviluppo per il metodo 'autocorr'
+
+    Returns:
+    --------
+    dict
+        Opzioni per estimate_tempo (vuoto con i valori predefiniti, così che l'impronta
+        della cache non cambi)
+    """
+    options = {}
+    if method != 'onset':
+        options['method'] = method
+    if window:
+        options['window'] = float(window)
+    if downsample and downsample > 1:
+        options['downsample'] = int(downsample)
+    return options
+
+def estimate_tempo(onset_envelope, sr, hop_length, method='onset', window=None, downsample=1, tg=None):
+    """
+    Stima il tempo (BPM) di un brano dall'inviluppo di onset già calcolato
+
+    Parameters:
+    -----------
+    onset_envelope : np.ndarray
+        Inviluppo di onset
+    sr : int
+        Frequenza di campionamento
+    hop_length : int
+        Numero di campioni tra frame consecutivi
+    method : str
+        Metodo di stima, uno di TEMPO_METHODS
+    window : float, optional
+        Durata in secondi della finestra centrale da analizzare (None per l'intero brano)
+    downsample : int
+        Fattore di sottocampionamento dell'inviluppo per il metodo 'autocorr'
+    tg : callable, optional
+        Funzione inviluppo -> tempogramma medio, usata dai metodi 'onset' e 'beat' al posto
+        del tempogramma completo (es. streaming.mean_tempogram, a memoria costante)
+
+    Returns:
+    --------
+    np.ndarray o float
+        Array di un elemento con il tempo in BPM (0.0 se non ci sono onset, come
+        librosa.beat.beat_track)
+    """
+    if method not in TEMPO_METHODS:
+        raise ValueError(f"Metodo di stima del tempo non valido: {method} (validi: {', '.join(TEMPO_METHODS)})")
+
+    onset_envelope = central_window(onset_envelope, window, sr, hop_length)
+    if not onset_envelope.any():
+        return 0.0
+
+    if method == 'autocorr':
+        return np.array([autocorrelation_tempo(onset_envelope, sr, hop_length, downsample)])
+    if tg is not None:
+        return librosa.feature.tempo(tg=tg(onset_envelope), sr=sr, hop_length=hop_length, aggregate=None)
+    if method == 'beat':
+        return librosa.beat.beat_track(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length)[0]
+    return librosa.feature.tempo(onset_envelope=onset_envelope, sr=sr, hop_length=hop_length)
@@ -0,0 +1,381 @@
+import numpy as np
+
+# Nomi delle 12 classi di altezza (notazione con diesis)
+KEY_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Pattern delle scale (intervalli in semitoni dalla tonica)
+SCALE_PATTERNS = {
+    # Diatonic scales
+    'Major': [0, 2, 4, 5, 7, 9, 11],  # Ionian
+    'Natural Minor': [0, 2, 3, 5, 7, 8, 10],  # Aeolian
+    'Harmonic Minor': [0, 2, 3, 5, 7, 8, 11],
+    'Melodic Minor': [0, 2, 3, 5, 7, 9, 11],
+
+    # Modal scales
+    'Ionian': [0, 2, 4, 5, 7, 9, 11],  # Same as Major
+    'Dorian': [0, 2, 3, 5, 7, 9, 10],
+    'Phrygian': [0, 1, 3, 5, 7, 8, 10],
+    'Lydian': [0, 2, 4, 6, 7, 9, 11],
+    'Mixolydian': [0, 2, 4, 5, 7, 9, 10],
+    'Aeolian': [0, 2, 3, 5, 7, 8, 10],  # Same as Natural Minor
+    'Locrian': [0, 1, 3, 5, 6, 8, 10],
+
+    # Pentatonic scales
+    'Major Pentatonic': [0, 2, 4, 7, 9],
+    'Minor Pentatonic': [0, 3, 5, 7, 10],
+
+    # Other scales
+    'Blues': [0, 3, 5, 6, 7, 10],
+    'Harmonic Major': [0, 2, 4, 5, 7, 8, 11],
+    'Neapolitan Major': [0, 1, 3, 5, 7, 9, 11],
+    'Neapolitan Minor': [0, 1, 3, 5, 7, 8, 11],
+    'Hungarian Minor': [0, 2, 3, 6, 7, 8, 11],
+    'Enigmatic': [0, 1, 4, 6, 8, 10, 11],
+    'Arabic': [0, 1, 4, 5, 7, 8, 11]  # Hijaz Maqam with characteristic augmented second
+}
+
+SCALE_NAMES = list(SCALE_PATTERNS)
+
+# Scale che music21 scrive con nomi di nota diatonici (una lettera per grado);
+# le altre venivano costruite come ConcreteScale con i nomi a diesis di KEY_NAMES
+DIATONIC_SPELLED_SCALES = {
+    'Major', 'Ionian', 'Natural Minor', 'Aeolian', 'Harmonic Minor', 'Melodic Minor',
+    'Dorian', 'Phrygian', 'Lydian', 'Mixolydian', 'Locrian'
+}
+
+# Lettere delle note naturali e relative classi di altezza
+STEP_LETTERS = 'CDEFGAB'
+STEP_PITCH_CLASSES = [0, 2, 4, 5, 7, 9, 11]
+
+# Passo diatonico (lettera) di ogni classe di altezza scritta con i nomi di KEY_NAMES
+PITCH_CLASS_STEPS = [0, 0, 1, 1, 2, 3, 3, 4, 4, 5, 5, 6]
+
+# Ottava della tonica (quella implicita delle note music21 senza ottava)
+TONIC_OCTAVE = 4
+
+def build_scale_indices(scale_patterns=SCALE_PATTERNS):
+    """
+    Costruisce la tabella delle classi di altezza di tutte le coppie (tonica, scala)
+
+    Le scale più corte del pattern più lungo sono completate con l'indice 12, che punta
+    a uno zero aggiunto in coda al profilo chroma: sommarlo non cambia il punteggio.
+
+    Parameters:
+    -----------
+    scale_patterns : dict
+        Dizionario {nome scala: intervalli in semitoni dalla tonica}
+
+    Returns:
+    --------
+    tuple
+        (indices, lengths): indici di forma (12, n_scale, n_note_max) e numero di note
+        di ogni scala
+    """
+    max_notes = max(len(pattern) for pattern in scale_patterns.values())
+    indices = np.full((12, len(scale_patterns), max_notes), 12)
+    for scale_idx, pattern in enumerate(scale_patterns.values()):
+        for root in range(12):
+            indices[root, scale_idx, :len(pattern)] = (root + np.asarray(pattern)) % 12
+    lengths = np.array([len(pattern) for pattern in scale_patterns.values()])
+    return indices, lengths
+
+# Tabella precalcolata 12 rotazioni x N scale
+SCALE_INDICES, SCALE_LENGTHS = build_scale_indices()
+
+def score_scales(chroma_profiles):
+    """
+    Calcola il punteggio di ogni coppia (tonica, scala) per tutte le coppie insieme
+
+    Le note di ogni scala vengono sommate in ordine nel tipo del profilo (float32 per
+    il chroma di librosa) e poi divise per il numero di note, come nel calcolo
+    originale di extract_tonality_and_scale: punteggi e classifica restano identici.
+
+    Parameters:
+    -----------
+    chroma_profiles : np.ndarray
+        Profilo chroma normalizzato di forma (12,) oppure matrice (n_brani, 12)
+
+    Returns:
+    --------
+    np.ndarray
+        Punteggi di forma (12, n_scale) oppure (n_brani, 12, n_scale)
+    """
+    chroma_profiles = np.asarray(chroma_profiles)
+    dtype = np.result_type(chroma_profiles.dtype, np.float32)
+    padded = np.concatenate([chroma_profiles.astype(dtype, copy=False),
+                             np.zeros(chroma_profiles.shape[:-1] + (1,), dtype=dtype)], axis=-1)
+    scores = padded[..., SCALE_INDICES[..., 0]]
+    for note in range(1, SCALE_INDICES.shape[-1]):
+        scores = scores + padded[..., SCALE_INDICES[..., note]]
+    return scores / SCALE_LENGTHS.astype(dtype)
+
+def rank_scales(chroma_profile):
+    """
+    Restituisce la tabella completa dei punteggi di tutte le coppie (tonica, scala)
+
+    Parameters:
+    -----------
+    chroma_profile : np.ndarray
+        Profilo chroma normalizzato di forma (12,)
+
+    Returns:
+    --------
+    DataFrame
+        Tabella con colonne key, scale_name, scale_correlation ordinata per punteggio decrescente
+    """
+    import pandas as pd
+
+    scores = score_scales(chroma_profile)
+    roots, scales = np.meshgrid(np.arange(12), np.arange(len(SCALE_NAMES)), indexing='ij')
+    table = pd.DataFrame({
+        'key': np.asarray(KEY_NAMES)[roots.ravel()],
+        'scale_name': np.asarray(SCALE_NAMES)[scales.ravel()],
+        'scale_correlation': scores.ravel()
+    })
+    # L'ordinamento stabile mantiene l'ordine dei pattern in caso di parità
+    return table.sort_values('scale_correlation', ascending=False, kind='stable').reset_index(drop=True)
+
+def match_scales(chroma_profiles, key_indices=None):
+    """
+    Trova la scala migliore per uno o più profili chroma in modo vettoriale
+
+    Parameters:
+    -----------
+    chroma_profiles : np.ndarray
+        Matrice (n_brani, 12) di profili chroma normalizzati
+    key_indices : np.ndarray, optional
+        Tonica da usare per ogni brano; se None si usa la classe di altezza
+        predominante (argmax del profilo), come in extract_tonality_and_scale
+
+    Returns:
+    --------
+    tuple
+        (key_indices, scale_indices, scale_correlations) come array di lunghezza n_brani
+    """
+    chroma_profiles = np.atleast_2d(np.asarray(chroma_profiles))
+    if key_indices is None:
+        key_indices = np.argmax(chroma_profiles, axis=1)
+    key_indices = np.asarray(key_indices)
+
+    scores = score_scales(chroma_profiles)
+    root_scores = scores[np.arange(len(chroma_profiles)), key_indices]
+    # argmax restituisce il primo massimo: in caso di parità vince il primo pattern
+    scale_indices = np.argmax(root_scores, axis=1)
+    scale_correlations = root_scores[np.arange(len(chroma_profiles)), scale_indices]
+    return key_indices, scale_indices, scale_correlations
+
+def analyze_chroma_catalog(chroma_profiles, track_ids=None):
+    """
+    Rianalizza in blocco i profili chroma di un intero catalogo
+
+    Parameters:
+    -----------
+    chroma_profiles : np.ndarray o DataFrame
+        Matrice (n_brani, 12) di profili chroma (somme nel tempo, anche non normalizzate)
+    track_ids : array-like, optional
+        Identificativi dei brani (default: indice del DataFrame o posizione)
+
+    Returns:
+    --------
+    DataFrame
+        Per ogni brano: key, scale_name, key_full, scale_correlation e il miglior
+        abbinamento considerando tutte le toniche (best_key, best_scale_name, best_correlation)
+    """
+    import pandas as pd
+
+    if track_ids is None:
+        track_ids = chroma_profiles.index if isinstance(chroma_profiles, pd.DataFrame) else np.arange(len(chroma_profiles))
+    chroma_profiles = np.asarray(chroma_profiles, dtype=np.float64)
+    chroma_profiles = chroma_profiles / chroma_profiles.sum(axis=1, keepdims=True)
+
+    key_indices, scale_indices, scale_correlations = match_scales(chroma_profiles)
+
+    # Miglior coppia (tonica, scala) su tutte le toniche
+    flat_scores = score_scales(chroma_profiles).reshape(len(chroma_profiles), -1)
+    best_flat = np.argmax(flat_scores, axis=1)
+    best_roots, best_scales = np.divmod(best_flat, len(SCALE_NAMES))
+
+    keys = np.asarray(KEY_NAMES)[key_indices]
+    scale_names = np.asarray(SCALE_NAMES)[scale_indices]
+    return pd.DataFrame({
+        'track_id': np.asarray(track_ids),
+        'key': keys,
+        'scale_name': scale_names,
+        'key_full': np.char.add(np.char.add(keys.astype(str), ' '), scale_names.astype(str)),
+        'scale_correlation': scale_correlations,
+        'best_key': np.asarray(KEY_NAMES)[best_roots],
+        'best_scale_name': np.asarray(SCALE_NAMES)[best_scales],
+        'best_correlation': flat_scores[np.arange(len(chroma_profiles)), best_flat]
+    })
+
+def spell_scale_pitches(key_index, scale_name):
+    """
+    Scrive le note di una scala con la stessa ortografia prodotta da music21
+
+    Le scale diatoniche usano una lettera per grado con le alterazioni necessarie
+    (es. 'E#', 'F##', 'E-'); le altre usano i nomi a diesis di KEY_NAMES. Le ottave
+    partono da 4 e la tonica viene ripetuta all'ottava superiore, come in
+    music21.scale.*Scale.getPitches().
+
+    Parameters:
+    -----------
+    key_index : int
+        Indice della tonica in KEY_NAMES
+    scale_name : str
+        Nome della scala in SCALE_PATTERNS
+
+    Returns:
+    --------
+    list
+        Lista di stringhe del tipo 'C#4', incluso il ritorno alla tonica
+    """
+    pattern = SCALE_PATTERNS[scale_name]
+    pitches = []
+    if scale_name in DIATONIC_SPELLED_SCALES:
+        tonic_step = PITCH_CLASS_STEPS[key_index]
+        for degree, interval in enumerate(pattern + [12]):
+            step = tonic_step + degree
+            pitch_class = (key_index + interval) % 12
+            # Alterazione rispetto alla nota naturale, nell'intervallo [-6, 5]
+            alter = (pitch_class - STEP_PITCH_CLASSES[step % 7] + 6) % 12 - 6
+            accidental = '#' * alter if alter > 0 else '-' * -alter
+            pitches.append(f"{STEP_LETTERS[step % 7]}{accidental}{TONIC_OCTAVE + step // 7}")
+    else:
+        for interval in pattern + [12]:
+            semitones = key_index + interval
+            pitches.append(f"{KEY_NAMES[semitones % 12]}{TONIC_OCTAVE + semitones // 12}")
+    return pitches
+
+# Tabella precalcolata delle note di ogni scala per tutte le 12 toniche
+SCALE_PITCHES = {
+    (key_index, scale_name): ', '.join(spell_scale_pitches(key_index, scale_name))
+    for key_index in range(12)
+    for scale_name in SCALE_NAMES
+}
+
+def _find_chord_root(pitch_classes):
+    """
+    Trova la fondamentale di un insieme di classi di altezza (ordinate) con lo stesso
+    algoritmo di music21.chord.Chord.root(): prima cerca una nota con terze
+    perfettamente sovrapposte, altrimenti quella con più terze/quinte/settime sopra
+    """
+    # Una sola nota per passo diatonico, mantenendo l'ordine
+    unique = []
+    seen_steps = set()
+    for pitch_class in pitch_classes:
+        step = PITCH_CLASS_STEPS[pitch_class]
+        if step not in seen_steps:
+            seen_steps.add(step)
+            unique.append(pitch_class)
+
+    # Singola nota o accordo di tredicesima: la fondamentale è il basso
+    if len(unique) == 1 or len(unique) == 7:
+        return pitch_classes[0]
+
+    steps_to_pitch = {PITCH_CLASS_STEPS[pc]: pc for pc in unique}
+    step_nums = sorted(steps_to_pitch)
+    n_steps = len(step_nums)
+    for start in range(n_steps):
+        last_step = step_nums[start]
+        all_thirds = True
+        for end in range(start + 1, start + n_steps):
+            end_step = step_nums[end % n_steps]
+            if end_step - last_step not in (2, -5):
+                all_thirds = False
+                break
+            last_step = end_step
+        if all_thirds:
+            return steps_to_pitch[step_nums[start]]
+
+    scores = []
+    for pitch_class in unique:
+        step = PITCH_CLASS_STEPS[pitch_class]
+        scores.append(sum(1 / (i + 6) for i, chord_step in enumerate((3, 5, 7, 2, 4, 6))
+                          if (step + chord_step - 1) % 7 in steps_to_pitch))
+    return unique[scores.index(max(scores))]
+
+def chord_quality(pitch_classes):
+    """
+    Qualità della triade di un insieme di classi di altezza, calcolata aritmeticamente
+
+    Riproduce music21.chord.Chord(...).quality per accordi costruiti con i nomi di
+    KEY_NAMES, senza creare oggetti music21.
+
+    Parameters:
+    -----------
+    pitch_classes : list
+        Indici (0-11) delle classi di altezza, in ordine crescente
+
+    Returns:
+    --------
+    str
+        'major', 'minor', 'diminished', 'augmented' oppure 'other'
+    """
+    if not pitch_classes:
+        return 'other'
+
+    root = _find_chord_root(pitch_classes)
+    root_step = PITCH_CLASS_STEPS[root]
+
+    def semitones_at(chord_step):
+        # Semitoni sopra la fondamentale di ogni nota che occupa il grado richiesto
+        return [(pc - root) % 12 for pc in pitch_classes
+                if (PITCH_CLASS_STEPS[pc] - root_step) % 7 + 1 == chord_step]
+
+    def is_repeated(semitones):
+        return any(value != semitones[0] for value in semitones)
+
+    thirds = semitones_at(3)
+    fifths = semitones_at(5)
+    if not thirds or is_repeated(semitones_at(1)) or is_repeated(thirds):
+        return 'other'
+    if not fifths:
+        return {4: 'major', 3: 'minor'}.get(thirds[0], 'other')
+    if is_repeated(fifths):
+        return 'other'
+    return {
+        (4, 7): 'major',
+        (3, 7): 'minor',
+        (4, 8): 'augmented',
+        (3, 6): 'diminished'
+    }.get((thirds[0], fifths[0]), 'other')
+
+def validate_with_music21():
+    """
+    Confronta le tabelle precalcolate con music21 (dipendenza opzionale, solo per validazione)
+
+    Returns:
+    --------
+    list
+        Elenco delle discrepanze trovate (vuoto se le tabelle coincidono con music21)
+    """
+    import music21
+
+    music21_classes = {
+        'Major': 'MajorScale', 'Ionian': 'MajorScale',
+        'Natural Minor': 'MinorScale', 'Aeolian': 'MinorScale',
+        'Harmonic Minor': 'HarmonicMinorScale', 'Melodic Minor': 'MelodicMinorScale',
+        'Dorian': 'DorianScale', 'Phrygian': 'PhrygianScale', 'Lydian': 'LydianScale',
+        'Mixolydian': 'MixolydianScale', 'Locrian': 'LocrianScale'
+    }
+
+    mismatches = []
+    for (key_index, scale_name), pitches in SCALE_PITCHES.items():
+        key_name = KEY_NAMES[key_index]
+        if scale_name in music21_classes:
+            scale = getattr(music21.scale, music21_classes[scale_name])(music21.note.Note(key_name).pitch)
+        else:
+            degrees = [KEY_NAMES[(key_index + interval) % 12] for interval in SCALE_PATTERNS[scale_name]]
+            scale = music21.scale.ConcreteScale(music21.pitch.Pitch(key_name), degrees)
+        expected = ', '.join(str(p) for p in scale.getPitches())
+        if expected != pitches:
+            mismatches.append(('scale', key_name, scale_name, expected, pitches))
+
+    for mask in range(1, 4096):
+        pitch_classes = [pc for pc in range(12) if mask >> pc & 1]
+        expected = music21.chord.Chord([music21.pitch.Pitch(KEY_NAMES[pc]) for pc in pitch_classes]).quality
+        quality = chord_quality(pitch_classes)
+        if expected != quality:
+            mismatches.append(('chord', pitch_classes, expected, quality))
+
+    return mismatches